@@ -10,22 +10,14 @@ from time import perf_counter
 
 import httpx
 from asgiref.sync import sync_to_async
-from django.http import JsonResponse, StreamingHttpResponse
+from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 
 from apps.core.async_client import call_fastapi, build_fastapi_headers
+from apps.core.sse_relay import SSERelay, SSERelayResponse, sse_event
+from apps.dashboard.telemetry import record_ai_latency
 
-
-async def _record_ai_latency(feature: str, duration_ms: int) -> None:
-    """Fire-and-forget: persist one AI response latency record."""
-    try:
-        from apps.dashboard.models import AIResponseLatency
-        await sync_to_async(AIResponseLatency.objects.create)(
-            feature=feature, duration_ms=duration_ms
-        )
-    except Exception:
-        pass
 from .file_extractor import extract_text_from_file, FileExtractionError
 from .helpers import (
     _resolve_authenticated_user,
@@ -90,9 +82,7 @@ async def chatbot_api_async(request):
                 headers=headers,
                 timeout=120.0,
             )
-            _chat_ms = int((perf_counter() - _t0) * 1000)
-            import asyncio as _aio
-            _aio.create_task(_record_ai_latency('chat', _chat_ms))
+            record_ai_latency('chat', int((perf_counter() - _t0) * 1000))
 
             if fastapi_resp.status_code == 200:
                 resp_json = fastapi_resp.json()
@@ -327,11 +317,10 @@ async def chatbot_stream_api_async(request):
     """
     SSE streaming proxy for the chatbot.
 
-    Connects to FastAPI POST /agent/chat/stream and forwards typed events
-    (tool_start, tool_done, token, done, error) directly to the browser.
-    Prepends a "session" event so the client knows the real session_id.
-    Buffers all "token" content and saves the full AI response to the DB
-    when the "done" event arrives.
+    Relays FastAPI POST /agent/chat/stream byte-for-byte through SSERelay
+    (tool_start, tool_done, token, done, error), flushing each event as it
+    arrives. Prepends a "session" event so the client knows the real
+    session_id, and saves the full AI response to the DB on the "done" event.
     """
     try:
         data = json.loads(request.body) if request.body else {}
@@ -353,79 +342,28 @@ async def chatbot_stream_api_async(request):
 
         real_session_id = session_obj.session_id if session_obj else session_id
 
-        async def sse_generator():
-            full_text_parts: list[str] = []
-
+        async def _persist_ai_message(relay: SSERelay):
+            if relay.text and session_obj:
+                await _save_ai_message(session_obj, relay.text)
+
+        relay = SSERelay(
+            "/agent/chat/stream",
+            json_body={
+                "message": user_message,
+                "conversation_history": conversation_history,
+                "tutor_mode": tutor_mode,
+                "user_stats": user_stats,
+                "user_id": getattr(user, "id", None),
+                "session_id": real_session_id,
+                "has_document": bool(session_obj and getattr(session_obj, "has_document", False)),
+            },
+            headers=build_fastapi_headers(),
             # Tell the client the real (backend-assigned) session_id immediately
-            yield f"data: {json.dumps({'type': 'session', 'session_id': real_session_id})}\n\n"
-
-            try:
-                from apps.core.async_client import build_fastapi_headers, get_fastapi_base_urls
-                headers = build_fastapi_headers()
-                base_urls = get_fastapi_base_urls()
-                if not base_urls:
-                    yield f"data: {json.dumps({'type': 'error', 'message': 'AI service not configured.'})}\n\n"
-                    return
-                fastapi_base = base_urls[0]
-                payload = {
-                    "message": user_message,
-                    "conversation_history": conversation_history,
-                    "tutor_mode": tutor_mode,
-                    "user_stats": user_stats,
-                    "user_id": getattr(user, "id", None),
-                    "session_id": real_session_id,
-                    "has_document": bool(session_obj and getattr(session_obj, "has_document", False)),
-                }
-
-                async with httpx.AsyncClient(timeout=120.0) as client:
-                    async with client.stream(
-                        "POST",
-                        f"{fastapi_base}/agent/chat/stream",
-                        headers=headers,
-                        json=payload,
-                    ) as response:
-                        if response.status_code != 200:
-                            logger.error(
-                                "[chatbot:stream] FastAPI returned %d", response.status_code
-                            )
-                            yield f"data: {json.dumps({'type': 'error', 'message': 'AI service error'})}\n\n"
-                            return
-
-                        async for line in response.aiter_lines():
-                            if not line.startswith("data: "):
-                                continue
-                            raw = line[6:]  # strip "data: " prefix
-                            try:
-                                event = json.loads(raw)
-                            except json.JSONDecodeError:
-                                continue
-
-                            etype = event.get("type")
-                            if etype == "token":
-                                full_text_parts.append(event.get("content", ""))
-
-                            # Forward the event verbatim to the browser
-                            yield f"data: {raw}\n\n"
-
-                            if etype == "done":
-                                full_text = "".join(full_text_parts).strip()
-                                if full_text and session_obj:
-                                    await _save_ai_message(session_obj, full_text)
-                                return
-                            elif etype == "error":
-                                return
-
-            except (httpx.TimeoutException, httpx.RequestError) as exc:
-                logger.error("[chatbot:stream] FastAPI unreachable: %s", exc)
-                yield f"data: {json.dumps({'type': 'error', 'message': 'AI service temporarily unavailable.'})}\n\n"
-            except Exception as exc:
-                logger.error("[chatbot:stream] unexpected error: %s", exc, exc_info=True)
-                yield f"data: {json.dumps({'type': 'error', 'message': 'Internal server error.'})}\n\n"
-
-        response = StreamingHttpResponse(sse_generator(), content_type="text/event-stream")
-        response["Cache-Control"] = "no-cache"
-        response["X-Accel-Buffering"] = "no"
-        return response
+            prelude=sse_event({"type": "session", "session_id": real_session_id}),
+            timeout=120.0,
+            on_done=_persist_ai_message,
+        )
+        return SSERelayResponse(relay)
 
     except json.JSONDecodeError:
         return JsonResponse({"error": "Invalid JSON"}, status=400)
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.1 on 2026-10-19 00:23
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chatbot', '0005_chatmessage_char_count_chatmessage_token_estimate'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='chatsession',
+            index=models.Index(fields=['created_at', 'id'], name='chat_session_created_idx'),
+        ),
+    ]
@@ -1,6 +1,8 @@
 from django.conf import settings
 from django.db import models
 
+from apps.core.text_metrics import CharCountedModel
+
 MESSAGE_TYPES = (
     ("user", "User"),
     ("ai", "AI"),
@@ -42,13 +44,14 @@ class ChatSession(models.Model):
     class Meta:
         indexes = [
             models.Index(fields=["user", "-created_at"], name="chat_session_user_created_idx"),
+            models.Index(fields=["created_at", "id"], name="chat_session_created_idx"),
         ]
 
     def __str__(self):
         return self.title or self.session_id
 
 
-class ChatMessage(models.Model):
+class ChatMessage(CharCountedModel):
     """
     Individual chat turns (user / AI).
     """
@@ -61,6 +64,8 @@ class ChatMessage(models.Model):
     content   = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
 
+    CHAR_SOURCE_FIELDS = ("content",)
+
     class Meta:
         ordering = ["created_at"]
         indexes = [
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import ClashRoom, ClashParticipant
+from .models import ClashAnswer, ClashRoom, ClashParticipant, PooledQuestion
 
 
 class ClashParticipantInline(admin.TabularInline):
@@ -23,3 +23,18 @@ class ClashParticipantAdmin(admin.ModelAdmin):
     list_display = ('display_name', 'room', 'score', 'rank', 'is_host', 'joined_at')
     list_filter = ('is_host',)
     search_fields = ('display_name', 'user__username', 'room__room_code')
+
+
+@admin.register(PooledQuestion)
+class PooledQuestionAdmin(admin.ModelAdmin):
+    list_display = ('subject_key', 'difficulty', '__str__', 'created_at')
+    list_filter = ('difficulty',)
+    search_fields = ('subject_key',)
+    readonly_fields = ('fingerprint', 'created_at')
+
+
+@admin.register(ClashAnswer)
+class ClashAnswerAdmin(admin.ModelAdmin):
+    list_display = ('room', 'user', 'q_idx', 'correct', 'points', 'ms_taken', 'created_at')
+    list_filter = ('correct',)
+    search_fields = ('room__room_code', 'user__username')
@@ -5,3 +5,6 @@ class ClashConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.clash'
     verbose_name = 'Clash'
+
+    def ready(self):
+        import apps.clash.signals  # noqa: F401
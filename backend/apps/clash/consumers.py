@@ -3,51 +3,55 @@ Clash WebSocket consumer.
 
 Game flow:
   connect  → join channel group, broadcast updated lobby
-  start_game (host only) → countdown → question loop → finish
-  submit_answer → score update; game loop drives question endings
+  start_game (host only) → coordinator runs countdown → question loop → finish
+  submit_answer → score update; the coordinator drives question endings
+  heartbeat (every 10s) → keep this player online; players who stopped
+              sending them are dropped from the lobby and the answer count
   disconnect → leave group, update lobby
 
-Redis keys (TTL 2h):
-  clash_state_{room_code}    — live game state dict
-  clash_presence_{room_code} — {user_id: username} online map
+Live game state (current question, per-question answers, scores) lives in
+state.py: Redis hashes/sorted sets updated by Lua scripts, or in-process dicts
+without Redis. The game loop itself runs in coordinator.py under a per-room
+lease, so it is not tied to the connection (or worker) that started it.
+Presence (who is online) lives in presence.py; room data (questions, participants)
+comes from the shared in-process snapshot in snapshot.py.
 """
-import asyncio
 import logging
 import time
-from typing import ClassVar
 from urllib.parse import parse_qs
 
 from asgiref.sync import sync_to_async
 from channels.generic.websocket import AsyncJsonWebsocketConsumer
-from django.core.cache import cache
 from django.utils import timezone
 from rest_framework.authtoken.models import Token
 
-from .models import ClashRoom, ClashParticipant
+from . import protocol
+from .coordinator import coordinator
+from .models import ClashRoom
+from .presence import expected_answers, mark_offline, mark_online, online_user_ids
+from .snapshot import get_snapshot
+from .state import get_state
 
 logger = logging.getLogger(__name__)
 
 BASE_POINTS = 1000
 SPEED_BONUS_MAX = 500
-COUNTDOWN_SECONDS = 3
-ANSWER_REVEAL_SECONDS = 10  # pause between question end and next question
-POLL_INTERVAL = 1.0         # how often the game loop checks if all answered
 
 
 class ClashConsumer(AsyncJsonWebsocketConsumer):
 
-    # Keyed by room_code. Survives individual connection disconnect/reconnect
-    # within the same worker process (single-process dev; Redis layer for prod).
-    _game_tasks: ClassVar[dict] = {}
-
     # ─────────────────────────── Lifecycle ───────────────────────────
 
     async def connect(self):
         self.room_code = self.scope['url_route']['kwargs']['room_code'].upper()
         self.group_name = f'clash_{self.room_code}'
+        self.state = get_state(self.room_code)
         self.user = None
         self.room = None
         self.connected = False
+        self.compact = False
+        # Every worker serving Clash sockets also watches for orphaned games.
+        coordinator.ensure_started()
 
         # Token auth via query param  ?token=<key>
         token_key = self._get_token()
@@ -59,12 +63,9 @@ class ClashConsumer(AsyncJsonWebsocketConsumer):
             await self.close(code=4001)
             return
 
-        # Validate room
-        try:
-            self.room = await sync_to_async(
-                ClashRoom.objects.select_related('host').get
-            )(room_code=self.room_code)
-        except ClashRoom.DoesNotExist:
+        # Validate room (shared in-process snapshot, see snapshot.py)
+        self.room = await get_snapshot(self.room_code)
+        if self.room is None:
             await self.close(code=4004)
             return
 
@@ -72,11 +73,16 @@ class ClashConsumer(AsyncJsonWebsocketConsumer):
             await self.close(code=4003)
             return
 
+        # Opt-in compact binary protocol (protocol.py), negotiated as a WebSocket subprotocol.
+        self.compact = protocol.SUBPROTOCOL in self.scope.get('subprotocols', [])
+
         await self.channel_layer.group_add(self.group_name, self.channel_name)
-        await self.accept()
+        await self.accept(subprotocol=protocol.SUBPROTOCOL if self.compact else None)
         self.connected = True
 
-        await self._set_presence(True)
+        await mark_online(self.room_code, str(self.user.id), self.channel_name)
+        if self.room.status == ClashRoom.ACTIVE:
+            await self.state.set_expected(await self._expected_answers())
         # Only broadcast lobby updates while in the waiting room; during an
         # active game everyone is on the play screen, not the lobby.
         if self.room.status == ClashRoom.WAITING:
@@ -84,13 +90,15 @@ class ClashConsumer(AsyncJsonWebsocketConsumer):
 
         # If game is already running, immediately catch up this player
         if self.room.status == ClashRoom.ACTIVE:
-            state = await self._get_state()
-            if state:
-                q_idx = state.get('current_question', 0)
+            progress = await self.state.progress()
+            if progress:
+                q_idx = progress.get('current_question', 0)
                 questions = self.room.questions
                 if 0 <= q_idx < len(questions):
+                    if self.compact:
+                        await self.send(bytes_data=protocol.question_set_frame(self.room))
                     q = questions[q_idx]
-                    elapsed = time.time() - state.get('question_start_time', time.time())
+                    elapsed = time.time() - (progress.get('question_start_time') or time.time())
                     remaining = max(0.0, self.room.time_per_question - elapsed)
                     await self.send_json({
                         'type': 'game_catchup',
@@ -100,209 +108,104 @@ class ClashConsumer(AsyncJsonWebsocketConsumer):
                         'options': q.get('options', []),
                         'time_limit': self.room.time_per_question,
                         'time_remaining': remaining,
-                        'scores': state.get('scores', {}),
+                        **await self._standing(),
                     })
 
     async def disconnect(self, close_code):
         self.connected = False
         if self.user:
-            await self._set_presence(False)
-            if self.room and self.room.status == ClashRoom.WAITING:
-                await self._broadcast_lobby()
+            await mark_offline(self.room_code, str(self.user.id), self.channel_name)
+            await self._presence_changed()
 
         await self.channel_layer.group_discard(self.group_name, self.channel_name)
 
+    async def receive(self, text_data=None, bytes_data=None, **kwargs):
+        if bytes_data is not None:
+            try:
+                content = protocol.decode(bytes_data)
+            except Exception:
+                return
+            await self.receive_json(content)
+            return
+        await super().receive(text_data=text_data, bytes_data=bytes_data, **kwargs)
+
+    async def send_json(self, content, close=False):
+        if self.compact:
+            await self.send(bytes_data=protocol.encode(content, self.room), close=close)
+            return
+        await super().send_json(content, close=close)
+
     async def receive_json(self, content):
         msg_type = content.get('type')
         if msg_type == 'start_game':
             await self.handle_start_game()
         elif msg_type == 'submit_answer':
             await self.handle_submit_answer(content)
+        elif msg_type == 'heartbeat':
+            await self.handle_heartbeat()
 
     # ─────────────────────────── Client message handlers ───────────────────────────
 
     async def handle_start_game(self):
-        # Re-fetch to get fresh status
-        self.room = await sync_to_async(
-            ClashRoom.objects.get
-        )(pk=self.room.pk)
+        # Re-fetch to get fresh status (without the questions JSON)
+        room = await sync_to_async(
+            ClashRoom.objects.only('id', 'status', 'started_at').get
+        )(pk=self.room.id)
 
-        if self.room.status != ClashRoom.WAITING:
+        if room.status != ClashRoom.WAITING:
             await self.send_json({'type': 'error', 'message': 'Game already started.'})
             return
 
-        is_host = await sync_to_async(
-            ClashParticipant.objects.filter(
-                room=self.room, user=self.user, is_host=True
-            ).exists
-        )()
-        if not is_host:
+        if not self.room.is_host(self.user.id):
             await self.send_json({'type': 'error', 'message': 'Only the host can start the Clash.'})
             return
 
         # Mark active
-        self.room.status = ClashRoom.ACTIVE
-        self.room.started_at = timezone.now()
-        await sync_to_async(self.room.save)()
+        room.status = ClashRoom.ACTIVE
+        room.started_at = timezone.now()
+        await sync_to_async(room.save)(update_fields=['status', 'started_at'])
 
-        await self._init_game_state()
+        await coordinator.start_game(self.room_code)
 
-        await self.channel_layer.group_send(self.group_name, {
-            'type': 'clash.game_starting',
-            'countdown': COUNTDOWN_SECONDS,
-        })
-
-        task = asyncio.create_task(self._game_loop())
-        ClashConsumer._game_tasks[self.room_code] = task
+    async def handle_heartbeat(self):
+        # Each heartbeat also prunes sockets that died without closing, and re-adds
+        # this one if it was pruned (a stalled tab): either way the count changed.
+        if await mark_online(self.room_code, str(self.user.id), self.channel_name):
+            await self._presence_changed()
 
     async def handle_submit_answer(self, content):
-        state = await self._get_state()
-        if not state:
-            return
-
         q_idx = content.get('question_index')
         answer = str(content.get('answer', '')).strip()
 
-        # Reject stale / out-of-order answers
-        if q_idx != state.get('current_question'):
-            return
-
-        user_id = str(self.user.id)
-        if user_id in state.get('answered', {}):
-            return  # already submitted
-
         questions = self.room.questions
-        if q_idx >= len(questions):
+        if not isinstance(q_idx, int) or not 0 <= q_idx < len(questions):
             return
 
         correct_answer = questions[q_idx].get('answer', '').strip()
         is_correct = answer.lower() == correct_answer.lower()
 
-        # Elapsed time computed server-side from the recorded question start timestamp.
-        # Never trust client-supplied elapsed_ms — a cheating client could send 0
-        # to always claim the maximum speed bonus.
-        question_start = state.get('question_start_time', time.time())
-        elapsed_s = min(time.time() - question_start, self.room.time_per_question)
-        points = 0
-        if is_correct:
-            time_ratio = max(0.0, 1.0 - elapsed_s / self.room.time_per_question)
-            points = BASE_POINTS + int(SPEED_BONUS_MAX * time_ratio)
-
-        # Atomic-ish update in Redis
-        state['answered'][user_id] = {'correct': is_correct, 'points': points}
-        state['scores'][user_id] = state['scores'].get(user_id, 0) + points
-
-        ua = state.setdefault('user_answers', {})
-        if user_id not in ua:
-            ua[user_id] = []
-        ua[user_id].append({'q_idx': q_idx, 'correct': is_correct, 'points': points})
-
-        await self._set_state(state)
+        # One atomic store operation rejects stale/duplicate answers and scores the rest.
+        # Elapsed time is computed from the server-recorded question start — never trust
+        # client-supplied timing, a cheating client could claim the maximum speed bonus.
+        result = await self.state.submit_answer(
+            str(self.user.id), q_idx, answer, is_correct,
+            now=time.time(),
+            time_limit=self.room.time_per_question,
+            base_points=BASE_POINTS,
+            speed_bonus_max=SPEED_BONUS_MAX,
+        )
+        if not result.accepted:
+            return
 
         # Private confirmation — only this player sees this
         await self.send_json({
             'type': 'answer_confirmed',
             'correct': is_correct,
-            'points_earned': points,
-            'total_score': state['scores'][user_id],
+            'points_earned': result.points,
+            'total_score': result.total_score,
             'correct_answer': correct_answer,
         })
 
-    # ─────────────────────────── Game loop ───────────────────────────
-
-    async def _game_loop(self):
-        """Drives the entire game: countdown → questions → finish."""
-        try:
-            await asyncio.sleep(COUNTDOWN_SECONDS)
-
-            questions = self.room.questions
-
-            for idx in range(len(questions)):
-                await self._broadcast_question(idx)
-
-                # Re-fetch count each question so disconnected players don't stall the game
-                participant_count = await sync_to_async(self.room.participants.count)()
-                deadline = time.monotonic() + self.room.time_per_question + 1
-
-                while time.monotonic() < deadline:
-                    await asyncio.sleep(POLL_INTERVAL)
-                    state = await self._get_state()
-                    if not state:
-                        return
-                    if len(state.get('answered', {})) >= participant_count:
-                        break
-
-                state = await self._get_state()
-                if state:
-                    await self._broadcast_question_end(state, idx)
-
-                await asyncio.sleep(ANSWER_REVEAL_SECONDS)
-
-            await self._finish_game()
-        except asyncio.CancelledError:
-            pass
-        finally:
-            ClashConsumer._game_tasks.pop(self.room_code, None)
-
-    async def _broadcast_question(self, idx):
-        state = await self._get_state()
-        if not state:
-            return
-
-        state['current_question'] = idx
-        state['answered'] = {}
-        state['question_start_time'] = time.time()
-        await self._set_state(state)
-
-        q = self.room.questions[idx]
-        await self.channel_layer.group_send(self.group_name, {
-            'type': 'clash.new_question',
-            'index': idx,
-            'total': len(self.room.questions),
-            'question': q.get('question', ''),
-            'options': q.get('options', []),
-            'time_limit': self.room.time_per_question,
-            'server_time': time.time(),
-        })
-
-    async def _broadcast_question_end(self, state, idx):
-        # Guard: broadcast only once per question index
-        if state.get('ended_question') == idx:
-            return
-        state['ended_question'] = idx
-        await self._set_state(state)
-
-        q = self.room.questions[idx]
-        scores = state.get('scores', {})
-        ranking = await self._build_ranking(scores)
-
-        await self.channel_layer.group_send(self.group_name, {
-            'type': 'clash.question_ended',
-            'index': idx,
-            'correct_answer': q.get('answer', ''),
-            'explanation': q.get('explanation', ''),
-            'top3': ranking[:3],
-            'your_scores': scores,   # client uses own user_id to look up their score
-        })
-
-    async def _finish_game(self):
-        state = await self._get_state()
-        scores = state.get('scores', {}) if state else {}
-        ranking = await self._build_ranking(scores)
-
-        # Persist final scores
-        await self._save_final_scores(scores, ranking, state)
-
-        self.room.status = ClashRoom.FINISHED
-        self.room.finished_at = timezone.now()
-        await sync_to_async(self.room.save)()
-
-        await self.channel_layer.group_send(self.group_name, {
-            'type': 'clash.game_finished',
-            'rankings': ranking,
-            'room_code': self.room_code,
-        })
-
     # ─────────────────────────── Channel layer event handlers ───────────────────────────
     # Each method name maps to the 'type' field in group_send, with dots → underscores.
 
@@ -316,12 +219,22 @@ class ClashConsumer(AsyncJsonWebsocketConsumer):
 
     async def clash_game_starting(self, event):
         await self._safe_send(event)
+        if self.compact and self.connected:
+            # The whole (sealed) question set, once; questions then open by key.
+            self.room = await get_snapshot(self.room_code) or self.room
+            try:
+                await self.send(bytes_data=protocol.question_set_frame(self.room))
+            except Exception:
+                pass
 
     async def clash_new_question(self, event):
         await self._safe_send(event)
 
     async def clash_question_ended(self, event):
-        await self._safe_send(event)
+        # The group event carries only the top 3; add this player's own standing.
+        if not self.connected:
+            return
+        await self._safe_send({**event, **await self._standing()})
 
     async def clash_game_finished(self, event):
         await self._safe_send(event)
@@ -346,90 +259,38 @@ class ClashConsumer(AsyncJsonWebsocketConsumer):
             pass
         return None
 
-    def _state_key(self):
-        return f'clash_state_{self.room_code}'
-
-    def _presence_key(self):
-        return f'clash_presence_{self.room_code}'
-
-    async def _init_game_state(self):
-        state = {
-            'status': 'active',
-            'current_question': -1,
-            'answered': {},
-            'scores': {},
-            'ended_question': -1,
-            'user_answers': {},   # {user_id: [{q_idx, correct, points}]}
-        }
-        await sync_to_async(cache.set)(self._state_key(), state, timeout=7200)
-
-    async def _get_state(self):
-        return await sync_to_async(cache.get)(self._state_key())
-
-    async def _set_state(self, state):
-        await sync_to_async(cache.set)(self._state_key(), state, timeout=7200)
-
-    async def _set_presence(self, online: bool):
-        presence = await sync_to_async(cache.get)(self._presence_key()) or {}
-        uid = str(self.user.id)
-        if online:
-            presence[uid] = self.user.username
-        else:
-            presence.pop(uid, None)
-        await sync_to_async(cache.set)(self._presence_key(), presence, timeout=7200)
+    async def _standing(self) -> dict:
+        rank, score = await self.state.standing(str(self.user.id))
+        return {'your_rank': rank, 'your_score': score}
+
+    async def _expected_answers(self) -> int:
+        return await expected_answers(self.room_code, (p.user_id for p in self.room.participants))
+
+    async def _presence_changed(self):
+        """Someone left, timed out or came back: resize the answer count in a game, refresh the lobby before one."""
+        # The state store knows if a game has started since connect.
+        if await self.state.exists():
+            # A missing player must not stall the "everyone answered" check.
+            await self.state.set_expected(await self._expected_answers())
+        elif self.room and self.room.status == ClashRoom.WAITING:
+            await self._broadcast_lobby()
 
     async def _broadcast_lobby(self):
         """Broadcast current participant list to all in the group."""
-        participants = await sync_to_async(list)(
-            ClashParticipant.objects.filter(room=self.room).select_related('user')
-        )
+        self.room = await get_snapshot(self.room_code) or self.room
+        participants = self.room.participants
+        online = await online_user_ids(self.room_code)
         await self.channel_layer.group_send(self.group_name, {
             'type': 'clash.player_joined',
             'participants': [
                 {
-                    'username': p.user.username,
+                    'username': p.username,
                     'display_name': p.display_name,
                     'is_host': p.is_host,
-                    'profile_image': p.user.profile_image or '',
+                    'profile_image': p.profile_image,
+                    'online': p.user_id in online,
                 }
                 for p in participants
             ],
             'count': len(participants),
         })
-
-    async def _build_ranking(self, scores: dict) -> list:
-        participants = await sync_to_async(list)(
-            ClashParticipant.objects.filter(room=self.room).select_related('user')
-        )
-        ranking = sorted(
-            [
-                {
-                    'user_id': str(p.user.id),
-                    'username': p.user.username,
-                    'display_name': p.display_name,
-                    'score': scores.get(str(p.user.id), 0),
-                    'profile_image': p.user.profile_image or '',
-                }
-                for p in participants
-            ],
-            key=lambda x: x['score'],
-            reverse=True,
-        )
-        for i, entry in enumerate(ranking):
-            entry['rank'] = i + 1
-        return ranking
-
-    async def _save_final_scores(self, scores: dict, ranking: list, state: dict = None):
-        rank_map = {e['user_id']: e['rank'] for e in ranking}
-        user_answers_map = (state or {}).get('user_answers', {})
-        participants = await sync_to_async(list)(
-            ClashParticipant.objects.filter(room=self.room)
-        )
-        for p in participants:
-            uid = str(p.user_id)
-            p.score = scores.get(uid, 0)
-            p.rank = rank_map.get(uid)
-            p.answers = user_answers_map.get(uid, [])
-        await sync_to_async(
-            ClashParticipant.objects.bulk_update
-        )(participants, ['score', 'rank', 'answers'])
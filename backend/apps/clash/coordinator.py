@@ -0,0 +1,396 @@
+"""
+Clash game coordinator.
+
+A running game used to be an ``asyncio`` task inside whichever ASGI worker
+received ``start_game``. If that worker restarted, the game froze. The
+coordinator runs each game under a lease instead, so any worker can own it:
+
+  clash:{code}:owner   lease, SET NX with a TTL of CLASH_LEASE_SECONDS
+  clash:{code}:meta    phase + phase_deadline: the persisted schedule
+  clash:active_rooms   registry of games in progress
+
+The owner renews its lease every third of the TTL. Every worker runs a
+scanner that, every CLASH_COORDINATOR_SCAN_SECONDS, tries to claim the lease
+of each active room it is not already running. A live owner keeps its room,
+so the scan only picks up games whose owner has died. The new owner reads
+the phase and deadline and continues from there. A missed deadline fires at
+once and answers already in the store are kept, so a takeover delays the
+game by at most one lease TTL plus one scan interval.
+
+A runner that raises releases its lease, so the next scan retries the game.
+Crashes are counted in the state store (``clash:{code}:failures``), so the
+count is shared by all workers. After CLASH_MAX_RUNNER_FAILURES crashes the
+game is marked finished and dropped from the registry. Players get a
+``clash.game_finished`` with ``abandoned`` set, and no worker picks the game
+up again.
+
+Each transition is compare-and-set in the state store (see state.py). An
+owner that stalls past its lease and wakes up again cannot replay a question
+or end one twice.
+
+Answers are written behind the game: at each question end the runner appends
+the new entries of the state store's answer log to ``ClashAnswer`` in one
+``bulk_create``. A crashed or abandoned game therefore keeps every answer up
+to its last completed question in the database. The final result is one
+``bulk_update`` of the participants, and room saves name their
+``update_fields``, so the hot path never rewrites the ``questions`` JSON.
+
+Without Redis the same code runs against the in-process store: leases and
+the registry are plain dicts, which is all a single dev process needs.
+"""
+import asyncio
+import logging
+import os
+import socket
+import time
+import uuid
+
+from asgiref.sync import sync_to_async
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.utils import timezone
+
+from .models import ClashAnswer, ClashParticipant, ClashRoom
+from .presence import expected_answers
+from .snapshot import get_snapshot
+from .state import COUNTDOWN, FINISHED, QUESTION, REVEAL, active_rooms, get_state
+
+logger = logging.getLogger(__name__)
+
+COUNTDOWN_SECONDS = 3
+ANSWER_REVEAL_SECONDS = 10  # pause between question end and next question
+ANSWER_GRACE_SECONDS = 1    # accepted past the client-side timer for network lag
+
+
+def _lease_seconds() -> float:
+    return float(getattr(settings, "CLASH_LEASE_SECONDS", 15))
+
+
+def _scan_seconds() -> float:
+    return float(getattr(settings, "CLASH_COORDINATOR_SCAN_SECONDS", 5))
+
+
+def _max_failures() -> int:
+    return int(getattr(settings, "CLASH_MAX_RUNNER_FAILURES", 3))
+
+
+class GameRunner:
+    """Drives one room's schedule while this worker holds its lease."""
+
+    def __init__(self, room_code: str):
+        self.room_code = room_code
+        self.group_name = f'clash_{room_code}'
+        self.state = get_state(room_code)
+        self.channel_layer = get_channel_layer()
+        self.room = None
+        self._flushed = 0   # answer log entries already in ClashAnswer
+        self._player_ids: list = []
+
+    async def run(self) -> None:
+        self.room = await self._load_room()
+        if self.room is None or self.room.status == ClashRoom.FINISHED:
+            await self.state.finish()
+            return
+        # Flushes append log prefixes, so a resumed game continues after the rows already written.
+        self._flushed = await sync_to_async(ClashAnswer.objects.filter(room=self.room).count)()
+        self._player_ids = await sync_to_async(list)(
+            ClashParticipant.objects.filter(room=self.room).values_list('user_id', flat=True)
+        )
+
+        questions = self.room.questions
+        while True:
+            progress = await self.state.progress()
+            if not progress:
+                # State expired or was never written; nothing left to drive.
+                await self.state.finish()
+                return
+
+            phase = progress["phase"]
+            idx = progress["current_question"]
+            await self._sleep_until(progress["phase_deadline"], phase, idx)
+
+            if phase == COUNTDOWN:
+                await self._start_question(0)
+            elif phase == QUESTION:
+                await self._end_question(idx)
+            elif phase == REVEAL:
+                if idx + 1 < len(questions):
+                    await self._start_question(idx + 1)
+                else:
+                    await self._finish_game()
+                    return
+            elif phase == FINISHED:
+                await self.state.finish()   # deregisters it if an earlier finish was cut short
+                return
+
+    async def _sleep_until(self, deadline: float, phase: str, idx: int) -> None:
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            return
+        if phase == QUESTION:
+            # Woken by the answer that completes the set (or by the last
+            # missing player leaving); otherwise the deadline ends it.
+            await self.state.wait_all_answered(idx, timeout=remaining)
+        else:
+            await asyncio.sleep(remaining)
+
+    # ─────────────────────────── Transitions ───────────────────────────
+
+    async def _start_question(self, idx: int) -> None:
+        now = time.time()
+        deadline = now + self.room.time_per_question + ANSWER_GRACE_SECONDS
+        opened = await self.state.start_question(
+            idx, now, expected=await expected_answers(self.room_code, self._player_ids), deadline=deadline,
+        )
+        if not opened:
+            return
+
+        q = self.room.questions[idx]
+        await self.channel_layer.group_send(self.group_name, {
+            'type': 'clash.new_question',
+            'index': idx,
+            'total': len(self.room.questions),
+            'question': q.get('question', ''),
+            'options': q.get('options', []),
+            'time_limit': self.room.time_per_question,
+            'server_time': now,
+        })
+
+    async def _end_question(self, idx: int) -> None:
+        # Guard: broadcast only once per question index (also closes answering)
+        if not await self.state.end_question(idx, reveal_deadline=time.time() + ANSWER_REVEAL_SECONDS):
+            return
+
+        q = self.room.questions[idx]
+        # Same size for 3 players or 300: each consumer adds its own player's
+        # rank and score on the way out (ClashConsumer.clash_question_ended).
+        await self.channel_layer.group_send(self.group_name, {
+            'type': 'clash.question_ended',
+            'index': idx,
+            'correct_answer': q.get('answer', ''),
+            'explanation': q.get('explanation', ''),
+            'top3': await self._top(3),
+        })
+        await self._flush_answers()
+
+    async def _finish_game(self) -> None:
+        await self._flush_answers(strict=True)
+        scores = await self.state.scores()
+        ranking = await self._build_ranking(scores)
+
+        # Persist final scores (idempotent, so a takeover may safely redo it)
+        user_answers = {}
+        for entry in await self.state.answer_log():
+            user_answers.setdefault(entry['user_id'], []).append(
+                {'q_idx': entry['q_idx'], 'correct': entry['correct'], 'points': entry['points']}
+            )
+        await self._save_final_scores(scores, ranking, user_answers)
+
+        self.room.status = ClashRoom.FINISHED
+        self.room.finished_at = timezone.now()
+        await sync_to_async(self.room.save)(update_fields=['status', 'finished_at'])
+
+        await self.channel_layer.group_send(self.group_name, {
+            'type': 'clash.game_finished',
+            'rankings': ranking,
+            'room_code': self.room_code,
+        })
+        await self.state.finish()
+
+    # ─────────────────────────── Helpers ───────────────────────────
+
+    async def _flush_answers(self, strict: bool = False) -> None:
+        """Append answers accepted since the last flush to ClashAnswer (one INSERT)."""
+        entries = await self.state.answer_log(self._flushed)
+        if not entries:
+            return
+        try:
+            await sync_to_async(ClashAnswer.objects.bulk_create)(
+                [
+                    ClashAnswer(
+                        room_id=self.room.id, user_id=e['user_id'], q_idx=e['q_idx'],
+                        answer=str(e.get('answer', ''))[:200], correct=e['correct'],
+                        points=e['points'], ms_taken=e.get('ms_taken', 0),
+                    )
+                    for e in entries
+                ],
+                ignore_conflicts=True,  # a takeover may replay entries an old owner already wrote
+            )
+        except Exception:
+            if strict:
+                raise
+            # The log still holds them; the next flush retries from the same cursor.
+            logger.exception("Could not persist Clash answers for %s; will retry", self.room_code)
+            return
+        self._flushed += len(entries)
+
+    @sync_to_async
+    def _load_room(self):
+        return ClashRoom.objects.filter(room_code=self.room_code).first()
+
+    async def _top(self, k: int) -> list:
+        """Top ``k`` leaderboard entries from the scores sorted set, with tied scores sharing a rank."""
+        snapshot = await get_snapshot(self.room_code)
+        players = snapshot.participants_by_id if snapshot else {}
+        entries = []
+        for i, (user_id, score) in enumerate(await self.state.top(k)):
+            p = players.get(user_id)
+            rank = entries[-1]['rank'] if entries and entries[-1]['score'] == score else i + 1
+            entries.append({
+                'user_id': user_id,
+                'username': p.username if p else '',
+                'display_name': p.display_name if p else '',
+                'score': score,
+                'profile_image': p.profile_image if p else '',
+                'rank': rank,
+            })
+        return entries
+
+    async def _build_ranking(self, scores: dict) -> list:
+        snapshot = await get_snapshot(self.room_code)
+        participants = snapshot.participants if snapshot else ()
+        ranking = sorted(
+            [
+                {
+                    'user_id': p.user_id,
+                    'username': p.username,
+                    'display_name': p.display_name,
+                    'score': scores.get(p.user_id, 0),
+                    'profile_image': p.profile_image,
+                }
+                for p in participants
+            ],
+            key=lambda x: x['score'],
+            reverse=True,
+        )
+        for i, entry in enumerate(ranking):
+            entry['rank'] = i + 1
+        return ranking
+
+    async def _save_final_scores(self, scores: dict, ranking: list, user_answers_map: dict):
+        rank_map = {e['user_id']: e['rank'] for e in ranking}
+        participants = await sync_to_async(list)(
+            ClashParticipant.objects.filter(room=self.room)
+        )
+        for p in participants:
+            uid = str(p.user_id)
+            p.score = scores.get(uid, 0)
+            p.rank = rank_map.get(uid)
+            p.answers = user_answers_map.get(uid, [])
+        await sync_to_async(
+            ClashParticipant.objects.bulk_update
+        )(participants, ['score', 'rank', 'answers'])
+
+
+def _mark_room_finished(room_code: str) -> None:
+    room = ClashRoom.objects.only('id', 'status', 'finished_at').filter(room_code=room_code).first()
+    if room is not None and room.status != ClashRoom.FINISHED:
+        room.status = ClashRoom.FINISHED
+        room.finished_at = timezone.now()
+        room.save(update_fields=['status', 'finished_at'])
+
+
+class ClashCoordinator:
+    """Per-process owner of Clash game runners, plus the orphan scanner."""
+
+    def __init__(self):
+        self.owner_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._runners: dict[str, asyncio.Task] = {}
+        self._scanner: asyncio.Task | None = None
+        self.takeovers = 0
+
+    def ensure_started(self) -> None:
+        """Start the orphan scanner on the running event loop (idempotent)."""
+        loop = asyncio.get_running_loop()
+        if self._scanner is not None and not self._scanner.done() and self._scanner.get_loop() is loop:
+            return
+        self._scanner = loop.create_task(self._scan_forever(), name="clash-coordinator-scan")
+
+    async def start_game(self, room_code: str) -> None:
+        """Write the countdown schedule, announce it, and run the game from this worker."""
+        snapshot = await get_snapshot(room_code)
+        await get_state(room_code).init_game(
+            countdown_deadline=time.time() + COUNTDOWN_SECONDS,
+            players=[p.user_id for p in snapshot.participants] if snapshot else (),
+        )
+        await get_channel_layer().group_send(f'clash_{room_code}', {
+            'type': 'clash.game_starting',
+            'countdown': COUNTDOWN_SECONDS,
+        })
+        await self.claim(room_code)
+
+    async def claim(self, room_code: str) -> bool:
+        """Take the room's lease if it is free and start running it here."""
+        task = self._runners.get(room_code)
+        if task is not None and not task.done():
+            return True
+        if not await get_state(room_code).acquire_lease(self.owner_id, _lease_seconds()):
+            return False
+        self._runners[room_code] = asyncio.create_task(self._run(room_code), name=f"clash-game-{room_code}")
+        return True
+
+    async def _run(self, room_code: str) -> None:
+        state = get_state(room_code)
+        runner = asyncio.create_task(GameRunner(room_code).run())
+        heartbeat = asyncio.create_task(self._heartbeat(room_code, runner))
+        try:
+            await runner
+        except asyncio.CancelledError:
+            pass
+        except Exception:
+            logger.exception("Clash game %s failed; releasing it for another worker", room_code)
+            try:
+                if await state.record_failure() >= _max_failures():
+                    await self._abandon(room_code)
+            except Exception:
+                logger.exception("Could not record the failure of Clash game %s", room_code)
+        finally:
+            heartbeat.cancel()
+            runner.cancel()
+            await state.release_lease(self.owner_id)
+            self._runners.pop(room_code, None)
+
+    async def _abandon(self, room_code: str) -> None:
+        """Stop retrying a game whose runner keeps crashing: finish it everywhere and tell the players."""
+        logger.error("Clash game %s failed %d times; marking it finished", room_code, _max_failures())
+        await get_state(room_code).finish()
+        await sync_to_async(_mark_room_finished)(room_code)
+        await get_channel_layer().group_send(f'clash_{room_code}', {
+            'type': 'clash.game_finished',
+            'rankings': [],
+            'room_code': room_code,
+            'abandoned': True,
+        })
+
+    async def _heartbeat(self, room_code: str, runner: asyncio.Task) -> None:
+        state = get_state(room_code)
+        ttl = _lease_seconds()
+        while not runner.done():
+            await asyncio.sleep(ttl / 3)
+            if not await state.renew_lease(self.owner_id, ttl):
+                logger.warning("Lost the lease on Clash game %s; stopping here", room_code)
+                runner.cancel()
+                return
+
+    async def _scan_forever(self) -> None:
+        while True:
+            await asyncio.sleep(_scan_seconds())
+            try:
+                await self.scan_once()
+            except Exception:
+                logger.exception("Clash coordinator scan failed")
+
+    async def scan_once(self) -> list[str]:
+        """Claim every active room whose owner has let its lease lapse."""
+        claimed = []
+        for room_code in await active_rooms():
+            if room_code in self._runners:
+                continue
+            if await self.claim(room_code):
+                logger.info("Took over Clash game %s", room_code)
+                self.takeovers += 1
+                claimed.append(room_code)
+        return claimed
+
+
+coordinator = ClashCoordinator()
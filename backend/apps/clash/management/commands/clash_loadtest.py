@@ -0,0 +1,343 @@
+"""
+Capacity benchmark for the Clash WebSocket stack.
+
+Runs N rooms x M simulated players through ``ClashConsumer`` in this process,
+using Channels' ``WebsocketCommunicator`` against the project's ASGI
+application. The configured channel layer is used: Redis when ``REDIS_URL``
+is set, in-memory otherwise. Players join, heartbeat, answer after a random delay,
+optionally drop out mid-game, and the run reports:
+
+  fan-out latency    clash.new_question server_time → arrival, per player
+  answer ack         submit_answer → answer_confirmed round trip
+  lost updates       answers sent in time but never confirmed, confirmed
+                     answers missing from ClashAnswer, confirmed
+                     points not matching the final score, and questions a
+                     connected player never received
+  CPU per player     process user+sys CPU for the run / players
+
+The run writes to the configured database. Its users, tokens, rooms and
+answers are real rows, created for the run and deleted afterwards (unless
+--keep-data). The admin rollup counters count them while they exist, so run
+it against a staging or local database, not production. Needs ``daphne``
+installed for ``channels.testing``.
+
+Usage:
+    python manage.py clash_loadtest
+    python manage.py clash_loadtest --rooms 20 --players 25 --questions 5
+    python manage.py clash_loadtest --rooms 10 --players 40 --compact 0.5 --drop-rate 0.1 --json
+"""
+import asyncio
+import json
+import random
+import resource
+import time
+import uuid
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+def _percentile(values: list[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def _summary(values: list[float]) -> dict:
+    return {
+        "count": len(values),
+        "p50_ms": round(_percentile(values, 0.5), 1),
+        "p90_ms": round(_percentile(values, 0.9), 1),
+        "p99_ms": round(_percentile(values, 0.99), 1),
+        "max_ms": round(max(values), 1) if values else 0.0,
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        "Simulate N Clash rooms x M players in-process and report latency, lost updates and CPU. "
+        "Writes its users and rooms to the configured database (deleted afterwards unless --keep-data)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rooms", type=int, default=5, help="Concurrent rooms (default 5)")
+        parser.add_argument("--players", type=int, default=10, help="Players per room (default 10)")
+        parser.add_argument("--questions", type=int, default=5, help="Questions per game (default 5)")
+        parser.add_argument("--time-per-question", type=int, default=10, help="Seconds per question (default 10)")
+        parser.add_argument("--max-answer-delay-ms", type=int, default=2000, help="Answers arrive uniformly within this delay")
+        parser.add_argument("--reveal-seconds", type=float, default=0.5, help="Pause between questions (default 0.5)")
+        parser.add_argument("--drop-rate", type=float, default=0.0, help="Fraction of players that disconnect mid-game")
+        parser.add_argument("--compact", type=float, default=0.0, help="Fraction of players on the MessagePack protocol")
+        parser.add_argument("--seed", type=int, default=None, help="Random seed for reproducible runs")
+        parser.add_argument("--keep-data", action="store_true", help="Keep the generated users and rooms")
+        parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+
+    def handle(self, *args, **options):
+        try:
+            from channels.testing import WebsocketCommunicator  # noqa: F401
+        except ImportError:
+            raise CommandError("clash_loadtest needs channels.testing; install daphne (pip install daphne)")
+
+        if options["rooms"] < 1 or options["players"] < 1 or options["questions"] < 1:
+            raise CommandError("--rooms, --players and --questions must be at least 1")
+        random.seed(options["seed"])
+
+        run_id = uuid.uuid4().hex[:8]
+        rooms = self._setup(run_id, options)
+        try:
+            report = asyncio.run(self._run(rooms, options))
+            report.update(self._verify(rooms, report.pop("_confirmed")))
+        finally:
+            if not options["keep_data"]:
+                self._cleanup(run_id)
+
+        if options["json"]:
+            self.stdout.write(json.dumps(report, indent=2))
+        else:
+            self._print(report)
+
+    # ─────────────────────────── Setup / teardown ───────────────────────────
+
+    def _setup(self, run_id: str, options) -> list[tuple]:
+        from rest_framework.authtoken.models import Token
+
+        from apps.accounts.models import User
+        from apps.clash.models import ClashParticipant, ClashRoom
+        from apps.dashboard import rollups
+
+        total = options["rooms"] * options["players"]
+        User.objects.bulk_create([
+            User(email=f"loadtest-{run_id}-{i}@loadtest.invalid", username=f"lt_{run_id}_{i}")
+            for i in range(total)
+        ])
+        users = list(User.objects.filter(email__startswith=f"loadtest-{run_id}-").order_by("id"))
+        # bulk_create skips the rollup signals, but _cleanup's delete does not.
+        rollups.record_created(users)
+        Token.objects.bulk_create([Token(user=u, key=Token.generate_key()) for u in users])
+        tokens = dict(Token.objects.filter(user__in=users).values_list("user_id", "key"))
+
+        questions = [
+            {
+                "question": f"Load test question {i + 1}?",
+                "type": "mcq",
+                "options": ["Alpha", "Beta", "Gamma", "Delta"],
+                "answer": "A",
+                "explanation": "Synthetic question for load testing.",
+            }
+            for i in range(options["questions"])
+        ]
+        rooms = []
+        for r in range(options["rooms"]):
+            members = users[r * options["players"]:(r + 1) * options["players"]]
+            room = ClashRoom.objects.create(
+                host=members[0], subject="Load test", questions=questions,
+                num_questions=len(questions), time_per_question=options["time_per_question"],
+            )
+            ClashParticipant.objects.bulk_create([
+                ClashParticipant(room=room, user=u, display_name=u.username, is_host=(i == 0))
+                for i, u in enumerate(members)
+            ])
+            rooms.append((room, [(u, tokens[u.id]) for u in members]))
+        return rooms
+
+    def _cleanup(self, run_id: str) -> None:
+        from apps.accounts.models import User
+        # Rooms, participants and tokens cascade with their users.
+        User.objects.filter(email__startswith=f"loadtest-{run_id}-").delete()
+
+    # ─────────────────────────── Simulation ───────────────────────────
+
+    async def _run(self, rooms: list[tuple], options) -> dict:
+        import msgpack
+        from channels.testing import WebsocketCommunicator
+
+        from apps.clash import coordinator, protocol
+        from config.asgi import application
+
+        coordinator.COUNTDOWN_SECONDS = 0
+        coordinator.ANSWER_REVEAL_SECONDS = options["reveal_seconds"]
+
+        fanout_ms: list[float] = []
+        ack_ms: list[float] = []
+        confirmed: dict[str, list[tuple[int, int]]] = {}   # user_id -> [(q_idx, points)]
+        missed = {"questions": 0, "finished": 0}
+        counts = {"answers_sent": 0}
+        errors: list[str] = []
+        num_questions = options["questions"]
+        max_delay = options["max_answer_delay_ms"] / 1000
+
+        async def answer_later(comm, compact: bool, idx: int, sent_at: dict):
+            await asyncio.sleep(random.uniform(0, max_delay))
+            sent_at[idx] = time.perf_counter()
+            counts["answers_sent"] += 1
+            answer = random.choice("ABCD")
+            if compact:
+                await comm.send_to(bytes_data=msgpack.packb([protocol.SUBMIT_ANSWER, idx, answer]))
+            else:
+                await comm.send_json_to({"type": "submit_answer", "question_index": idx, "answer": answer})
+
+        async def heartbeat(comm, compact: bool):
+            while True:
+                await asyncio.sleep(10)
+                if compact:
+                    await comm.send_to(bytes_data=msgpack.packb([protocol.HEARTBEAT]))
+                else:
+                    await comm.send_json_to({"type": "heartbeat"})
+
+        async def player(room, user, token, is_host: bool, started: asyncio.Event):
+            compact = random.random() < options["compact"]
+            drop_after = random.randrange(num_questions) if random.random() < options["drop_rate"] else None
+            comm = WebsocketCommunicator(
+                application, f"/ws/clash/{room.room_code}/?token={token}",
+                subprotocols=[protocol.SUBPROTOCOL] if compact else None,
+            )
+            connected, _ = await comm.connect(timeout=10)
+            if not connected:
+                errors.append(f"{user.username}: connect refused")
+                return
+            uid = str(user.id)
+            confirmed[uid] = []
+            seen = 0
+            sent_at: dict[int, float] = {}
+            answering: list[asyncio.Task] = [asyncio.create_task(heartbeat(comm, compact))]
+            try:
+                await started.wait()
+                if is_host:
+                    await comm.send_json_to({"type": "start_game"})
+                deadline = options["time_per_question"] + options["reveal_seconds"] + 30
+                while True:
+                    out = await comm.receive_output(timeout=deadline)
+                    if out.get("type") != "websocket.send":
+                        continue
+                    now = time.time()
+                    msg = self._decode(out, compact, msgpack, protocol)
+                    kind = msg.get("type")
+                    if kind == "clash.new_question":
+                        seen += 1
+                        fanout_ms.append((now - msg["server_time"]) * 1000)
+                        idx = msg["index"]
+                        if drop_after is not None and idx >= drop_after:
+                            return
+                        # Answer from a side task so the receive loop keeps timing broadcasts.
+                        answering.append(asyncio.create_task(answer_later(comm, compact, idx, sent_at)))
+                    elif kind == "answer_confirmed":
+                        # One answer per question, and the next question waits for this one to end.
+                        idx = max(sent_at, key=sent_at.get)
+                        ack_ms.append((time.perf_counter() - sent_at[idx]) * 1000)
+                        confirmed[uid].append((idx, msg["points_earned"]))
+                    elif kind == "clash.game_finished":
+                        missed["questions"] += num_questions - seen
+                        return
+            except asyncio.TimeoutError:
+                missed["finished"] += 1
+            finally:
+                for task in answering:
+                    task.cancel()
+                await comm.disconnect()
+
+        usage_before = resource.getrusage(resource.RUSAGE_SELF)
+        wall_start = time.perf_counter()
+        tasks = []
+        for room, members in rooms:
+            # Everyone in a room connects before the host starts.
+            started = asyncio.Event()
+            room_tasks = [
+                asyncio.create_task(player(room, user, token, i == 0, started))
+                for i, (user, token) in enumerate(members)
+            ]
+            tasks.extend(room_tasks)
+            asyncio.get_running_loop().call_later(0.5 + 0.01 * len(members), started.set)
+        await asyncio.gather(*tasks)
+        wall = time.perf_counter() - wall_start
+        usage_after = resource.getrusage(resource.RUSAGE_SELF)
+
+        cpu = (usage_after.ru_utime - usage_before.ru_utime) + (usage_after.ru_stime - usage_before.ru_stime)
+        players = sum(len(members) for _, members in rooms)
+        return {
+            "rooms": len(rooms),
+            "players": players,
+            "questions": num_questions,
+            "channel_layer": self._layer_name(),
+            "wall_seconds": round(wall, 2),
+            "cpu_seconds": round(cpu, 2),
+            "cpu_ms_per_player": round(cpu * 1000 / players, 2),
+            "cpu_ms_per_player_question": round(cpu * 1000 / (players * num_questions), 3),
+            "fanout_latency": _summary(fanout_ms),
+            "answer_ack": _summary(ack_ms),
+            "answers_sent": counts["answers_sent"],
+            "unacked_answers": counts["answers_sent"] - len(ack_ms),
+            "missed_questions": missed["questions"],
+            "players_never_finished": missed["finished"],
+            "errors": errors[:20],
+            "_confirmed": confirmed,
+        }
+
+    @staticmethod
+    def _decode(out: dict, compact: bool, msgpack, protocol) -> dict:
+        if not compact:
+            return json.loads(out["text"])
+        frame = msgpack.unpackb(out["bytes"])
+        if isinstance(frame, dict):
+            return frame
+        if frame[0] == protocol.QUESTION:
+            return {"type": "clash.new_question", "index": frame[1], "server_time": frame[4]}
+        if frame[0] == protocol.ANSWER_CONFIRMED:
+            return {"type": "answer_confirmed", "points_earned": frame[2]}
+        return {"type": f"frame.{frame[0]}"}
+
+    @staticmethod
+    def _layer_name() -> str:
+        from django.conf import settings
+        return settings.CHANNEL_LAYERS["default"]["BACKEND"].rsplit(".", 1)[-1]
+
+    # ─────────────────────────── Verification ───────────────────────────
+
+    def _verify(self, rooms: list[tuple], confirmed: dict) -> dict:
+        from apps.clash.models import ClashAnswer, ClashParticipant, ClashRoom
+
+        room_ids = [room.id for room, _ in rooms]
+        unfinished = ClashRoom.objects.filter(id__in=room_ids).exclude(status=ClashRoom.FINISHED).count()
+        persisted = set(
+            ClashAnswer.objects.filter(room_id__in=room_ids).values_list("user_id", "q_idx")
+        )
+        lost_answers = score_mismatches = 0
+        for p in ClashParticipant.objects.filter(room_id__in=room_ids):
+            acked = confirmed.get(str(p.user_id), [])
+            lost_answers += sum(1 for idx, _ in acked if (p.user_id, idx) not in persisted)
+            if acked and p.score != sum(points for _, points in acked):
+                score_mismatches += 1
+        return {
+            "unfinished_rooms": unfinished,
+            "lost_answers": lost_answers,
+            "score_mismatches": score_mismatches,
+        }
+
+    def _print(self, report: dict) -> None:
+        self.stdout.write(
+            f"{report['rooms']} rooms x {report['players'] // report['rooms']} players, "
+            f"{report['questions']} questions on {report['channel_layer']} in {report['wall_seconds']}s"
+        )
+        for label in ("fanout_latency", "answer_ack"):
+            s = report[label]
+            self.stdout.write(
+                f"  {label:<15} n={s['count']:<6} p50={s['p50_ms']}ms p90={s['p90_ms']}ms "
+                f"p99={s['p99_ms']}ms max={s['max_ms']}ms"
+            )
+        self.stdout.write(
+            f"  cpu             {report['cpu_seconds']}s total, {report['cpu_ms_per_player']}ms/player, "
+            f"{report['cpu_ms_per_player_question']}ms/player/question"
+        )
+        lost = (
+            report["lost_answers"] + report["score_mismatches"] + report["missed_questions"]
+            + report["unacked_answers"]
+            + report["players_never_finished"] + report["unfinished_rooms"]
+        )
+        style = self.style.SUCCESS if not lost and not report["errors"] else self.style.ERROR
+        self.stdout.write(style(
+            f"  lost updates    unacked={report['unacked_answers']}/{report['answers_sent']} "
+            f"answers={report['lost_answers']} score_mismatches={report['score_mismatches']} "
+            f"missed_questions={report['missed_questions']} never_finished={report['players_never_finished']} "
+            f"unfinished_rooms={report['unfinished_rooms']}"
+        ))
+        for error in report["errors"]:
+            self.stdout.write(self.style.WARNING(f"  {error}"))
@@ -0,0 +1,70 @@
+"""
+Warm the Clash question pools (see apps/clash/question_pool.py).
+
+Rooms on a plain subject are served from these pools, and the web process
+refills a pool in the background when a room finds it short. Run this to
+prepare popular subjects before a class or event. Without --subject it tops
+up every pool that already exists.
+
+Usage:
+    python manage.py refill_clash_pools
+    python manage.py refill_clash_pools --subject "World History" --difficulty easy --target 100
+    python manage.py refill_clash_pools --dry-run
+"""
+import asyncio
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = "Pre-generate Clash questions for each (subject, difficulty) pool below its target size"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--subject", action="append", default=None, help="Subject to fill (repeatable; default: existing pools)")
+        parser.add_argument(
+            "--difficulty",
+            choices=["easy", "medium", "hard"],
+            action="append",
+            default=None,
+            help="Difficulty to fill with --subject (repeatable; default: all three)",
+        )
+        parser.add_argument("--target", type=int, default=None, help="Questions per pool (default: CLASH_POOL_TARGET_SIZE)")
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Show pool sizes without generating anything",
+        )
+
+    def handle(self, *args, **options):
+        from apps.clash import question_pool
+        from apps.clash.models import PooledQuestion
+
+        target = options["target"] or question_pool.target_size()
+        if options["subject"]:
+            pools = [
+                (question_pool.normalize_subject(subject), difficulty)
+                for subject in options["subject"]
+                for difficulty in options["difficulty"] or ["easy", "medium", "hard"]
+            ]
+        elif options["difficulty"]:
+            raise CommandError("--difficulty needs --subject")
+        else:
+            pools = list(
+                PooledQuestion.objects.order_by("subject_key", "difficulty")
+                .values_list("subject_key", "difficulty").distinct()
+            )
+
+        for subject, difficulty in pools:
+            size = question_pool.pool_size(subject, difficulty)
+            if options["dry_run"] or size >= target:
+                self.stdout.write(f"  {subject} / {difficulty}: {size}/{target}")
+                continue
+            try:
+                added = asyncio.run(question_pool.refill_pool(subject, difficulty, target))
+            except question_pool.QuestionGenerationError as exc:
+                self.stdout.write(self.style.ERROR(f"  {subject} / {difficulty}: {exc.detail}"))
+                continue
+            self.stdout.write(self.style.SUCCESS(f"  {subject} / {difficulty}: +{added} ({size + added}/{target})"))
+
+        if options["dry_run"]:
+            self.stdout.write(self.style.WARNING("Dry run — no DB writes"))
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.1 on 2026-10-19 00:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clash', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='clashroom',
+            name='char_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='clashroom',
+            name='token_estimate',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
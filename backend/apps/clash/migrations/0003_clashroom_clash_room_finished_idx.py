@@ -0,0 +1,19 @@
+# Generated by Django 5.2.1 on 2026-10-19 00:23
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clash', '0002_clashroom_char_count_clashroom_token_estimate'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='clashroom',
+            index=models.Index(fields=['status', 'finished_at', 'id'], name='clash_room_finished_idx'),
+        ),
+    ]
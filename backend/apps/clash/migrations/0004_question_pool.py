@@ -0,0 +1,42 @@
+# Generated by Django 5.2.1 on 2026-10-19 00:52
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clash', '0003_clashroom_clash_room_finished_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PooledQuestion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('subject_key', models.CharField(max_length=200)),
+                ('difficulty', models.CharField(max_length=20)),
+                ('question', models.JSONField()),
+                ('fingerprint', models.CharField(max_length=64)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'unique_together': {('subject_key', 'difficulty', 'fingerprint')},
+            },
+        ),
+        migrations.CreateModel(
+            name='PooledQuestionServe',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('served_at', models.DateTimeField(auto_now_add=True)),
+                ('question', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='serves', to='clash.pooledquestion')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='clash_pool_serves', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('user', 'question')},
+            },
+        ),
+    ]
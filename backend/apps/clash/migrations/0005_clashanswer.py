@@ -0,0 +1,34 @@
+# Generated by Django 5.2.1 on 2026-10-19 01:00
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clash', '0004_question_pool'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ClashAnswer',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('q_idx', models.PositiveIntegerField()),
+                ('answer', models.CharField(blank=True, max_length=200)),
+                ('correct', models.BooleanField(default=False)),
+                ('points', models.IntegerField(default=0)),
+                ('ms_taken', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('room', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='answer_records', to='clash.clashroom')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='clash_answers', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['room', 'q_idx', 'id'],
+                'unique_together': {('room', 'user', 'q_idx')},
+            },
+        ),
+    ]
@@ -3,6 +3,8 @@ import string
 from django.db import models
 from django.conf import settings
 
+from apps.core.text_metrics import CharCountedModel
+
 MAX_PARTICIPANTS = 20
 VALID_TIME_OPTIONS = [10, 15, 20, 30]
 DEFAULT_TIME_PER_QUESTION = 20
@@ -13,7 +15,7 @@ def _generate_room_code():
     return ''.join(random.choices(chars, k=6))
 
 
-class ClashRoom(models.Model):
+class ClashRoom(CharCountedModel):
     WAITING = 'waiting'
     ACTIVE = 'active'
     FINISHED = 'finished'
@@ -39,8 +41,11 @@ class ClashRoom(models.Model):
     started_at = models.DateTimeField(null=True, blank=True)
     finished_at = models.DateTimeField(null=True, blank=True)
 
+    CHAR_SOURCE_FIELDS = ('questions',)
+
     class Meta:
         ordering = ['-created_at']
+        indexes = [models.Index(fields=['status', 'finished_at', 'id'], name='clash_room_finished_idx')]
 
     def __str__(self):
         return f"Clash {self.room_code} — {self.subject} ({self.status})"
@@ -66,3 +71,55 @@ class ClashParticipant(models.Model):
 
     def __str__(self):
         return f"{self.display_name} in {self.room.room_code}"
+
+
+class ClashAnswer(models.Model):
+    """One accepted answer, written behind the live game in batches (see GameRunner._flush_answers)."""
+    room = models.ForeignKey(ClashRoom, on_delete=models.CASCADE, related_name='answer_records')
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='clash_answers',
+    )
+    q_idx = models.PositiveIntegerField()
+    answer = models.CharField(max_length=200, blank=True)
+    correct = models.BooleanField(default=False)
+    points = models.IntegerField(default=0)
+    ms_taken = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ('room', 'user', 'q_idx')
+        ordering = ['room', 'q_idx', 'id']
+
+    def __str__(self):
+        return f"{self.user_id} on Q{self.q_idx + 1} in room {self.room_id}"
+
+
+class PooledQuestion(models.Model):
+    """A validated MCQ kept ready for instant rooms on a common subject (see question_pool.py)."""
+    subject_key = models.CharField(max_length=200)     # normalize_subject(subject)
+    difficulty = models.CharField(max_length=20)
+    question = models.JSONField()                      # {question, options, answer, explanation}
+    fingerprint = models.CharField(max_length=64)      # sha256 of the normalized question text
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ('subject_key', 'difficulty', 'fingerprint')
+
+    def __str__(self):
+        return f"{self.subject_key} ({self.difficulty}): {self.question.get('question', '')[:60]}"
+
+
+class PooledQuestionServe(models.Model):
+    """Records that a host has received a pooled question, so it is not served to them again."""
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='clash_pool_serves',
+    )
+    question = models.ForeignKey(PooledQuestion, on_delete=models.CASCADE, related_name='serves')
+    served_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ('user', 'question')
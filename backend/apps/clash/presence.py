@@ -0,0 +1,114 @@
+"""
+Who is connected to each Clash room.
+
+With ``REDIS_URL`` set, presence is one sorted set per room:
+
+  clash:{code}:presence   zset  "{user_id}:{channel_name}" -> expiry (Unix seconds)
+
+Members are connections, not users: a player with a second tab open, or whose
+lobby socket closes just after the play screen's opens, stays online until
+their last socket goes. ``online_user_ids`` collapses members to distinct users.
+
+Joining and heartbeats are a ZADD and leaving is a ZREM, each one atomic
+command, so concurrent joins can no longer overwrite each other the way the
+old read-modify-write dict in the Django cache did. Clients send a
+``heartbeat`` every 10 seconds, and each one pushes the connection's expiry
+``CLASH_PRESENCE_TTL_SECONDS`` ahead. A socket that dies without closing
+drops out of the count within one TTL instead of staying "online" for hours.
+Counts ignore expired members, and heartbeats prune them.
+
+Without Redis the same interface is a per-process dict of expiries.
+
+The coordinator sizes the "everyone answered" check from ``expected_answers``
+at each question start. The consumer resizes it as players come, go or time
+out, and marks who is online in the lobby.
+"""
+import time
+
+from django.conf import settings
+
+from .state import _redis
+
+
+def _ttl() -> float:
+    return float(getattr(settings, "CLASH_PRESENCE_TTL_SECONDS", 30))
+
+
+def presence_key(room_code: str) -> str:
+    return f'clash:{{{room_code}}}:presence'    # same hash tag as the room's state keys
+
+
+def _member(user_id: str, connection: str) -> str:
+    return f'{user_id}:{connection}'
+
+
+def _user_of(member: str) -> str:
+    return member.split(':', 1)[0]
+
+
+# Add or refresh one member, prune the expired ones; returns added + pruned.
+_MARK_ONLINE_LUA = """
+local added = redis.call('ZADD', KEYS[1], ARGV[2], ARGV[1])
+local pruned = redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', '(' .. ARGV[3])
+redis.call('EXPIRE', KEYS[1], ARGV[4])
+return added + pruned
+"""
+
+_memory_presence: dict[str, dict[str, float]] = {}
+
+
+async def mark_online(room_code: str, user_id: str, connection: str) -> int:
+    """Mark one connection online for one TTL (connect and every heartbeat).
+
+    Returns how many members were added or pruned: nonzero when this connection
+    was missing (already pruned, or a new socket) or another one timed out,
+    i.e. whenever the online set may have changed.
+    """
+    now = time.time()
+    expires = now + _ttl()
+    member = _member(user_id, connection)
+    if getattr(settings, "REDIS_URL", ""):
+        return int(await _redis().eval(
+            _MARK_ONLINE_LUA, 1, presence_key(room_code), member, expires, now, int(_ttl() * 2),
+        ))
+    members = _memory_presence.setdefault(room_code, {})
+    added = int(member not in members)
+    members[member] = expires
+    expired = [m for m, until in members.items() if until < now]
+    for m in expired:
+        del members[m]
+    return added + len(expired)
+
+
+async def mark_offline(room_code: str, user_id: str, connection: str) -> None:
+    member = _member(user_id, connection)
+    if getattr(settings, "REDIS_URL", ""):
+        await _redis().zrem(presence_key(room_code), member)
+        return
+    members = _memory_presence.get(room_code)
+    if members is not None:
+        members.pop(member, None)
+        if not members:
+            del _memory_presence[room_code]
+
+
+async def online_user_ids(room_code: str) -> set[str]:
+    """Distinct users with at least one live connection to the room."""
+    now = time.time()
+    if getattr(settings, "REDIS_URL", ""):
+        members = await _redis().zrangebyscore(presence_key(room_code), now, "+inf")
+    else:
+        members = [m for m, until in _memory_presence.get(room_code, {}).items() if until >= now]
+    return {_user_of(m) for m in members}
+
+
+async def expected_answers(room_code: str, player_ids) -> int:
+    """How many answers close a question: the room's players who are online.
+
+    Only roster members count, so a stray presence entry cannot hold a question
+    open. If presence knows nobody (an evicted key, say), fall back to the full
+    roster and let the deadline close the question.
+    """
+    players = {str(uid) for uid in player_ids}
+    online = len(players & await online_user_ids(room_code))
+    return max(1, online or len(players))
@@ -0,0 +1,125 @@
+"""
+Compact Clash WebSocket protocol (opt-in).
+
+A client that offers the ``clash.msgpack.v1`` subprotocol at connect gets
+binary MessagePack frames instead of JSON. Each frame is an array whose first
+element is an opcode, so keys are not repeated on the wire:
+
+  [GAME_STARTING, countdown]
+  [QUESTION_SET, total, time_limit, [sealed_0, sealed_1, ...]]
+  [QUESTION, index, key, time_limit, server_time]
+  [QUESTION_ENDED, index, correct_answer, explanation, top3, your_rank, your_score]
+      top3 entries: [user_id, display_name, score, rank, profile_image]
+  [ANSWER_CONFIRMED, correct, points_earned, total_score, correct_answer]
+  [CATCHUP, index, key, time_limit, time_remaining, your_rank, your_score]
+
+Any other event is sent as its usual dict, packed as MessagePack.
+
+The question set goes out once, right after GAME_STARTING (or before CATCHUP
+for a late joiner). Every question is sealed with its own key, so the client
+holds all texts from the start but can read one only when its QUESTION frame
+carries the key. After that, a new question costs ~40 bytes per player
+instead of the full text and options. Correct answers are never in the
+set; they only arrive in QUESTION_ENDED.
+
+Sealing: ``msgpack([question, options])`` XOR a keystream of
+``SHA-256(key || counter)`` blocks (32 bytes each, counter as 4-byte
+big-endian). A question key is ``HMAC-SHA256(SECRET_KEY, "clash-question:{room_id}:{index}")``
+truncated to 16 bytes. It keeps players from reading ahead; it is not meant to
+protect anything beyond that.
+
+Clients may send either JSON text or MessagePack binary. The compact forms are
+``[SUBMIT_ANSWER, index, answer]``, ``[START_GAME]`` and ``[HEARTBEAT]``.
+"""
+import hashlib
+import hmac
+
+import msgpack
+from django.conf import settings
+
+SUBPROTOCOL = "clash.msgpack.v1"
+
+# Server → client
+GAME_STARTING = 1
+QUESTION_SET = 2
+QUESTION = 3
+QUESTION_ENDED = 4
+ANSWER_CONFIRMED = 5
+CATCHUP = 6
+
+# Client → server
+START_GAME = 16
+SUBMIT_ANSWER = 17
+HEARTBEAT = 18
+
+
+def question_key(room_id: int, index: int) -> bytes:
+    msg = f"clash-question:{room_id}:{index}".encode()
+    return hmac.new(settings.SECRET_KEY.encode(), msg, hashlib.sha256).digest()[:16]
+
+
+def seal(key: bytes, data: bytes) -> bytes:
+    """XOR ``data`` with the key's SHA-256 keystream; the same call unseals."""
+    out = bytearray(data)
+    for block in range(0, len(out), 32):
+        pad = hashlib.sha256(key + (block // 32).to_bytes(4, "big")).digest()
+        for i, b in enumerate(pad[:len(out) - block]):
+            out[block + i] ^= b
+    return bytes(out)
+
+
+_question_sets: dict[tuple[int, int], bytes] = {}
+
+
+def question_set_frame(room) -> bytes:
+    """The packed QUESTION_SET frame for a room snapshot, built once per snapshot version."""
+    cache_key = (room.id, room.version)
+    frame = _question_sets.get(cache_key)
+    if frame is None:
+        sealed = [
+            seal(question_key(room.id, i), msgpack.packb([q.get('question', ''), q.get('options', [])]))
+            for i, q in enumerate(room.questions)
+        ]
+        frame = msgpack.packb([QUESTION_SET, len(room.questions), room.time_per_question, sealed])
+        if len(_question_sets) >= 256:
+            _question_sets.clear()
+        _question_sets[cache_key] = frame
+    return frame
+
+
+def encode(event: dict, room) -> bytes:
+    """Pack one outgoing event (as sent to JSON clients) into its compact frame."""
+    kind = event.get('type')
+    if kind == 'clash.game_starting':
+        frame = [GAME_STARTING, event['countdown']]
+    elif kind == 'clash.new_question':
+        frame = [QUESTION, event['index'], question_key(room.id, event['index']),
+                 event['time_limit'], event['server_time']]
+    elif kind == 'clash.question_ended':
+        top3 = [[e['user_id'], e['display_name'], e['score'], e['rank'], e['profile_image']] for e in event['top3']]
+        frame = [QUESTION_ENDED, event['index'], event['correct_answer'], event['explanation'],
+                 top3, event.get('your_rank'), event.get('your_score')]
+    elif kind == 'answer_confirmed':
+        frame = [ANSWER_CONFIRMED, event['correct'], event['points_earned'],
+                 event['total_score'], event['correct_answer']]
+    elif kind == 'game_catchup':
+        frame = [CATCHUP, event['index'], question_key(room.id, event['index']), event['time_limit'],
+                 event['time_remaining'], event.get('your_rank'), event.get('your_score')]
+    else:
+        return msgpack.packb(event)
+    return msgpack.packb(frame)
+
+
+def decode(data: bytes) -> dict:
+    """Unpack one incoming client frame into the dict ``receive_json`` expects."""
+    frame = msgpack.unpackb(data)
+    if isinstance(frame, dict):
+        return frame
+    if isinstance(frame, list) and frame:
+        if frame[0] == SUBMIT_ANSWER and len(frame) >= 3:
+            return {'type': 'submit_answer', 'question_index': frame[1], 'answer': frame[2]}
+        if frame[0] == START_GAME:
+            return {'type': 'start_game'}
+        if frame[0] == HEARTBEAT:
+            return {'type': 'heartbeat'}
+    return {}
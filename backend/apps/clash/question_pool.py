@@ -0,0 +1,238 @@
+"""
+Pre-generated Clash question pools.
+
+Creating a room on a plain subject (no study text from the host) used to wait
+for a full ``/quiz/`` generation. Such rooms are now served from a pool of
+validated MCQs per (normalized subject, difficulty):
+
+  take_from_pool   samples questions this host has not been served before and
+                   records them in ``PooledQuestionServe``, so hosts never see
+                   a repeat. Returns None when the pool cannot fill the room.
+  schedule_refill  tops the pool up to ``CLASH_POOL_TARGET_SIZE`` in a daemon
+                   thread, ``CLASH_POOL_REFILL_BATCH`` questions per LLM call.
+                   A cache lock keeps one refill per pool across workers.
+                   Refills run on their own event loop, so they use private
+                   HTTP clients and close them when done. The server's
+                   shared clients are never touched.
+
+On a miss the view generates synchronously as before, and those questions
+are added to the pool too. The first room on a subject seeds it, and
+later rooms on that subject open instantly.
+``manage.py refill_clash_pools`` warms pools ahead of time.
+"""
+import asyncio
+import hashlib
+import logging
+import random
+import re
+import threading
+from time import perf_counter
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections, transaction
+
+from apps.core.async_client import build_fastapi_headers, call_fastapi, get_async_client, private_async_clients
+from apps.dashboard.telemetry import record_ai_latency
+
+from .models import PooledQuestion, PooledQuestionServe
+
+logger = logging.getLogger(__name__)
+
+REFILL_LOCK_TIMEOUT = 600
+MAX_REFILL_ROUNDS = 5       # give up on a pool the LLM keeps answering with duplicates
+
+
+class QuestionGenerationError(Exception):
+    """The quiz service failed or returned no usable questions; carries the HTTP status for the view."""
+
+    def __init__(self, status: int, detail: str):
+        super().__init__(detail)
+        self.status = status
+        self.detail = detail
+
+
+def target_size() -> int:
+    return int(getattr(settings, "CLASH_POOL_TARGET_SIZE", 60))
+
+
+def _refill_batch() -> int:
+    return int(getattr(settings, "CLASH_POOL_REFILL_BATCH", 20))
+
+
+def normalize_subject(subject: str) -> str:
+    return re.sub(r"\s+", " ", subject).strip().lower()[:200]
+
+
+def _fingerprint(text: str) -> str:
+    return hashlib.sha256(re.sub(r"\W+", " ", text).strip().lower().encode()).hexdigest()
+
+
+def validate_question(q) -> dict | None:
+    """Cleaned MCQ with a letter answer, or None if it is not playable (no text, <2 options, answer not among them)."""
+    if not isinstance(q, dict):
+        return None
+    text = str(q.get("question") or "").strip()
+    generated = [str(o).strip() for o in q.get("options") or []]
+    answer = str(q.get("answer") or "").strip()
+    # A letter answer refers to the options as generated, so resolve it before
+    # empty options are dropped and the rest shift up.
+    correct = dict(zip("abcdefghijklmnopqrstuvwxyz", generated)).get(answer.lower())
+    options = [o for o in generated if o]
+    if not correct:
+        # Some generations answer with the option text.
+        correct = next((o for o in options if o.lower() == answer.lower()), None)
+    if not text or len(options) < 2 or not correct:
+        return None
+    return {
+        "question": text,
+        "type": "mcq",
+        "options": options,
+        # Players submit the option letter ("A" = first option), so store the answer as one.
+        "answer": chr(ord("A") + options.index(correct)),
+        "explanation": str(q.get("explanation") or ""),
+    }
+
+
+# ── Generation ────────────────────────────────────────────────────────────────
+
+def _default_study_text(subject: str, difficulty: str) -> str:
+    return (
+        f"Generate a {difficulty} quiz on {subject}. "
+        f"Use broad general knowledge of {subject}. "
+        f"Cover varied subtopics so players with different preparation levels all encounter something familiar."
+    )
+
+
+async def generate_questions(
+    subject: str, difficulty: str, count: int, study_text: str = "", get_client=get_async_client,
+) -> list[dict]:
+    """Ask the quiz service for ``count`` MCQs; raises QuestionGenerationError."""
+    try:
+        t0 = perf_counter()
+        resp = await call_fastapi(
+            "POST",
+            "/quiz/",
+            json={
+                "subject": subject,
+                "study_text": study_text or _default_study_text(subject, difficulty),
+                "num_mcq": count,
+                "num_short": 0,
+                "difficulty": difficulty,
+                "source_type": "text",
+            },
+            headers=build_fastapi_headers(),
+            timeout=120.0,
+            get_client=get_client,
+        )
+        record_ai_latency('clash', int((perf_counter() - t0) * 1000))
+    except Exception as exc:
+        logger.error("FastAPI quiz generation failed for Clash: %s", exc)
+        raise QuestionGenerationError(503, "Quiz service unavailable. Try again.")
+
+    if resp.status_code != 200:
+        logger.error("FastAPI /quiz/ returned %s", resp.status_code)
+        raise QuestionGenerationError(502, "Question generation failed.")
+
+    questions = [q for q in map(validate_question, resp.json().get("mcq_questions", [])) if q]
+    if not questions:
+        raise QuestionGenerationError(502, "No questions were generated. Try a different subject.")
+    return questions[:count]
+
+
+# ── Pool ──────────────────────────────────────────────────────────────────────
+
+def pool_size(subject: str, difficulty: str) -> int:
+    return PooledQuestion.objects.filter(subject_key=normalize_subject(subject), difficulty=difficulty).count()
+
+
+def add_to_pool(subject: str, difficulty: str, questions: list[dict]) -> list[PooledQuestion]:
+    """Store validated questions (duplicates ignored); returns the pooled rows for them."""
+    key = normalize_subject(subject)
+    rows = {}
+    for q in filter(None, map(validate_question, questions)):
+        fp = _fingerprint(q["question"])
+        rows.setdefault(fp, PooledQuestion(subject_key=key, difficulty=difficulty, question=q, fingerprint=fp))
+    PooledQuestion.objects.bulk_create(rows.values(), ignore_conflicts=True)
+    return list(PooledQuestion.objects.filter(subject_key=key, difficulty=difficulty, fingerprint__in=rows))
+
+
+def mark_served(user, pooled: list[PooledQuestion]) -> None:
+    PooledQuestionServe.objects.bulk_create(
+        [PooledQuestionServe(user=user, question=p) for p in pooled], ignore_conflicts=True,
+    )
+
+
+def take_from_pool(user, subject: str, difficulty: str, count: int) -> list[dict] | None:
+    """``count`` random questions this host has not been served, or None if the pool is short."""
+    unseen = (
+        PooledQuestion.objects
+        .filter(subject_key=normalize_subject(subject), difficulty=difficulty)
+        .exclude(serves__user=user)
+    )
+    ids = list(unseen.values_list("id", flat=True))
+    if len(ids) < count:
+        return None
+    picked = random.sample(ids, count)
+    with transaction.atomic():
+        pooled = list(PooledQuestion.objects.filter(id__in=picked))
+        mark_served(user, pooled)
+    random.shuffle(pooled)
+    return [p.question for p in pooled]
+
+
+# ── Background refill ─────────────────────────────────────────────────────────
+
+def _lock_key(subject: str, difficulty: str) -> str:
+    return f"clash_pool_refill_{_fingerprint(normalize_subject(subject))[:16]}_{difficulty}"
+
+
+async def refill_pool(subject: str, difficulty: str, target: int | None = None) -> int:
+    """Generate until the pool holds ``target`` questions; returns how many were added.
+
+    Called under ``asyncio.run`` (refill thread, management command), so it uses
+    private HTTP clients rather than the ones cached for the server loop.
+    """
+    target = target or target_size()
+    added = 0
+    async with private_async_clients() as get_client:
+        for _ in range(MAX_REFILL_ROUNDS):
+            before = await sync_to_async(pool_size)(subject, difficulty)
+            if before >= target:
+                break
+            questions = await generate_questions(
+                subject, difficulty, min(target - before, _refill_batch()), get_client=get_client,
+            )
+            await sync_to_async(add_to_pool)(subject, difficulty, questions)
+            gained = await sync_to_async(pool_size)(subject, difficulty) - before
+            added += gained
+            if not gained:
+                break
+    return added
+
+
+def _refill_in_thread(subject: str, difficulty: str) -> None:
+    try:
+        added = asyncio.run(refill_pool(subject, difficulty))
+        logger.info("Clash pool %r/%s refilled with %d questions", subject, difficulty, added)
+    except QuestionGenerationError as exc:
+        logger.warning("Clash pool refill for %r/%s failed: %s", subject, difficulty, exc.detail)
+    except Exception:
+        logger.exception("Clash pool refill for %r/%s failed", subject, difficulty)
+    finally:
+        cache.delete(_lock_key(subject, difficulty))
+        close_old_connections()
+
+
+def schedule_refill(subject: str, difficulty: str) -> bool:
+    """Start a background refill if the pool is below target and none is running; True if started."""
+    if pool_size(subject, difficulty) >= target_size():
+        return False
+    if not cache.add(_lock_key(subject, difficulty), 1, timeout=REFILL_LOCK_TIMEOUT):
+        return False
+    threading.Thread(
+        target=_refill_in_thread, args=(normalize_subject(subject), difficulty),
+        name="clash-pool-refill", daemon=True,
+    ).start()
+    return True
@@ -0,0 +1,23 @@
+"""
+Invalidates cached room snapshots (see snapshot.py) when a room or its
+participant list changes.
+"""
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import ClashParticipant, ClashRoom
+from .snapshot import invalidate_snapshot
+
+
+@receiver([post_save, post_delete], sender=ClashRoom)
+def _room_changed(sender, instance, **kwargs):
+    room_id = instance.pk
+    # After commit, so a reload can never read the old rows under the new version.
+    transaction.on_commit(lambda: invalidate_snapshot(room_id))
+
+
+@receiver([post_save, post_delete], sender=ClashParticipant)
+def _participants_changed(sender, instance, **kwargs):
+    room_id = instance.room_id
+    transaction.on_commit(lambda: invalidate_snapshot(room_id))
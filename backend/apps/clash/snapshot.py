@@ -0,0 +1,143 @@
+"""
+Per-process snapshot of a Clash room for the WebSocket hot path.
+
+Every connect, lobby broadcast and question end used to load ``ClashRoom``
+(with its full ``questions`` JSON) or re-query ``ClashParticipant`` with
+``select_related('user')``. When 40 players join in a few seconds, that is one
+participant query per join per connected consumer. A ``RoomSnapshot`` holds
+what those paths need (questions, timing, status, host and the participant
+list) and is shared by every consumer and game runner in the process.
+
+Freshness comes from a version counter in the Django cache
+(``clash_snapshot_v_{room_id}``, shared by all workers). Saving or deleting a
+room or a participant bumps it (see signals.py). Reads compare one cache
+value against the snapshot's version. Only a changed room is reloaded, and
+concurrent reloads of the same room in a process share one query.
+"""
+import asyncio
+import time
+from dataclasses import dataclass
+from functools import cached_property
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+
+from .models import ClashParticipant, ClashRoom
+
+SNAPSHOT_TTL_SECONDS = 600       # local safety net; versions handle invalidation
+VERSION_TTL_SECONDS = 7200
+
+
+@dataclass(frozen=True)
+class ParticipantInfo:
+    user_id: str
+    username: str
+    display_name: str
+    is_host: bool
+    profile_image: str
+
+
+@dataclass(frozen=True)
+class RoomSnapshot:
+    id: int
+    room_code: str
+    status: str
+    host_id: int
+    questions: list
+    time_per_question: int
+    participants: tuple[ParticipantInfo, ...]
+    version: int
+    loaded_at: float
+
+    @cached_property
+    def participants_by_id(self) -> dict[str, ParticipantInfo]:
+        return {p.user_id: p for p in self.participants}
+
+    def is_host(self, user_id) -> bool:
+        return any(p.is_host and p.user_id == str(user_id) for p in self.participants)
+
+
+def _version_key(room_id: int) -> str:
+    return f'clash_snapshot_v_{room_id}'
+
+
+def _version(room_id: int) -> int:
+    # Seeded from the clock so an evicted counter never matches an old snapshot.
+    return cache.get_or_set(_version_key(room_id), time.time_ns(), timeout=VERSION_TTL_SECONDS)
+
+
+def invalidate_snapshot(room_id: int) -> None:
+    try:
+        cache.incr(_version_key(room_id))
+    except ValueError:
+        pass    # no version yet: nobody can hold a snapshot of this room
+
+
+_snapshots: dict[str, RoomSnapshot] = {}
+_inflight: dict[tuple[int, str, int | None], asyncio.Future] = {}
+
+
+def _load(room_code: str) -> RoomSnapshot | None:
+    room = ClashRoom.objects.filter(room_code=room_code).first()
+    if room is None:
+        return None
+    # Read the version before the participants, so a join racing this load
+    # leaves the snapshot one version behind and it reloads on the next read.
+    version = _version(room.id)
+    participants = ClashParticipant.objects.filter(room=room).select_related('user')
+    return RoomSnapshot(
+        id=room.id,
+        room_code=room.room_code,
+        status=room.status,
+        host_id=room.host_id,
+        questions=room.questions,
+        time_per_question=room.time_per_question,
+        participants=tuple(
+            ParticipantInfo(
+                user_id=str(p.user.id),
+                username=p.user.username,
+                display_name=p.display_name,
+                is_host=p.is_host,
+                profile_image=p.user.profile_image or '',
+            )
+            for p in participants
+        ),
+        version=version,
+        loaded_at=time.monotonic(),
+    )
+
+
+async def _reload(room_code: str) -> RoomSnapshot | None:
+    cached = _snapshots.get(room_code)
+    if cached is not None and await sync_to_async(_version)(cached.id) == cached.version:
+        return cached   # a concurrent reload already caught up
+    snapshot = await sync_to_async(_load)(room_code)
+    now = time.monotonic()
+    for code, cached in list(_snapshots.items()):
+        if now - cached.loaded_at > SNAPSHOT_TTL_SECONDS:
+            _snapshots.pop(code, None)
+    if snapshot is None:
+        _snapshots.pop(room_code, None)
+    else:
+        _snapshots[room_code] = snapshot
+    return snapshot
+
+
+async def get_snapshot(room_code: str) -> RoomSnapshot | None:
+    """Current snapshot of the room, or None if it does not exist."""
+    cached = _snapshots.get(room_code)
+    current = None
+    if cached is not None and time.monotonic() - cached.loaded_at <= SNAPSHOT_TTL_SECONDS:
+        current = await sync_to_async(_version)(cached.id)
+        if current == cached.version:
+            return cached
+
+    # Callers that saw the same version share one reload; a caller that saw a
+    # newer version never waits on a reload that may have started before it.
+    key = (id(asyncio.get_running_loop()), room_code, current)
+    pending = _inflight.get(key)
+    if pending is None:
+        pending = asyncio.ensure_future(_reload(room_code))
+        _inflight[key] = pending
+        pending.add_done_callback(lambda _: _inflight.pop(key, None))
+    return await asyncio.shield(pending)
@@ -0,0 +1,529 @@
+"""
+Live Clash game state.
+
+Each room's state is split into small structures, so an answer touches only
+its own entries and never rewrites the whole game:
+
+  clash:{code}:meta         hash  phase, phase_deadline, current_question, question_start_time, ended_question
+  clash:{code}:answered:{i} hash  user_id -> "correct:points" for question i (dedupe)
+  clash:{code}:scores       zset  user_id -> running score (also the live leaderboard)
+  clash:{code}:log          list  one JSON record per accepted answer, in order
+  clash:{code}:events       pub/sub channel, "answered:{i}" once everyone expected has answered
+  clash:{code}:owner        string  lease of the worker currently running the game (coordinator.py)
+  clash:{code}:failures     string  how many times a runner for this game has crashed (coordinator.py)
+  clash:active_rooms        set   rooms with a game in progress, scanned for orphans
+
+The braces are literal: the room code is a Redis Cluster hash tag
+(``clash:{ABC123}:meta``), so all of a room's keys share one slot. Every script declares each key it touches in
+KEYS and only touches that room's keys. The global ``clash:active_rooms`` set
+is updated by separate commands, never inside a room script or transaction.
+
+With ``REDIS_URL`` set, ``submit_answer`` is a single Lua script. It checks
+that the question is still open, dedupes by user, computes the speed bonus
+from the stored start time, ``ZINCRBY``s the score and appends to the log,
+all atomically. Concurrent answers can no longer overwrite each other, and the
+cost of an answer does not depend on how many players are in the room.
+
+The game loop does not poll. ``start_question`` records how many answers to
+expect (the live player count, updated by ``set_expected`` as players come
+and go). The write that completes the set publishes an event, and
+``wait_all_answered`` blocks on that event until the question deadline.
+
+The scores sorted set doubles as the leaderboard. ``top(k)`` and a player's
+``standing`` (rank and score) cost O(log n) each, so the ranking sent at each
+question end never needs a full re-sort. Players are seeded at 0 when the game
+starts, so everyone has a rank from the first question.
+
+The meta hash also holds the game's schedule: the current ``phase``
+(countdown / question / reveal / finished) and its ``phase_deadline`` as a
+Unix timestamp. Phase transitions are compare-and-set, so the schedule alone
+is enough for another worker to resume a game, and a transition replayed by a
+worker that lost its lease is a no-op.
+
+Without Redis (local dev on the in-memory channel layer, one process) the same
+interface is backed by plain dicts under an ``asyncio.Lock``, with an
+``asyncio.Event`` per question.
+"""
+import asyncio
+import bisect
+import json
+import time
+from dataclasses import dataclass
+
+from django.conf import settings
+
+STATE_TTL_SECONDS = 7200
+ACTIVE_ROOMS_KEY = "clash:active_rooms"
+
+COUNTDOWN = "countdown"
+QUESTION = "question"
+REVEAL = "reveal"
+FINISHED = "finished"
+
+
+@dataclass(frozen=True)
+class AnswerResult:
+    accepted: bool
+    points: int = 0
+    total_score: int = 0
+    answered_count: int = 0
+
+
+def _points(correct: bool, now: float, started: float, time_limit: int, base: int, bonus_max: int) -> int:
+    if not correct:
+        return 0
+    elapsed = min(max(now - started, 0.0), time_limit)
+    return base + int(bonus_max * max(0.0, 1.0 - elapsed / time_limit))
+
+
+# ── Redis ─────────────────────────────────────────────────────────────────────
+
+_SUBMIT_LUA = """
+local meta, answered, scores, log = KEYS[1], KEYS[2], KEYS[3], KEYS[4]
+local uid, q_idx, correct, now = ARGV[1], ARGV[2], ARGV[3], tonumber(ARGV[4])
+local limit, base, bonus, ttl = tonumber(ARGV[5]), tonumber(ARGV[6]), tonumber(ARGV[7]), tonumber(ARGV[8])
+local channel = ARGV[10]
+
+if redis.call('HGET', meta, 'current_question') ~= q_idx then return {0, 0, 0, 0} end
+if redis.call('HGET', meta, 'ended_question') == q_idx then return {0, 0, 0, 0} end
+
+local started = tonumber(redis.call('HGET', meta, 'question_start_time') or ARGV[4])
+local elapsed = math.min(math.max(now - started, 0), limit)
+local points = 0
+if correct == '1' then
+  points = base + math.floor(bonus * math.max(0, 1 - elapsed / limit))
+end
+
+if redis.call('HSETNX', answered, uid, correct .. ':' .. points) == 0 then return {0, 0, 0, 0} end
+local total = redis.call('ZINCRBY', scores, points, uid)
+redis.call('RPUSH', log, cjson.encode({
+  user_id = uid, q_idx = tonumber(q_idx), answer = ARGV[9],
+  correct = correct == '1', points = points, ms_taken = math.floor(elapsed * 1000),
+}))
+for _, key in ipairs(KEYS) do redis.call('EXPIRE', key, ttl) end
+local count = redis.call('HLEN', answered)
+local expected = tonumber(redis.call('HGET', meta, 'expected_answers') or '0')
+if expected > 0 and count >= expected then redis.call('PUBLISH', channel, 'answered:' .. q_idx) end
+return {1, points, math.floor(tonumber(total)), count}
+"""
+
+# KEYS[2] is the answered hash of the question the caller saw as current; the
+# guard makes the call a no-op if the game has moved on since.
+_SET_EXPECTED_LUA = """
+if redis.call('EXISTS', KEYS[1]) == 0 then return 0 end
+redis.call('HSET', KEYS[1], 'expected_answers', ARGV[1])
+local current = redis.call('HGET', KEYS[1], 'current_question')
+if current ~= ARGV[2] or current == '-1' or redis.call('HGET', KEYS[1], 'ended_question') == current then return 0 end
+if redis.call('HLEN', KEYS[2]) >= tonumber(ARGV[1]) then
+  redis.call('PUBLISH', ARGV[3], 'answered:' .. current)
+  return 1
+end
+return 0
+"""
+
+_STANDING_LUA = """
+local score = tonumber(redis.call('ZSCORE', KEYS[1], ARGV[1]) or '0')
+return {redis.call('ZCOUNT', KEYS[1], '(' .. score, '+inf') + 1, score}
+"""
+
+_START_QUESTION_LUA = """
+if redis.call('EXISTS', KEYS[1]) == 0 then return 0 end
+if tonumber(redis.call('HGET', KEYS[1], 'current_question') or '-1') >= tonumber(ARGV[1]) then return 0 end
+redis.call('DEL', KEYS[2])
+redis.call('HSET', KEYS[1], 'current_question', ARGV[1], 'question_start_time', ARGV[2],
+  'expected_answers', ARGV[3], 'phase', 'question', 'phase_deadline', ARGV[4])
+redis.call('EXPIRE', KEYS[1], ARGV[5])
+return 1
+"""
+
+_END_QUESTION_LUA = """
+if redis.call('EXISTS', KEYS[1]) == 0 then return 0 end
+if redis.call('HGET', KEYS[1], 'ended_question') == ARGV[1] then return 0 end
+redis.call('HSET', KEYS[1], 'ended_question', ARGV[1], 'phase', 'reveal', 'phase_deadline', ARGV[2])
+return 1
+"""
+
+_FINISH_LUA = """
+if redis.call('EXISTS', KEYS[1]) == 0 or redis.call('HGET', KEYS[1], 'phase') == 'finished' then return 0 end
+redis.call('HSET', KEYS[1], 'phase', 'finished', 'phase_deadline', '0')
+return 1
+"""
+
+_RENEW_LEASE_LUA = """
+if redis.call('GET', KEYS[1]) ~= ARGV[1] then return 0 end
+redis.call('PEXPIRE', KEYS[1], ARGV[2])
+return 1
+"""
+
+_RELEASE_LEASE_LUA = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then return redis.call('DEL', KEYS[1]) end
+return 0
+"""
+
+_clients: dict = {}
+
+
+def _redis():
+    """One asyncio Redis client per event loop (connections are loop-bound)."""
+    import redis.asyncio as aioredis
+    loop = asyncio.get_running_loop()
+    client = _clients.get(id(loop))
+    if client is None:
+        client = aioredis.from_url(settings.REDIS_URL, decode_responses=True)
+        _clients[id(loop)] = client
+    return client
+
+
+class RedisClashState:
+    def __init__(self, room_code: str):
+        prefix = f"clash:{{{room_code}}}"    # hash tag: one cluster slot per room
+        self.room_code = room_code
+        self.meta_key = f"{prefix}:meta"
+        self.scores_key = f"{prefix}:scores"
+        self.log_key = f"{prefix}:log"
+        self.events_channel = f"{prefix}:events"
+        self.owner_key = f"{prefix}:owner"
+        self.failures_key = f"{prefix}:failures"
+        self._answered_prefix = f"{prefix}:answered:"
+
+    def _answered_key(self, idx: int) -> str:
+        return f"{self._answered_prefix}{idx}"
+
+    async def init_game(self, countdown_deadline: float, players=()) -> None:
+        r = _redis()
+        async with r.pipeline(transaction=True) as pipe:
+            pipe.delete(self.meta_key, self.scores_key, self.log_key, self.failures_key)
+            pipe.hset(self.meta_key, mapping={
+                "phase": COUNTDOWN,
+                "phase_deadline": repr(countdown_deadline),
+                "current_question": -1,
+                "ended_question": -1,
+            })
+            pipe.expire(self.meta_key, STATE_TTL_SECONDS)
+            if players:
+                pipe.zadd(self.scores_key, {user_id: 0 for user_id in players})
+                pipe.expire(self.scores_key, STATE_TTL_SECONDS)
+            await pipe.execute()
+        await r.sadd(ACTIVE_ROOMS_KEY, self.room_code)
+
+    async def exists(self) -> bool:
+        return bool(await _redis().exists(self.meta_key))
+
+    async def start_question(self, idx: int, start_time: float, expected: int, deadline: float) -> bool:
+        """Open question ``idx``; False if the game has already moved past it."""
+        keys = [self.meta_key, self._answered_key(idx)]
+        args = [idx, repr(start_time), max(1, expected), repr(deadline), STATE_TTL_SECONDS]
+        return bool(await _redis().eval(_START_QUESTION_LUA, len(keys), *keys, *args))
+
+    async def submit_answer(
+        self, user_id: str, idx: int, answer: str, correct: bool, *,
+        now: float, time_limit: int, base_points: int, speed_bonus_max: int,
+    ) -> AnswerResult:
+        keys = [self.meta_key, self._answered_key(idx), self.scores_key, self.log_key]
+        args = [
+            user_id, idx, int(correct), repr(now), time_limit, base_points, speed_bonus_max,
+            STATE_TTL_SECONDS, answer[:200], self.events_channel,
+        ]
+        accepted, points, total, answered = await _redis().eval(_SUBMIT_LUA, len(keys), *keys, *args)
+        if not accepted:
+            return AnswerResult(False)
+        return AnswerResult(True, int(points), int(total), int(answered))
+
+    async def end_question(self, idx: int, reveal_deadline: float) -> bool:
+        """Mark question ``idx`` ended and start its reveal; True only for the first caller."""
+        return bool(await _redis().eval(_END_QUESTION_LUA, 1, self.meta_key, idx, repr(reveal_deadline)))
+
+    async def finish(self) -> bool:
+        """Mark the game finished and drop it from the active registry; True only for the first caller."""
+        r = _redis()
+        finished = bool(await r.eval(_FINISH_LUA, 1, self.meta_key))
+        await r.srem(ACTIVE_ROOMS_KEY, self.room_code)
+        return finished
+
+    async def answered_count(self, idx: int) -> int:
+        return int(await _redis().hlen(self._answered_key(idx)))
+
+    async def set_expected(self, expected: int) -> None:
+        """Update the live player count; closes the current question if everyone left has answered."""
+        r = _redis()
+        current = await r.hget(self.meta_key, "current_question")
+        if current is None:
+            return
+        await r.eval(
+            _SET_EXPECTED_LUA, 2, self.meta_key, self._answered_key(int(current)),
+            max(1, expected), current, self.events_channel,
+        )
+
+    async def wait_all_answered(self, idx: int, timeout: float) -> bool:
+        """Block until everyone expected has answered question ``idx`` (True) or ``timeout`` passes (False)."""
+        r = _redis()
+        pubsub = r.pubsub()
+        await pubsub.subscribe(self.events_channel)
+        try:
+            # Anything published before the subscription is already visible in the counts.
+            meta = await r.hmget(self.meta_key, "expected_answers", "current_question")
+            if meta[1] is None or int(meta[1]) != idx:
+                return False
+            if await self.answered_count(idx) >= int(meta[0] or 1):
+                return True
+            loop = asyncio.get_running_loop()
+            deadline = loop.time() + timeout
+            wanted = f"answered:{idx}"
+            while (remaining := deadline - loop.time()) > 0:
+                message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=remaining)
+                if message and message.get("data") == wanted:
+                    return True
+            return False
+        finally:
+            await pubsub.unsubscribe(self.events_channel)
+            await pubsub.aclose()
+
+    async def progress(self) -> dict:
+        meta = await _redis().hgetall(self.meta_key)
+        if not meta:
+            return {}
+        return {
+            "phase": meta.get("phase", COUNTDOWN),
+            "phase_deadline": float(meta.get("phase_deadline", 0)),
+            "current_question": int(meta.get("current_question", -1)),
+            "ended_question": int(meta.get("ended_question", -1)),
+            "question_start_time": float(meta["question_start_time"]) if "question_start_time" in meta else None,
+        }
+
+    async def scores(self) -> dict[str, int]:
+        rows = await _redis().zrange(self.scores_key, 0, -1, withscores=True)
+        return {user_id: int(score) for user_id, score in rows}
+
+    async def top(self, k: int) -> list[tuple[str, int]]:
+        """The ``k`` highest scores, best first."""
+        rows = await _redis().zrevrange(self.scores_key, 0, k - 1, withscores=True)
+        return [(user_id, int(score)) for user_id, score in rows]
+
+    async def standing(self, user_id: str) -> tuple[int, int]:
+        """``(rank, score)``; rank is 1 + the number of strictly higher scores."""
+        rank, score = await _redis().eval(_STANDING_LUA, 1, self.scores_key, user_id)
+        return int(rank), int(score)
+
+    async def answer_log(self, start: int = 0) -> list[dict]:
+        return [json.loads(row) for row in await _redis().lrange(self.log_key, start, -1)]
+
+    async def acquire_lease(self, owner: str, ttl: float) -> bool:
+        return bool(await _redis().set(self.owner_key, owner, nx=True, px=int(ttl * 1000)))
+
+    async def renew_lease(self, owner: str, ttl: float) -> bool:
+        return bool(await _redis().eval(_RENEW_LEASE_LUA, 1, self.owner_key, owner, int(ttl * 1000)))
+
+    async def release_lease(self, owner: str) -> None:
+        await _redis().eval(_RELEASE_LEASE_LUA, 1, self.owner_key, owner)
+
+    async def record_failure(self) -> int:
+        """Count one crashed runner for this game; returns the running total."""
+        async with _redis().pipeline(transaction=True) as pipe:
+            pipe.incr(self.failures_key)
+            pipe.expire(self.failures_key, STATE_TTL_SECONDS)
+            failures, _ = await pipe.execute()
+        return int(failures)
+
+
+# ── In-process fallback ───────────────────────────────────────────────────────
+
+class _MemoryRoom:
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.meta = {
+            "phase": COUNTDOWN, "phase_deadline": 0.0,
+            "current_question": -1, "ended_question": -1, "question_start_time": None, "expected_answers": 1,
+        }
+        self.answered: dict[int, dict[str, str]] = {}
+        self.scores: dict[str, int] = {}
+        self.ordered: list[tuple[int, str]] = []    # (-score, user_id), kept sorted
+        self.log: list[dict] = []
+        self.all_answered: dict[int, asyncio.Event] = {}
+        self.expires_at = time.monotonic() + STATE_TTL_SECONDS
+
+    def add_score(self, user_id: str, points: int) -> int:
+        old = self.scores.get(user_id)
+        if old is not None:
+            del self.ordered[bisect.bisect_left(self.ordered, (-old, user_id))]
+        total = (old or 0) + points
+        self.scores[user_id] = total
+        bisect.insort(self.ordered, (-total, user_id))
+        return total
+
+
+_memory_rooms: dict[str, _MemoryRoom] = {}
+_memory_leases: dict[str, tuple[str, float]] = {}   # room_code -> (owner, monotonic expiry)
+_memory_active: set[str] = set()
+_memory_failures: dict[str, int] = {}
+
+
+class MemoryClashState:
+    def __init__(self, room_code: str):
+        self.room_code = room_code
+
+    def _room(self) -> _MemoryRoom | None:
+        room = _memory_rooms.get(self.room_code)
+        if room is not None and room.expires_at < time.monotonic():
+            _memory_rooms.pop(self.room_code, None)
+            return None
+        return room
+
+    async def init_game(self, countdown_deadline: float, players=()) -> None:
+        room = _MemoryRoom()
+        room.meta["phase_deadline"] = countdown_deadline
+        for user_id in players:
+            room.add_score(user_id, 0)
+        _memory_rooms[self.room_code] = room
+        _memory_active.add(self.room_code)
+        _memory_failures.pop(self.room_code, None)
+
+    async def exists(self) -> bool:
+        return self._room() is not None
+
+    async def start_question(self, idx: int, start_time: float, expected: int, deadline: float) -> bool:
+        room = self._room()
+        if room is None:
+            return False
+        async with room.lock:
+            if room.meta["current_question"] >= idx:
+                return False
+            room.meta.update(
+                phase=QUESTION, phase_deadline=deadline,
+                current_question=idx, question_start_time=start_time, expected_answers=max(1, expected),
+            )
+            room.answered[idx] = {}
+            room.all_answered.setdefault(idx, asyncio.Event())
+            room.expires_at = time.monotonic() + STATE_TTL_SECONDS
+            return True
+
+    async def submit_answer(
+        self, user_id: str, idx: int, answer: str, correct: bool, *,
+        now: float, time_limit: int, base_points: int, speed_bonus_max: int,
+    ) -> AnswerResult:
+        room = self._room()
+        if room is None:
+            return AnswerResult(False)
+        async with room.lock:
+            meta = room.meta
+            if meta["current_question"] != idx or meta["ended_question"] == idx:
+                return AnswerResult(False)
+            answered = room.answered.setdefault(idx, {})
+            if user_id in answered:
+                return AnswerResult(False)
+            started = meta["question_start_time"] or now
+            points = _points(correct, now, started, time_limit, base_points, speed_bonus_max)
+            answered[user_id] = f"{int(correct)}:{points}"
+            total = room.add_score(user_id, points)
+            room.log.append({
+                "user_id": user_id, "q_idx": idx, "answer": answer[:200], "correct": correct,
+                "points": points, "ms_taken": int(min(max(now - started, 0.0), time_limit) * 1000),
+            })
+            if len(answered) >= meta["expected_answers"]:
+                room.all_answered.setdefault(idx, asyncio.Event()).set()
+            return AnswerResult(True, points, total, len(answered))
+
+    async def end_question(self, idx: int, reveal_deadline: float) -> bool:
+        room = self._room()
+        if room is None:
+            return False
+        async with room.lock:
+            if room.meta["ended_question"] == idx:
+                return False
+            room.meta.update(ended_question=idx, phase=REVEAL, phase_deadline=reveal_deadline)
+            return True
+
+    async def finish(self) -> bool:
+        _memory_active.discard(self.room_code)
+        room = self._room()
+        if room is None:
+            return False
+        async with room.lock:
+            if room.meta["phase"] == FINISHED:
+                return False
+            room.meta.update(phase=FINISHED, phase_deadline=0.0)
+            return True
+
+    async def answered_count(self, idx: int) -> int:
+        room = self._room()
+        return len(room.answered.get(idx, {})) if room else 0
+
+    async def set_expected(self, expected: int) -> None:
+        room = self._room()
+        if room is None:
+            return
+        async with room.lock:
+            room.meta["expected_answers"] = max(1, expected)
+            idx = room.meta["current_question"]
+            if idx >= 0 and room.meta["ended_question"] != idx and len(room.answered.get(idx, {})) >= room.meta["expected_answers"]:
+                room.all_answered.setdefault(idx, asyncio.Event()).set()
+
+    async def wait_all_answered(self, idx: int, timeout: float) -> bool:
+        room = self._room()
+        if room is None:
+            return False
+        event = room.all_answered.setdefault(idx, asyncio.Event())
+        try:
+            await asyncio.wait_for(event.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    async def progress(self) -> dict:
+        room = self._room()
+        return dict(room.meta) if room else {}
+
+    async def scores(self) -> dict[str, int]:
+        room = self._room()
+        return dict(room.scores) if room else {}
+
+    async def top(self, k: int) -> list[tuple[str, int]]:
+        room = self._room()
+        return [(user_id, -neg) for neg, user_id in room.ordered[:k]] if room else []
+
+    async def standing(self, user_id: str) -> tuple[int, int]:
+        room = self._room()
+        if room is None:
+            return 1, 0
+        score = room.scores.get(user_id, 0)
+        return bisect.bisect_left(room.ordered, (-score, "")) + 1, score
+
+    async def answer_log(self, start: int = 0) -> list[dict]:
+        room = self._room()
+        return list(room.log[start:]) if room else []
+
+    async def acquire_lease(self, owner: str, ttl: float) -> bool:
+        holder = _memory_leases.get(self.room_code)
+        if holder is not None and holder[0] != owner and holder[1] > time.monotonic():
+            return False
+        _memory_leases[self.room_code] = (owner, time.monotonic() + ttl)
+        return True
+
+    async def renew_lease(self, owner: str, ttl: float) -> bool:
+        holder = _memory_leases.get(self.room_code)
+        if holder is None or holder[0] != owner or holder[1] <= time.monotonic():
+            return False
+        _memory_leases[self.room_code] = (owner, time.monotonic() + ttl)
+        return True
+
+    async def release_lease(self, owner: str) -> None:
+        holder = _memory_leases.get(self.room_code)
+        if holder is not None and holder[0] == owner:
+            _memory_leases.pop(self.room_code, None)
+
+    async def record_failure(self) -> int:
+        _memory_failures[self.room_code] = _memory_failures.get(self.room_code, 0) + 1
+        return _memory_failures[self.room_code]
+
+
+def get_state(room_code: str):
+    """State store for one room: Redis when configured, else in-process."""
+    if getattr(settings, "REDIS_URL", ""):
+        return RedisClashState(room_code)
+    return MemoryClashState(room_code)
+
+
+async def active_rooms() -> list[str]:
+    """Room codes with a game in progress (registered by ``init_game``, removed by ``finish``)."""
+    if getattr(settings, "REDIS_URL", ""):
+        return sorted(await _redis().smembers(ACTIVE_ROOMS_KEY))
+    return sorted(_memory_active)
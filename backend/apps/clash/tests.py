@@ -0,0 +1,251 @@
+import asyncio
+import time
+from unittest.mock import AsyncMock, patch
+
+from asgiref.sync import sync_to_async
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from apps.accounts.models import User
+from apps.clash import presence
+from apps.clash import state as clash_state
+from apps.clash.consumers import ClashConsumer
+from apps.clash.coordinator import ClashCoordinator, GameRunner
+from apps.clash.models import ClashRoom
+from apps.clash.question_pool import validate_question
+from apps.clash.state import FINISHED, QUESTION, REVEAL, MemoryClashState
+
+ANSWER = dict(time_limit=20, base_points=1000, speed_bonus_max=500)
+
+
+class MemoryClashStateTests(SimpleTestCase):
+    """The in-process store must keep the same guarantees as the Redis scripts."""
+
+    room_code = "TEST01"
+
+    def setUp(self):
+        self.state = MemoryClashState(self.room_code)
+
+    def tearDown(self):
+        clash_state._memory_rooms.pop(self.room_code, None)
+        clash_state._memory_leases.pop(self.room_code, None)
+        clash_state._memory_active.discard(self.room_code)
+        clash_state._memory_failures.pop(self.room_code, None)
+
+    async def _open(self, idx=0, expected=3, players=("1", "2", "3")):
+        if not await self.state.exists():
+            await self.state.init_game(countdown_deadline=time.time(), players=players)
+        now = time.time()
+        self.assertTrue(await self.state.start_question(idx, now, expected=expected, deadline=now + 20))
+        return now
+
+    async def test_duplicate_answer_is_rejected(self):
+        now = await self._open()
+        first = await self.state.submit_answer("1", 0, "A", True, now=now, **ANSWER)
+        second = await self.state.submit_answer("1", 0, "B", False, now=now, **ANSWER)
+        self.assertTrue(first.accepted)
+        self.assertFalse(second.accepted)
+        self.assertEqual(await self.state.answered_count(0), 1)
+        self.assertEqual((await self.state.scores())["1"], first.points)
+
+    async def test_late_and_out_of_turn_answers_are_rejected(self):
+        now = await self._open()
+        self.assertFalse((await self.state.submit_answer("1", 1, "A", True, now=now, **ANSWER)).accepted)
+        self.assertTrue(await self.state.end_question(0, reveal_deadline=now + 10))
+        self.assertFalse((await self.state.submit_answer("2", 0, "A", True, now=now, **ANSWER)).accepted)
+        self.assertEqual(await self.state.answer_log(), [])
+
+    async def test_speed_bonus_uses_the_stored_start_time(self):
+        now = await self._open()
+        fast = await self.state.submit_answer("1", 0, "A", True, now=now, **ANSWER)
+        slow = await self.state.submit_answer("2", 0, "A", True, now=now + 10, **ANSWER)
+        wrong = await self.state.submit_answer("3", 0, "B", False, now=now, **ANSWER)
+        self.assertEqual(fast.points, 1500)
+        self.assertEqual(slow.points, 1250)
+        self.assertEqual(wrong.points, 0)
+
+    async def test_concurrent_submits_all_score(self):
+        players = [str(i) for i in range(50)]
+        now = await self._open(expected=len(players), players=players)
+        results = await asyncio.gather(*(
+            self.state.submit_answer(uid, 0, "A", True, now=now, **ANSWER) for uid in players
+        ))
+        self.assertTrue(all(r.accepted for r in results))
+        self.assertEqual(await self.state.answered_count(0), len(players))
+        self.assertEqual(sorted(r.answered_count for r in results), list(range(1, len(players) + 1)))
+        self.assertEqual(len(await self.state.answer_log()), len(players))
+        self.assertEqual(sum((await self.state.scores()).values()), sum(r.points for r in results))
+
+    async def test_top_and_standing_share_ranks_on_ties(self):
+        now = await self._open()
+        await self.state.submit_answer("1", 0, "A", True, now=now, **ANSWER)
+        await self.state.submit_answer("2", 0, "A", True, now=now, **ANSWER)
+        self.assertEqual(await self.state.top(2), [("1", 1500), ("2", 1500)])
+        self.assertEqual(await self.state.standing("1"), (1, 1500))
+        self.assertEqual(await self.state.standing("2"), (1, 1500))
+        self.assertEqual(await self.state.standing("3"), (3, 0))
+
+    async def test_wait_all_answered_fires_on_the_last_answer(self):
+        now = await self._open(expected=2)
+        waiter = asyncio.create_task(self.state.wait_all_answered(0, timeout=5))
+        await self.state.submit_answer("1", 0, "A", True, now=now, **ANSWER)
+        await asyncio.sleep(0)
+        self.assertFalse(waiter.done())
+        await self.state.submit_answer("2", 0, "A", True, now=now, **ANSWER)
+        self.assertTrue(await asyncio.wait_for(waiter, timeout=1))
+
+    async def test_wait_all_answered_fires_when_a_missing_player_leaves(self):
+        now = await self._open(expected=2)
+        await self.state.submit_answer("1", 0, "A", True, now=now, **ANSWER)
+        waiter = asyncio.create_task(self.state.wait_all_answered(0, timeout=5))
+        await self.state.set_expected(1)
+        self.assertTrue(await asyncio.wait_for(waiter, timeout=1))
+
+    async def test_wait_all_answered_times_out(self):
+        await self._open(expected=2)
+        self.assertFalse(await self.state.wait_all_answered(0, timeout=0.05))
+
+    async def test_stale_transitions_are_noops(self):
+        now = await self._open()
+        self.assertFalse(await self.state.start_question(0, now, expected=3, deadline=now + 20))
+        self.assertTrue(await self.state.end_question(0, reveal_deadline=now + 10))
+        self.assertFalse(await self.state.end_question(0, reveal_deadline=now + 99))
+        self.assertEqual((await self.state.progress())["phase"], REVEAL)
+
+        self.assertTrue(await self.state.start_question(1, now, expected=3, deadline=now + 20))
+        self.assertFalse(await self.state.start_question(0, now, expected=3, deadline=now + 20))
+        progress = await self.state.progress()
+        self.assertEqual((progress["phase"], progress["current_question"]), (QUESTION, 1))
+
+        self.assertTrue(await self.state.finish())
+        self.assertFalse(await self.state.finish())
+        self.assertEqual((await self.state.progress())["phase"], FINISHED)
+        self.assertNotIn(self.room_code, await clash_state.active_rooms())
+
+    async def test_lease_is_exclusive_until_released_or_expired(self):
+        self.assertTrue(await self.state.acquire_lease("a", ttl=10))
+        self.assertFalse(await self.state.acquire_lease("b", ttl=10))
+        self.assertFalse(await self.state.renew_lease("b", ttl=10))
+        self.assertTrue(await self.state.renew_lease("a", ttl=10))
+        await self.state.release_lease("b")
+        self.assertFalse(await self.state.acquire_lease("b", ttl=10))
+        await self.state.release_lease("a")
+        self.assertTrue(await self.state.acquire_lease("b", ttl=0.01))
+        await asyncio.sleep(0.02)
+        self.assertTrue(await self.state.acquire_lease("a", ttl=10))
+
+
+@override_settings(REDIS_URL="", CLASH_PRESENCE_TTL_SECONDS=30)
+class PresenceTests(SimpleTestCase):
+    """Presence is per connection, so one player's second socket cannot mark them offline."""
+
+    room_code = "PRES01"
+
+    def tearDown(self):
+        presence._memory_presence.pop(self.room_code, None)
+
+    def _expire(self, user_id, connection):
+        presence._memory_presence[self.room_code][f"{user_id}:{connection}"] = time.time() - 1
+
+    async def test_closing_one_of_two_sockets_keeps_the_player_online(self):
+        await presence.mark_online(self.room_code, "1", "lobby")
+        await presence.mark_online(self.room_code, "1", "play")
+        await presence.mark_online(self.room_code, "2", "play")
+        self.assertEqual(await presence.online_user_ids(self.room_code), {"1", "2"})
+        self.assertEqual(await presence.expected_answers(self.room_code, [1, 2, 3]), 2)
+
+        await presence.mark_offline(self.room_code, "1", "lobby")
+        self.assertEqual(await presence.online_user_ids(self.room_code), {"1", "2"})
+
+        await presence.mark_offline(self.room_code, "1", "play")
+        self.assertEqual(await presence.online_user_ids(self.room_code), {"2"})
+
+    async def test_heartbeat_reports_only_changes(self):
+        self.assertEqual(await presence.mark_online(self.room_code, "1", "a"), 1)
+        await presence.mark_online(self.room_code, "2", "b")
+        self.assertEqual(await presence.mark_online(self.room_code, "1", "a"), 0)
+
+        self._expire("2", "b")
+        self.assertEqual(await presence.mark_online(self.room_code, "1", "a"), 1)
+        self.assertEqual(await presence.online_user_ids(self.room_code), {"1"})
+        # The stalled socket's own next heartbeat re-adds it.
+        self.assertEqual(await presence.mark_online(self.room_code, "2", "b"), 1)
+        self.assertEqual(await presence.online_user_ids(self.room_code), {"1", "2"})
+
+    async def test_heartbeat_that_re_adds_a_pruned_socket_resizes_the_game(self):
+        consumer = ClashConsumer()
+        consumer.room_code, consumer.channel_name = self.room_code, "play"
+        consumer.user = User(id=7)
+        consumer._presence_changed = AsyncMock()
+
+        await presence.mark_online(self.room_code, "7", "play")
+        await consumer.handle_heartbeat()
+        consumer._presence_changed.assert_not_awaited()
+
+        self._expire("7", "play")
+        await presence.mark_online(self.room_code, "8", "other")   # prunes 7's socket
+        await consumer.handle_heartbeat()
+        consumer._presence_changed.assert_awaited_once()
+
+
+class ValidateQuestionTests(SimpleTestCase):
+    """Pooled answers must be the letter players submit."""
+
+    def _validate(self, options, answer):
+        return validate_question({"question": "Q?", "options": options, "answer": answer})
+
+    def test_letter_answer_is_kept_as_a_letter(self):
+        self.assertEqual(self._validate(["x", "y", "z"], "b")["answer"], "B")
+
+    def test_option_text_answer_becomes_its_letter(self):
+        self.assertEqual(self._validate(["Paris", "Rome", "Oslo"], "rome")["answer"], "B")
+
+    def test_letter_answer_follows_its_option_past_dropped_empties(self):
+        q = self._validate(["x", "", "y", "z"], "C")
+        self.assertEqual(q["options"], ["x", "y", "z"])
+        self.assertEqual(q["answer"], "B")
+
+    def test_unplayable_questions_are_rejected(self):
+        self.assertIsNone(self._validate(["x", "", "y"], "B"))
+        self.assertIsNone(self._validate(["x", "y"], "Lisbon"))
+        self.assertIsNone(self._validate(["x", ""], "A"))
+
+
+@override_settings(REDIS_URL="", CLASH_MAX_RUNNER_FAILURES=2)
+class CoordinatorFailureTests(TestCase):
+    """A game whose runner keeps crashing must be given up, not reclaimed forever."""
+
+    @classmethod
+    def setUpTestData(cls):
+        host = User.objects.create_user(email="host@example.com", username="host", password="pw-123456")
+        cls.room = ClashRoom.objects.create(
+            host=host, subject="Biology", num_questions=1, status=ClashRoom.ACTIVE,
+            questions=[{"question": "Q?", "options": ["a", "b", "c", "d"], "answer": "A"}],
+        )
+
+    def tearDown(self):
+        code = self.room.room_code
+        clash_state._memory_rooms.pop(code, None)
+        clash_state._memory_leases.pop(code, None)
+        clash_state._memory_active.discard(code)
+        clash_state._memory_failures.pop(code, None)
+
+    async def _crash_once(self, coordinator):
+        self.assertTrue(await coordinator.claim(self.room.room_code))
+        await coordinator._runners[self.room.room_code]
+
+    async def test_runner_is_abandoned_after_repeated_failures(self):
+        code = self.room.room_code
+        await MemoryClashState(code).init_game(countdown_deadline=time.time())
+        coordinator = ClashCoordinator()
+        with patch.object(GameRunner, "run", side_effect=RuntimeError("boom")), \
+                self.assertLogs("apps.clash.coordinator", "ERROR"):
+            await self._crash_once(coordinator)
+            self.assertIn(code, await clash_state.active_rooms())
+
+            await self._crash_once(coordinator)
+        self.assertNotIn(code, await clash_state.active_rooms())
+        self.assertEqual(await coordinator.scan_once(), [])
+        self.assertEqual((await MemoryClashState(code).progress())["phase"], FINISHED)
+        room = await sync_to_async(ClashRoom.objects.get)(pk=self.room.pk)
+        self.assertEqual(room.status, ClashRoom.FINISHED)
+        self.assertIsNotNone(room.finished_at)
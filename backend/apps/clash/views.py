@@ -10,7 +10,7 @@ from django.views.decorators.http import require_http_methods
 from rest_framework.authentication import TokenAuthentication
 from rest_framework.exceptions import AuthenticationFailed
 
-from apps.core.async_client import call_fastapi, build_fastapi_headers
+from . import question_pool
 from .models import ClashRoom, ClashParticipant, MAX_PARTICIPANTS, VALID_TIME_OPTIONS
 
 logger = logging.getLogger(__name__)
@@ -36,7 +36,8 @@ async def _authenticate(request):
 async def create_clash(request):
     """
     Create a Clash room.
-    Generates MCQ questions via FastAPI, saves the room, adds host as first participant.
+    Takes MCQs from the subject's question pool (or generates them via FastAPI),
+    saves the room, adds host as first participant.
     """
     user, err = await _authenticate(request)
     if err:
@@ -61,43 +62,25 @@ async def create_clash(request):
     if time_per_question not in VALID_TIME_OPTIONS:
         time_per_question = 20
 
-    if len(provided_text) >= 50:
-        study_text = provided_text
-    else:
-        study_text = (
-            f"Generate a {difficulty} quiz on {subject}. "
-            f"Use broad general knowledge of {subject}. "
-            f"Cover varied subtopics so players with different preparation levels all encounter something familiar."
-        )
-
-    try:
-        fastapi_resp = await call_fastapi(
-            "POST",
-            "/quiz/",
-            json={
-                "subject": subject,
-                "study_text": study_text,
-                "num_mcq": num_questions,
-                "num_short": 0,
-                "difficulty": difficulty,
-                "source_type": "text",
-            },
-            headers=build_fastapi_headers(),
-            timeout=120.0,
-        )
-    except Exception as exc:
-        logger.error("FastAPI quiz generation failed for Clash: %s", exc)
-        return JsonResponse({"detail": "Quiz service unavailable. Try again."}, status=503)
-
-    if fastapi_resp.status_code != 200:
-        logger.error("FastAPI /quiz/ returned %s", fastapi_resp.status_code)
-        return JsonResponse({"detail": "Question generation failed."}, status=502)
-
-    quiz_data = fastapi_resp.json()
-    questions = quiz_data.get("mcq_questions", [])[:num_questions]
-
-    if not questions:
-        return JsonResponse({"detail": "No questions were generated. Try a different subject."}, status=502)
+    # Plain-subject rooms come from the pre-generated pool when it can fill
+    # them with questions this host hasn't seen; custom study text always
+    # goes to the LLM.
+    use_pool = len(provided_text) < 50
+    questions = None
+    if use_pool:
+        questions = await sync_to_async(question_pool.take_from_pool)(user, subject, difficulty, num_questions)
+        await sync_to_async(question_pool.schedule_refill)(subject, difficulty)
+
+    if questions is None:
+        try:
+            questions = await question_pool.generate_questions(
+                subject, difficulty, num_questions, study_text=provided_text if not use_pool else "",
+            )
+        except question_pool.QuestionGenerationError as exc:
+            return JsonResponse({"detail": exc.detail}, status=exc.status)
+        if use_pool:
+            pooled = await sync_to_async(question_pool.add_to_pool)(subject, difficulty, questions)
+            await sync_to_async(question_pool.mark_served)(user, pooled)
 
     room = await sync_to_async(ClashRoom.objects.create)(
         host=user,
@@ -6,8 +6,12 @@ for high-performance async proxying from Django to FastAPI.
 """
 import asyncio
 import os
+import random
+import time
 import httpx
 import logging
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
 from urllib.parse import urlsplit
 from django.conf import settings
 
@@ -19,6 +23,10 @@ logger = logging.getLogger(__name__)
 # loop per request).
 _async_clients: dict[str, tuple[httpx.AsyncClient, int]] = {}
 
+# Per-upstream health/latency counters keyed by normalized base URL.
+# Process-local: every ASGI worker keeps and reports its own view.
+_upstream_stats: dict[str, "_UpstreamStats"] = {}
+
 
 def _env_int(name: str, default: int) -> int:
     value = os.getenv(name)
@@ -86,6 +94,161 @@ def get_fastapi_base_urls() -> list[str]:
     return list(dict.fromkeys(urls))
 
 
+@dataclass
+class _UpstreamStats:
+    """
+    Rolling health view of one FastAPI base URL.
+
+    Latency and error rate are exponentially weighted, so a degraded instance
+    is demoted within a few requests. Samples older than
+    ``DJANGO_FASTAPI_STATS_STALE_SECONDS`` are treated as unknown. The URL is
+    then ranked like an unmeasured one, re-probed, and its next sample starts
+    a fresh average. A URL that was slow once is therefore re-evaluated
+    instead of being avoided forever.
+    """
+    base_url: str = ""
+    requests: int = 0
+    failures: int = 0
+    consecutive_failures: int = 0
+    ewma_latency_ms: float | None = None
+    ewma_error_rate: float = 0.0
+    in_flight: int = 0
+    peak_in_flight: int = 0
+    ejections: int = 0
+    ejected_until: float = 0.0
+    last_sample_at: float = 0.0
+    last_error: str = ""
+
+    EWMA_ALPHA = 0.2
+
+    def is_ejected(self, now: float | None = None) -> bool:
+        return self.ejected_until > (now if now is not None else time.monotonic())
+
+    def is_stale(self, now: float | None = None) -> bool:
+        """True when there is no latency sample, or the last one is too old to rank by."""
+        if self.ewma_latency_ms is None:
+            return True
+        now = now if now is not None else time.monotonic()
+        return now - self.last_sample_at > _env_float("DJANGO_FASTAPI_STATS_STALE_SECONDS", 60.0)
+
+    def acquire(self) -> None:
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+
+    def release(self) -> None:
+        self.in_flight = max(0, self.in_flight - 1)
+
+    def record(self, duration_ms: float, ok: bool, error: str = "") -> None:
+        now = time.monotonic()
+        if self.ewma_latency_ms is not None and self.is_stale(now):
+            # Start over rather than blend a fresh sample into an outdated average.
+            self.ewma_latency_ms = None
+            self.ewma_error_rate = 0.0
+        self.last_sample_at = now
+        self.requests += 1
+        a = self.EWMA_ALPHA
+        self.ewma_error_rate = (1 - a) * self.ewma_error_rate + a * (0.0 if ok else 1.0)
+        if ok:
+            self.consecutive_failures = 0
+            self.ejections = 0
+            self.ejected_until = 0.0
+            if self.ewma_latency_ms is None:
+                self.ewma_latency_ms = duration_ms
+            else:
+                self.ewma_latency_ms = (1 - a) * self.ewma_latency_ms + a * duration_ms
+            return
+
+        self.failures += 1
+        self.consecutive_failures += 1
+        self.last_error = error[:200]
+        if self.consecutive_failures >= _env_int("DJANGO_FASTAPI_EJECT_AFTER_FAILURES", 3):
+            # Ejection time grows with repeated ejections, capped at 10x base.
+            self.ejections += 1
+            base = _env_float("DJANGO_FASTAPI_EJECT_SECONDS", 15.0)
+            self.ejected_until = time.monotonic() + base * min(self.ejections, 10)
+            self.consecutive_failures = 0
+            logger.warning(
+                "Ejecting FastAPI upstream base=%s for %.0fs after repeated failures",
+                self.base_url,
+                base * min(self.ejections, 10),
+            )
+
+    def score(self) -> float:
+        """Lower is better: latency inflated by recent error rate."""
+        return (self.ewma_latency_ms or 0.0) * (1.0 + 4.0 * self.ewma_error_rate)
+
+
+def _get_upstream_stats(base: str) -> _UpstreamStats:
+    stats = _upstream_stats.get(base)
+    if stats is None:
+        stats = _upstream_stats[base] = _UpstreamStats(base_url=base)
+    return stats
+
+
+def rank_fastapi_base_urls(urls: list[str] | None = None) -> list[str]:
+    """
+    Order base URLs by current health.
+
+    Healthy upstreams that are unmeasured or whose samples have gone stale come
+    first, least busy first, so every URL gets measured and re-measured. A URL
+    that failed recently is not re-probed this way. Then come the measured
+    healthy ones, fastest first. Ejected ones are a last
+    resort, so a fully ejected pool still gets tried.
+    """
+    urls = urls if urls is not None else get_fastapi_base_urls()
+    now = time.monotonic()
+
+    def _key(item):
+        position, base = item
+        stats = _upstream_stats.get(base)
+        if stats is None:
+            return (0, 0.0, position)
+        if stats.is_ejected(now):
+            return (2, stats.score(), position)
+        if stats.is_stale(now) and not (stats.consecutive_failures or stats.ejections):
+            return (0, float(stats.in_flight), position)
+        if stats.ewma_latency_ms is None:
+            # Never answered and failing lately: behind every measured URL.
+            return (1, float("inf"), position)
+        return (1, stats.score(), position)
+
+    return [base for _, base in sorted(enumerate(urls), key=_key)]
+
+
+def _backoff_delay(base_delay: float, attempt: int) -> float:
+    """Full-jitter exponential backoff: uniform(0, min(cap, base * 2^(attempt-1)))."""
+    cap = _env_float("DJANGO_FASTAPI_BACKOFF_CAP_SECONDS", 5.0)
+    return random.uniform(0, min(cap, base_delay * (2 ** (attempt - 1))))
+
+
+def get_upstream_metrics() -> dict:
+    """Snapshot of per-upstream counters for the admin metrics endpoint."""
+    now = time.monotonic()
+    max_connections = _env_int("DJANGO_FASTAPI_MAX_CONNECTIONS", 1000)
+    upstreams = []
+    for base in get_fastapi_base_urls():
+        stats = _get_upstream_stats(base)
+        upstreams.append({
+            "base_url": base,
+            "requests": stats.requests,
+            "failures": stats.failures,
+            "error_rate": round(stats.failures / stats.requests, 4) if stats.requests else 0.0,
+            "recent_error_rate": round(stats.ewma_error_rate, 4),
+            "ewma_latency_ms": round(stats.ewma_latency_ms, 1) if stats.ewma_latency_ms is not None else None,
+            "in_flight": stats.in_flight,
+            "peak_in_flight": stats.peak_in_flight,
+            "pool_utilization": round(stats.in_flight / max(max_connections, 1), 4),
+            "ejected": stats.is_ejected(now),
+            "ejected_for_seconds": round(max(0.0, stats.ejected_until - now), 1),
+            "last_error": stats.last_error,
+        })
+    return {
+        "pid": os.getpid(),
+        "preferred": (rank_fastapi_base_urls() or [None])[0],
+        "upstreams": upstreams,
+    }
+
+
 def _current_loop_id() -> int:
     """Return id() of the running event loop, or 0 if none is running."""
     try:
@@ -148,6 +311,31 @@ def get_async_client(base_url: str | None = None) -> httpx.AsyncClient:
     return client
 
 
+@asynccontextmanager
+async def private_async_clients():
+    """
+    Yield a ``get_client(base_url)`` for ``call_fastapi`` whose clients belong
+    to the caller alone.
+
+    Use it for work on a short-lived event loop, such as ``asyncio.run`` in a
+    background thread. The clients are never put in ``_async_clients`` and are
+    closed on exit, so the server loop's shared clients are neither replaced
+    nor touched from another thread.
+    """
+    clients: dict[str, httpx.AsyncClient] = {}
+
+    def get_client(base_url: str) -> httpx.AsyncClient:
+        if base_url not in clients:
+            clients[base_url] = _make_client(base_url)
+        return clients[base_url]
+
+    try:
+        yield get_client
+    finally:
+        for client in clients.values():
+            await client.aclose()
+
+
 async def close_async_client():
     """Close the async client (call during Django shutdown)"""
     global _async_clients
@@ -179,13 +367,20 @@ async def call_fastapi(
     *,
     retries_per_url: int = 2,
     retry_delay_seconds: float = 0.6,
+    get_client=get_async_client,
     **kwargs,
 ) -> httpx.Response:
     """
-    Call FastAPI with retry + URL failover.
+    Call FastAPI with retry + adaptive URL failover.
+
+    Base URLs are tried healthiest/fastest first (see rank_fastapi_base_urls),
+    retries use jittered exponential backoff, and every attempt feeds the
+    per-upstream stats that drive ranking and outlier ejection.
+    ``get_client`` maps a base URL to the client to use (the shared pooled
+    client by default; see private_async_clients).
     Raises httpx.RequestError if all attempts fail.
     """
-    urls = get_fastapi_base_urls()
+    urls = rank_fastapi_base_urls()
     if not urls:
         raise httpx.RequestError("No FASTAPI base URL configured")
 
@@ -195,35 +390,24 @@ async def call_fastapi(
     retry_status_codes = {404, 502, 503, 504}
 
     for base in urls:
-        client = get_async_client(base)
+        client = get_client(base)
+        stats = _get_upstream_stats(base)
         for attempt in range(1, retries_per_url + 1):
+            logger.info(
+                "FastAPI request method=%s base=%s path=%s attempt=%s/%s",
+                method,
+                base,
+                safe_path,
+                attempt,
+                retries_per_url,
+            )
+            started = time.perf_counter()
+            stats.acquire()
             try:
-                logger.info(
-                    "FastAPI request method=%s base=%s path=%s attempt=%s/%s",
-                    method,
-                    base,
-                    safe_path,
-                    attempt,
-                    retries_per_url,
-                )
                 response = await client.request(method=method, url=safe_path, **kwargs)
-
-                # If one base URL is stale/misconfigured, fall through to next URL.
-                if response.status_code in retry_status_codes and len(urls) > 1:
-                    logger.warning(
-                        "FastAPI endpoint failure base=%s path=%s status=%s; trying next base URL",
-                        base,
-                        safe_path,
-                        response.status_code,
-                    )
-                    if attempt < retries_per_url:
-                        await asyncio.sleep(retry_delay_seconds * attempt)
-                        continue
-                    break
-
-                return response
             except (httpx.TimeoutException, httpx.ConnectError, httpx.NetworkError, httpx.RequestError) as exc:
                 last_error = exc
+                stats.record((time.perf_counter() - started) * 1000, ok=False, error=str(exc))
                 logger.warning(
                     "FastAPI request failed base=%s attempt=%s/%s path=%s error=%s",
                     base,
@@ -233,9 +417,30 @@ async def call_fastapi(
                     exc,
                 )
                 if attempt < retries_per_url:
-                    await asyncio.sleep(retry_delay_seconds * attempt)
+                    await asyncio.sleep(_backoff_delay(retry_delay_seconds, attempt))
+                continue
+            finally:
+                stats.release()
+
+            elapsed_ms = (time.perf_counter() - started) * 1000
+
+            # If one base URL is stale/misconfigured, fall through to next URL.
+            if response.status_code in retry_status_codes and len(urls) > 1:
+                stats.record(elapsed_ms, ok=False, error=f"HTTP {response.status_code}")
+                logger.warning(
+                    "FastAPI endpoint failure base=%s path=%s status=%s; trying next base URL",
+                    base,
+                    safe_path,
+                    response.status_code,
+                )
+                if attempt < retries_per_url:
+                    await asyncio.sleep(_backoff_delay(retry_delay_seconds, attempt))
+                    continue
+                break
+
+            stats.record(elapsed_ms, ok=response.status_code < 500, error=f"HTTP {response.status_code}")
+            return response
 
     raise httpx.RequestError(
         f"All FastAPI connection attempts failed for path {safe_path}. urls={urls}. last_error={last_error}"
     )
-
@@ -0,0 +1,67 @@
+"""
+One-time backfill of the stored char_count / token_estimate columns.
+
+Rows written before the columns existed hold 0. This recomputes them in
+batches with bulk_update, so it is safe to re-run. Run
+``rebuild_metric_rollups`` afterwards so the admin token totals pick up the
+backfilled values.
+
+Usage:
+    python manage.py backfill_char_counts
+    python manage.py backfill_char_counts --batch-size 500
+    python manage.py backfill_char_counts --dry-run
+"""
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = "Recompute char_count and token_estimate on all CharCountedModel rows"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Rows per bulk_update (default 1000)",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Count rows that would change without touching the DB",
+        )
+
+    def handle(self, *args, **options):
+        from apps.chatbot.models import ChatMessage
+        from apps.clash.models import ClashRoom
+        from apps.flashcards.models import Flashcard
+        from apps.quiz.models import QuizSession
+
+        batch_size = max(1, options["batch_size"])
+        dry = options["dry_run"]
+        if dry:
+            self.stdout.write(self.style.WARNING("Dry run — no DB writes"))
+
+        for model in (ChatMessage, Flashcard, QuizSession, ClashRoom):
+            fields = ("pk", "char_count", "token_estimate", *model.CHAR_SOURCE_FIELDS)
+            scanned = changed = 0
+            pending = []
+            for row in model._default_manager.only(*fields).order_by("pk").iterator(chunk_size=batch_size):
+                scanned += 1
+                before = (row.char_count, row.token_estimate)
+                row.refresh_char_count()
+                if (row.char_count, row.token_estimate) == before:
+                    continue
+                changed += 1
+                if dry:
+                    continue
+                pending.append(row)
+                if len(pending) >= batch_size:
+                    model._default_manager.bulk_update(pending, ["char_count", "token_estimate"])
+                    pending = []
+            if pending:
+                model._default_manager.bulk_update(pending, ["char_count", "token_estimate"])
+
+            self.stdout.write(f"  {model._meta.label}: scanned={scanned} updated={changed}")
+
+        if not dry:
+            self.stdout.write(self.style.SUCCESS("Done. Run rebuild_metric_rollups to refresh admin totals."))
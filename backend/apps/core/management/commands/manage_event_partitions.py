@@ -0,0 +1,94 @@
+"""
+Manage Postgres range partitions of the event tables (see apps/core/partitioning.py).
+
+Without flags it creates the upcoming partitions and drops the expired ones
+for every table that is already partitioned. The retention sweeper does the
+same thing every few minutes, so cron is optional.
+
+--convert rebuilds unpartitioned tables as partitioned ones. It copies every
+row under an exclusive lock, so run it during a maintenance window.
+
+Usage:
+    python manage.py manage_event_partitions
+    python manage.py manage_event_partitions --convert --table dashboard.AnonymousUsageEvent
+    python manage.py manage_event_partitions --detach-only
+    python manage.py manage_event_partitions --dry-run
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = "Create, convert and expire range partitions of high-volume event tables (Postgres only)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--table",
+            action="append",
+            default=None,
+            help="Model label to act on, e.g. chatbot.ChatMessage (repeatable; default: all)",
+        )
+        parser.add_argument(
+            "--convert",
+            action="store_true",
+            help="Convert unpartitioned tables to partitioned ones and copy their rows",
+        )
+        parser.add_argument(
+            "--keep-old",
+            action="store_true",
+            help="With --convert, keep the original table as <table>_unpartitioned",
+        )
+        parser.add_argument(
+            "--detach-only",
+            action="store_true",
+            help="Detach expired partitions instead of dropping them (for archiving)",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Show what would be created or removed without touching the DB",
+        )
+
+    def handle(self, *args, **options):
+        from apps.core import partitioning
+
+        if not partitioning.is_supported():
+            raise CommandError("Table partitioning requires PostgreSQL")
+
+        policies = partitioning.partition_policies()
+        if options["table"]:
+            wanted = {label.lower() for label in options["table"]}
+            policies = [p for p in policies if p.model_label.lower() in wanted]
+            if not policies:
+                raise CommandError(f"No partition policy for {', '.join(options['table'])}")
+
+        for policy in policies:
+            label = policy.model_label
+            partitioned = partitioning.is_partitioned(policy.table)
+
+            if not partitioned:
+                if not options["convert"]:
+                    self.stdout.write(f"  {label}: not partitioned (use --convert)")
+                    continue
+                if options["dry_run"]:
+                    self.stdout.write(f"  {label}: would convert to {policy.interval} partitions")
+                    continue
+                try:
+                    copied = partitioning.convert_to_partitioned(policy, keep_old=options["keep_old"])
+                except ValueError as exc:
+                    raise CommandError(str(exc))
+                self.stdout.write(self.style.SUCCESS(f"  {label}: converted, {copied} rows copied"))
+
+            if options["dry_run"]:
+                self.stdout.write(
+                    f"  {label}: {len(partitioning.list_partitions(policy.table))} partitions, "
+                    f"would remove {partitioning.expired_partitions(policy) or 'none'}"
+                )
+                continue
+
+            created = partitioning.ensure_future_partitions(policy)
+            removed = partitioning.drop_expired_partitions(policy, detach_only=options["detach_only"])
+            verb = "detached" if options["detach_only"] else "dropped"
+            self.stdout.write(f"  {label}: created {created or 'none'}; {verb} {removed or 'none'}")
+
+        if options["dry_run"]:
+            self.stdout.write(self.style.WARNING("Dry run — no DB writes"))
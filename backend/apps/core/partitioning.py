@@ -0,0 +1,297 @@
+"""
+Optional Postgres range partitioning for append-only event tables.
+
+``AnonymousUsageEvent`` and ``AIResponseLatency`` are partitioned by day and
+``ChatMessage`` by month, always on ``created_at``. Inserts are routed by
+Postgres, and any query with a ``created_at`` range (the 24h / 7d analytics
+windows) only scans the partitions it needs.
+
+Converting a table is an explicit, one-time step:
+``manage.py manage_event_partitions --convert``. After that the same command,
+and the retention sweeper, keep a few future partitions ready and drop (or
+detach) partitions that are entirely past the table's retention window. Retention then
+costs a ``DROP TABLE`` instead of a ``DELETE``. Tables that have not been
+converted, and non-Postgres databases, are left alone.
+
+Postgres requires the partition key in every unique constraint, so converted
+tables get ``PRIMARY KEY (id, created_at)``. This is not transparent to the
+ORM:
+
+- ``id`` is still generated by the identity sequence and is unique in
+  practice, but the database no longer enforces it. A row inserted with an
+  explicit ``id`` can duplicate an existing one.
+- Lookups by ``pk`` alone (``get(pk=...)``, ``save()`` of a loaded row,
+  ``delete()``) are no longer backed by a unique index on ``id``. Each one
+  checks every partition unless the query also filters on ``created_at``.
+- No foreign key can point at the table, because a referenced column needs a
+  unique constraint of its own. Tables that are already referenced by a
+  foreign key are refused.
+- Unique indexes other than the primary key cannot be carried over without
+  changing what they enforce, so tables that have any are refused too. The
+  error lists them.
+"""
+import datetime
+import logging
+from dataclasses import dataclass
+
+from django.apps import apps
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+DAY = "day"
+MONTH = "month"
+
+
+@dataclass(frozen=True)
+class PartitionPolicy:
+    model_label: str
+    interval: str                 # DAY or MONTH
+    premake: int                  # future partitions kept ready
+    retention_hours: int | None   # None: never drop
+
+    @property
+    def model(self):
+        return apps.get_model(self.model_label)
+
+    @property
+    def table(self) -> str:
+        return self.model._meta.db_table
+
+
+def partition_policies() -> list[PartitionPolicy]:
+    return [
+        PartitionPolicy(
+            "dashboard.AnonymousUsageEvent", DAY, premake=7,
+            retention_hours=int(getattr(settings, "ANONYMOUS_USAGE_RETENTION_HOURS", 24)),
+        ),
+        PartitionPolicy(
+            "dashboard.AIResponseLatency", DAY, premake=7,
+            retention_hours=getattr(settings, "AI_LATENCY_RETENTION_HOURS", None) or None,
+        ),
+        PartitionPolicy("chatbot.ChatMessage", MONTH, premake=2, retention_hours=None),
+    ]
+
+
+# ── Bounds ────────────────────────────────────────────────────────────────────
+
+def _floor(ts: datetime.datetime, interval: str) -> datetime.datetime:
+    ts = ts.astimezone(datetime.timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+    return ts.replace(day=1) if interval == MONTH else ts
+
+
+def _next(start: datetime.datetime, interval: str) -> datetime.datetime:
+    if interval == DAY:
+        return start + datetime.timedelta(days=1)
+    return (start + datetime.timedelta(days=32)).replace(day=1)
+
+
+def partition_name(table: str, start: datetime.datetime, interval: str) -> str:
+    return f"{table}_p{start:%Y%m%d}" if interval == DAY else f"{table}_p{start:%Y%m}"
+
+
+def _parse_partition_start(table: str, name: str, interval: str) -> datetime.datetime | None:
+    suffix = name[len(table) + 2:] if name.startswith(f"{table}_p") else ""
+    fmt = "%Y%m%d" if interval == DAY else "%Y%m"
+    try:
+        return datetime.datetime.strptime(suffix, fmt).replace(tzinfo=datetime.timezone.utc)
+    except ValueError:
+        return None
+
+
+# ── Introspection ─────────────────────────────────────────────────────────────
+
+def is_supported() -> bool:
+    return connection.vendor == "postgresql"
+
+
+def is_partitioned(table: str) -> bool:
+    if not is_supported():
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM pg_partitioned_table pt JOIN pg_class c ON c.oid = pt.partrelid "
+            "WHERE c.relname = %s AND c.relnamespace = to_regnamespace(current_schema())",
+            [table],
+        )
+        return cursor.fetchone() is not None
+
+
+def list_partitions(table: str) -> list[str]:
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT child.relname FROM pg_inherits i "
+            "JOIN pg_class parent ON parent.oid = i.inhparent "
+            "JOIN pg_class child ON child.oid = i.inhrelid "
+            "WHERE parent.relname = %s AND parent.relnamespace = to_regnamespace(current_schema()) "
+            "ORDER BY child.relname",
+            [table],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+# ── Maintenance ───────────────────────────────────────────────────────────────
+
+def _create_partition(cursor, policy: PartitionPolicy, start: datetime.datetime) -> str:
+    qn = connection.ops.quote_name
+    name = partition_name(policy.table, start, policy.interval)
+    cursor.execute(
+        f"CREATE TABLE IF NOT EXISTS {qn(name)} PARTITION OF {qn(policy.table)} "
+        "FOR VALUES FROM (%s) TO (%s)",
+        [start, _next(start, policy.interval)],
+    )
+    return name
+
+
+def ensure_future_partitions(policy: PartitionPolicy, *, now: datetime.datetime | None = None) -> list[str]:
+    """Create partitions from the current period through ``policy.premake`` periods ahead."""
+    existing = set(list_partitions(policy.table))
+    start = _floor(now or timezone.now(), policy.interval)
+    created = []
+    with connection.cursor() as cursor:
+        for _ in range(policy.premake + 1):
+            name = partition_name(policy.table, start, policy.interval)
+            if name not in existing:
+                try:
+                    with transaction.atomic():
+                        _create_partition(cursor, policy, start)
+                    created.append(name)
+                except Exception as exc:
+                    # Usually rows for this range already sit in the default partition.
+                    logger.warning("Could not create partition %s: %s", name, exc)
+            start = _next(start, policy.interval)
+    return created
+
+
+def expired_partitions(policy: PartitionPolicy, *, now: datetime.datetime | None = None) -> list[str]:
+    """Partitions whose whole range is older than the retention window."""
+    if policy.retention_hours is None:
+        return []
+    cutoff = (now or timezone.now()) - datetime.timedelta(hours=policy.retention_hours)
+    expired = []
+    for name in list_partitions(policy.table):
+        start = _parse_partition_start(policy.table, name, policy.interval)
+        if start is not None and _next(start, policy.interval) <= cutoff:
+            expired.append(name)
+    return expired
+
+
+def drop_expired_partitions(policy: PartitionPolicy, *, detach_only: bool = False) -> list[str]:
+    """Detach and drop (or only detach) expired partitions; the rows go with them."""
+    qn = connection.ops.quote_name
+    removed = []
+    for name in expired_partitions(policy):
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(f"ALTER TABLE {qn(policy.table)} DETACH PARTITION {qn(name)}")
+            if not detach_only:
+                cursor.execute(f"DROP TABLE {qn(name)}")
+        removed.append(name)
+    return removed
+
+
+def maintain(*, detach_only: bool = False) -> dict[str, dict[str, list[str]]]:
+    """Premake and expire partitions of every converted table. No-op elsewhere."""
+    report = {}
+    if not is_supported():
+        return report
+    for policy in partition_policies():
+        if not is_partitioned(policy.table):
+            continue
+        report[policy.model_label] = {
+            "created": ensure_future_partitions(policy),
+            "removed": drop_expired_partitions(policy, detach_only=detach_only),
+        }
+    return report
+
+
+# ── One-time conversion ───────────────────────────────────────────────────────
+
+def _referencing_constraints(cursor, table: str) -> list[str]:
+    cursor.execute(
+        "SELECT conname FROM pg_constraint WHERE contype = 'f' AND confrelid = %s::regclass",
+        [table],
+    )
+    return [row[0] for row in cursor.fetchall()]
+
+
+def _unique_indexes(cursor, table: str) -> list[str]:
+    """Unique indexes other than the primary key (unique constraints included)."""
+    cursor.execute(
+        "SELECT c.relname FROM pg_index x JOIN pg_class c ON c.oid = x.indexrelid "
+        "WHERE x.indrelid = %s::regclass AND x.indisunique AND NOT x.indisprimary ORDER BY c.relname",
+        [table],
+    )
+    return [row[0] for row in cursor.fetchall()]
+
+
+def convert_to_partitioned(policy: PartitionPolicy, *, keep_old: bool = False) -> int:
+    """
+    Rebuild ``policy.table`` as a range-partitioned table and copy its rows.
+
+    Runs in one transaction and holds an exclusive lock for the copy. Schedule
+    it in a quiet window. Returns the number of rows copied.
+    """
+    qn = connection.ops.quote_name
+    table = policy.table
+    old = f"{table}_unpartitioned"
+    with transaction.atomic(), connection.cursor() as cursor:
+        if _referencing_constraints(cursor, table):
+            raise ValueError(f"{table} is referenced by foreign keys and cannot be partitioned")
+        unique = _unique_indexes(cursor, table)
+        if unique:
+            raise ValueError(
+                f"{table} has unique indexes that would not survive partitioning "
+                f"(the partition key must be part of each): {', '.join(unique)}"
+            )
+
+        cursor.execute(f"LOCK TABLE {qn(table)} IN ACCESS EXCLUSIVE MODE")
+        cursor.execute(
+            "SELECT pg_get_indexdef(x.indexrelid), c.relname FROM pg_index x "
+            "JOIN pg_class c ON c.oid = x.indexrelid "
+            "WHERE x.indrelid = %s::regclass AND NOT x.indisunique",
+            [table],
+        )
+        indexes = cursor.fetchall()
+        cursor.execute(
+            "SELECT pg_get_constraintdef(oid) FROM pg_constraint WHERE contype = 'f' AND conrelid = %s::regclass",
+            [table],
+        )
+        foreign_keys = [row[0] for row in cursor.fetchall()]
+        cursor.execute(f"SELECT min(created_at) FROM {qn(table)}")
+        oldest = cursor.fetchone()[0] or timezone.now()
+
+        cursor.execute(f"ALTER TABLE {qn(table)} RENAME TO {qn(old)}")
+        for _, index_name in indexes:
+            cursor.execute(f"DROP INDEX {qn(index_name)}")
+        cursor.execute(
+            f"CREATE TABLE {qn(table)} (LIKE {qn(old)} INCLUDING DEFAULTS INCLUDING IDENTITY "
+            f"INCLUDING CONSTRAINTS) PARTITION BY RANGE (created_at)"
+        )
+        cursor.execute(f"ALTER TABLE {qn(table)} ADD PRIMARY KEY (id, created_at)")
+        for definition in foreign_keys:
+            cursor.execute(f"ALTER TABLE {qn(table)} ADD {definition}")
+        cursor.execute(f"CREATE TABLE {qn(table + '_default')} PARTITION OF {qn(table)} DEFAULT")
+
+        start = _floor(oldest, policy.interval)
+        horizon = _floor(timezone.now(), policy.interval)
+        while start <= horizon:
+            _create_partition(cursor, policy, start)
+            start = _next(start, policy.interval)
+
+        cursor.execute(f"INSERT INTO {qn(table)} OVERRIDING SYSTEM VALUE SELECT * FROM {qn(old)}")
+        copied = cursor.rowcount
+        for definition, index_name in indexes:
+            # "CREATE INDEX name ON schema.old USING btree (...)" -> same index on the new parent
+            method_and_columns = definition.split(" USING ", 1)[1]
+            cursor.execute(f"CREATE INDEX {qn(index_name)} ON {qn(table)} USING {method_and_columns}")
+        cursor.execute(
+            f"SELECT setval(pg_get_serial_sequence(%s, 'id'), coalesce((SELECT max(id) FROM {qn(table)}), 0) + 1, false)",
+            [table],
+        )
+        if not keep_old:
+            cursor.execute(f"DROP TABLE {qn(old)}")
+
+    ensure_future_partitions(policy)
+    return copied
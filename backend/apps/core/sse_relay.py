@@ -0,0 +1,221 @@
+"""
+Byte-level SSE relay from FastAPI to the browser.
+
+FastAPI frames are passed through exactly as received: no line decoding and
+no re-encoding. Each complete event (terminated by a blank line) is flushed as
+soon as it arrives. The only per-event work is a JSON parse so the persistence
+hooks can collect the assistant text.
+
+Opening the stream goes through the same upstream ranking as ``call_fastapi``:
+base URLs are tried healthiest first. A connection error or a 404/502/503/504
+fails over to the next one, and every attempt feeds the per-upstream stats
+(time to response headers). Once a stream is open the relay is committed to
+that upstream, because bytes already forwarded to the browser cannot be
+replayed from another one.
+"""
+import asyncio
+import json
+import logging
+from time import perf_counter
+from typing import Awaitable, Callable
+
+import httpx
+from django.http import StreamingHttpResponse
+
+from .async_client import _get_upstream_stats, get_async_client, rank_fastapi_base_urls
+
+logger = logging.getLogger(__name__)
+
+_EVENT_TERMINATOR = b"\n\n"
+_DATA_PREFIX = b"data: "
+_FAILOVER_STATUS_CODES = {404, 502, 503, 504}
+
+# Detached completion-hook tasks, kept referenced until they finish.
+_background_tasks: set[asyncio.Task] = set()
+
+
+def sse_event(payload: dict) -> bytes:
+    """Encode one SSE data frame."""
+    return b"data: " + json.dumps(payload).encode("utf-8") + _EVENT_TERMINATOR
+
+
+class SSERelay:
+    """
+    Async iterator that relays one upstream SSE stream.
+
+    Hooks registered with ``add_completion_hook`` run once the stream ends
+    (done, error, upstream close or client disconnect) and receive the relay,
+    so callers can read ``text``, ``bytes_sent``, ``completed`` and
+    ``first_event_ms`` without re-parsing the stream themselves.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        *,
+        json_body: dict,
+        headers: dict,
+        prelude: bytes = b"",
+        timeout: float = 120.0,
+        on_done: Callable[["SSERelay"], Awaitable[None]] | None = None,
+    ):
+        self.path = path
+        self.json_body = json_body
+        self.headers = headers
+        self.prelude = prelude
+        self.timeout = timeout
+        self.on_done = on_done
+
+        self.bytes_sent = 0
+        self.completed = False
+        self.disconnected = False
+        self.first_event_ms: int | None = None
+        self._text_parts: list[str] = []
+        self._completion_hooks: list[Callable[["SSERelay"], Awaitable[None]]] = []
+
+    @property
+    def text(self) -> str:
+        return "".join(self._text_parts).strip()
+
+    def add_completion_hook(self, hook: Callable[["SSERelay"], Awaitable[None]]) -> None:
+        self._completion_hooks.append(hook)
+
+    def __aiter__(self):
+        return self._relay()
+
+    def _emit(self, chunk: bytes) -> bytes:
+        self.bytes_sent += len(chunk)
+        return chunk
+
+    def _inspect(self, frame: bytes) -> str | None:
+        """Return the event type of one complete frame, collecting token text."""
+        if not frame.startswith(_DATA_PREFIX):
+            return None
+        try:
+            event = json.loads(frame[len(_DATA_PREFIX):])
+        except ValueError:
+            return None
+        etype = event.get("type") if isinstance(event, dict) else None
+        if etype == "token":
+            self._text_parts.append(event.get("content", ""))
+        return etype
+
+    async def _relay(self):
+        started = perf_counter()
+        try:
+            if self.prelude:
+                yield self._emit(self.prelude)
+
+            base_urls = rank_fastapi_base_urls()
+            if not base_urls:
+                yield self._emit(sse_event({"type": "error", "message": "AI service not configured."}))
+                return
+
+            response, stats = await self._open(base_urls)
+            try:
+                if response.status_code != 200:
+                    logger.error("[sse-relay] FastAPI %s returned %d", self.path, response.status_code)
+                    yield self._emit(sse_event({"type": "error", "message": "AI service error"}))
+                    return
+
+                buffer = bytearray()
+                async for chunk in response.aiter_raw():
+                    buffer += chunk
+                    end = buffer.rfind(_EVENT_TERMINATOR)
+                    if end == -1:
+                        continue
+                    end += len(_EVENT_TERMINATOR)
+                    ready = bytes(buffer[:end])
+                    del buffer[:end]
+
+                    if self.first_event_ms is None:
+                        self.first_event_ms = int((perf_counter() - started) * 1000)
+
+                    # Forward the whole run of complete frames in one write.
+                    yield self._emit(ready)
+
+                    for frame in ready.split(_EVENT_TERMINATOR):
+                        etype = self._inspect(frame)
+                        if etype == "done":
+                            self.completed = True
+                            return
+                        if etype == "error":
+                            return
+            finally:
+                stats.release()
+                await response.aclose()
+
+        except (asyncio.CancelledError, GeneratorExit):
+            # Client went away: closing the response above cancels the upstream
+            # request, so FastAPI stops generating tokens nobody will read.
+            self.disconnected = True
+            logger.info("[sse-relay] client disconnected path=%s sent=%d", self.path, self.bytes_sent)
+            raise
+        except (httpx.TimeoutException, httpx.RequestError) as exc:
+            logger.error("[sse-relay] FastAPI unreachable: %s", exc)
+            yield self._emit(sse_event({"type": "error", "message": "AI service temporarily unavailable."}))
+        except Exception as exc:
+            logger.error("[sse-relay] unexpected error: %s", exc, exc_info=True)
+            yield self._emit(sse_event({"type": "error", "message": "Internal server error."}))
+        finally:
+            if self.disconnected:
+                # Don't await inside a cancelled task; finish bookkeeping detached.
+                task = asyncio.get_running_loop().create_task(self._run_hooks())
+                _background_tasks.add(task)
+                task.add_done_callback(_background_tasks.discard)
+            else:
+                await self._run_hooks()
+
+    async def _open(self, base_urls: list[str]):
+        """Open the upstream stream on the first healthy base URL; returns (response, stats)."""
+        last_error: Exception | None = None
+        for base in base_urls:
+            client = get_async_client(base)
+            stats = _get_upstream_stats(base)
+            request = client.build_request(
+                "POST", self.path, json=self.json_body, headers=self.headers, timeout=self.timeout,
+            )
+            started = perf_counter()
+            stats.acquire()
+            try:
+                response = await client.send(request, stream=True)
+            except (httpx.TimeoutException, httpx.RequestError) as exc:
+                stats.release()
+                stats.record((perf_counter() - started) * 1000, ok=False, error=str(exc))
+                logger.warning("[sse-relay] upstream %s failed for %s: %s", base, self.path, exc)
+                last_error = exc
+                continue
+
+            elapsed_ms = (perf_counter() - started) * 1000
+            if response.status_code in _FAILOVER_STATUS_CODES and base != base_urls[-1]:
+                stats.release()
+                stats.record(elapsed_ms, ok=False, error=f"HTTP {response.status_code}")
+                logger.warning(
+                    "[sse-relay] upstream %s returned %d for %s; trying next base URL",
+                    base, response.status_code, self.path,
+                )
+                await response.aclose()
+                continue
+
+            stats.record(elapsed_ms, ok=response.status_code < 500, error=f"HTTP {response.status_code}")
+            return response, stats
+        raise last_error or httpx.RequestError(f"All FastAPI upstreams failed for {self.path}")
+
+    async def _run_hooks(self):
+        hooks = ([self.on_done] if self.on_done and self.completed else []) + self._completion_hooks
+        for hook in hooks:
+            try:
+                await hook(self)
+            except Exception as exc:
+                logger.warning("[sse-relay] completion hook failed: %s", exc)
+
+
+class SSERelayResponse(StreamingHttpResponse):
+    """StreamingHttpResponse around an SSERelay, with SSE-friendly headers."""
+
+    def __init__(self, relay: SSERelay, **kwargs):
+        kwargs.setdefault("content_type", "text/event-stream")
+        super().__init__(relay, **kwargs)
+        self.relay = relay
+        self["Cache-Control"] = "no-cache"
+        self["X-Accel-Buffering"] = "no"
@@ -0,0 +1,116 @@
+import asyncio
+from unittest.mock import patch
+
+import httpx
+from django.test import SimpleTestCase, override_settings
+
+from apps.core import async_client
+from apps.core.async_client import _get_upstream_stats, call_fastapi, rank_fastapi_base_urls
+
+FAST = "http://fast.test"
+SLOW = "http://slow.test"
+NEW = "http://new.test"
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@patch.dict("os.environ", {
+    "DJANGO_FASTAPI_STATS_STALE_SECONDS": "60",
+    "DJANGO_FASTAPI_EJECT_AFTER_FAILURES": "3",
+    "DJANGO_FASTAPI_EJECT_SECONDS": "15",
+})
+class UpstreamRankingTests(SimpleTestCase):
+    """Ranking must keep measuring every upstream, not just the first one that answered."""
+
+    def setUp(self):
+        async_client._upstream_stats.clear()
+        self.clock = _Clock()
+        patcher = patch("apps.core.async_client.time.monotonic", self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(async_client._upstream_stats.clear)
+
+    def test_unmeasured_url_is_tried_before_measured_ones(self):
+        _get_upstream_stats(FAST).record(50, ok=True)
+        self.assertEqual(rank_fastapi_base_urls([FAST, NEW]), [NEW, FAST])
+
+    def test_measured_urls_are_ordered_fastest_first(self):
+        _get_upstream_stats(SLOW).record(900, ok=True)
+        _get_upstream_stats(FAST).record(50, ok=True)
+        self.assertEqual(rank_fastapi_base_urls([SLOW, FAST]), [FAST, SLOW])
+
+    def test_stale_url_is_reprobed_and_its_average_restarts(self):
+        slow = _get_upstream_stats(SLOW)
+        slow.record(5000, ok=True)
+        _get_upstream_stats(FAST).record(100, ok=True)
+        self.assertEqual(rank_fastapi_base_urls([SLOW, FAST]), [FAST, SLOW])
+
+        self.clock.now += 61
+        _get_upstream_stats(FAST).record(100, ok=True)
+        self.assertEqual(rank_fastapi_base_urls([FAST, SLOW]), [SLOW, FAST])
+
+        slow.record(50, ok=True)
+        self.assertEqual(slow.ewma_latency_ms, 50)
+        self.assertEqual(rank_fastapi_base_urls([FAST, SLOW]), [SLOW, FAST])
+
+    def test_failing_url_is_ejected_then_recovers_on_success(self):
+        _get_upstream_stats(FAST).record(200, ok=True)
+        flaky = _get_upstream_stats(SLOW)
+        with self.assertLogs("apps.core.async_client", "WARNING"):
+            for _ in range(3):
+                flaky.record(10, ok=False, error="boom")
+        self.assertTrue(flaky.is_ejected())
+        self.assertEqual(rank_fastapi_base_urls([SLOW, FAST]), [FAST, SLOW])
+
+        self.clock.now += 16
+        self.assertFalse(flaky.is_ejected())
+        # Out of ejection but failed lately: still behind the healthy URL.
+        self.assertEqual(rank_fastapi_base_urls([SLOW, FAST]), [FAST, SLOW])
+
+        flaky.record(20, ok=True)
+        self.assertEqual((flaky.ejections, flaky.consecutive_failures), (0, 0))
+        self.assertEqual(rank_fastapi_base_urls([FAST, SLOW]), [SLOW, FAST])
+
+    def test_repeat_ejections_last_longer(self):
+        stats = _get_upstream_stats(SLOW)
+        with self.assertLogs("apps.core.async_client", "WARNING"):
+            for _ in range(3):
+                stats.record(10, ok=False)
+            first = stats.ejected_until - self.clock.now
+            self.clock.now += first + 1
+            for _ in range(3):
+                stats.record(10, ok=False)
+        self.assertEqual(stats.ejected_until - self.clock.now, 2 * first)
+
+    def test_fully_ejected_pool_is_still_tried(self):
+        with self.assertLogs("apps.core.async_client", "WARNING"):
+            for base in (FAST, SLOW):
+                for _ in range(3):
+                    _get_upstream_stats(base).record(10, ok=False)
+        self.assertEqual(sorted(rank_fastapi_base_urls([FAST, SLOW])), [FAST, SLOW])
+
+
+@override_settings(FASTAPI_BASE_URLS=f"{SLOW},{FAST}")
+class CallFastapiFailoverTests(SimpleTestCase):
+    def setUp(self):
+        async_client._upstream_stats.clear()
+        self.addCleanup(async_client._upstream_stats.clear)
+
+    def test_fails_over_to_the_next_url_and_records_both(self):
+        def handler(request):
+            return httpx.Response(503 if request.url.host == "slow.test" else 200)
+
+        def get_client(base):
+            return httpx.AsyncClient(base_url=base, transport=httpx.MockTransport(handler))
+
+        with self.assertLogs("apps.core.async_client", "WARNING"):
+            response = asyncio.run(call_fastapi("GET", "/health", retries_per_url=1, get_client=get_client))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(_get_upstream_stats(SLOW).failures, 1)
+        self.assertEqual(_get_upstream_stats(FAST).requests, 1)
@@ -0,0 +1,91 @@
+"""
+Stored character and token-estimate counters for AI-generated content rows.
+
+Cost dashboards used to recompute ``Length(Cast(json, text))`` over whole
+tables. Models that inherit ``CharCountedModel`` keep ``char_count`` and
+``token_estimate`` current on every save and ``bulk_create``, so aggregates
+only sum integer columns.
+"""
+import json
+
+from django.core import checks
+from django.db import models
+
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(char_count: int) -> int:
+    """~4 characters per token for English mixed text (same rule as the dashboards)."""
+    if not char_count:
+        return 0
+    return int(round(char_count / CHARS_PER_TOKEN))
+
+
+def json_chars(value) -> int:
+    """Length of a JSON value as text; matches Postgres' jsonb::text spacing."""
+    try:
+        return len(json.dumps(value, ensure_ascii=False))
+    except (TypeError, ValueError):
+        return 0
+
+
+class CharCountedQuerySet(models.QuerySet):
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        for obj in objs:
+            obj.refresh_char_count()
+        return super().bulk_create(objs, *args, **kwargs)
+
+
+class CharCountedModel(models.Model):
+    """
+    Abstract base for rows whose text is billed as AI tokens.
+
+    Subclasses list their text/JSON fields in ``CHAR_SOURCE_FIELDS``: text
+    fields count their length and JSON fields their serialized length. A
+    concrete subclass that lists none fails ``manage.py check``.
+    """
+
+    CHAR_SOURCE_FIELDS: tuple[str, ...] = ()
+
+    char_count = models.PositiveIntegerField(default=0, editable=False)
+    token_estimate = models.PositiveIntegerField(default=0, editable=False)
+
+    objects = CharCountedQuerySet.as_manager()
+
+    class Meta:
+        abstract = True
+
+    @classmethod
+    def check(cls, **kwargs):
+        errors = super().check(**kwargs)
+        if not cls._meta.abstract and not cls.CHAR_SOURCE_FIELDS:
+            errors.append(checks.Error(
+                "CharCountedModel subclasses must list their text fields in CHAR_SOURCE_FIELDS.",
+                obj=cls,
+                id="core.E001",
+            ))
+        return errors
+
+    def measure_chars(self) -> int:
+        total = 0
+        for name in self.CHAR_SOURCE_FIELDS:
+            value = getattr(self, name)
+            if isinstance(self._meta.get_field(name), models.JSONField):
+                total += json_chars(value)
+            else:
+                total += len(value or "")
+        return total
+
+    def refresh_char_count(self) -> None:
+        self.char_count = self.measure_chars()
+        self.token_estimate = estimate_tokens(self.char_count)
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get("update_fields")
+        if update_fields is None:
+            self.refresh_char_count()
+        elif set(update_fields) & set(self.CHAR_SOURCE_FIELDS):
+            self.refresh_char_count()
+            kwargs["update_fields"] = {*update_fields, "char_count", "token_estimate"}
+        super().save(*args, **kwargs)
@@ -1,67 +1,44 @@
+import base64
 import datetime
-import logging
+import heapq
+from itertools import islice
 from django.utils import timezone
-from django.db.models.functions import TruncDate, Length, Cast, Coalesce
 from django.db import models as dm
 from django.db.models import Value
+from django.db.models.functions import Coalesce
+from apps.core.text_metrics import estimate_tokens
 from apps.quiz.models import QuizSession
 
-def _calculate_streak(user):
-    """Consecutive days (ending today) with at least one study activity."""
-    quiz_dates = (
-        QuizSession.objects
-        .filter(user=user)
-        .annotate(day=TruncDate('created_at'))
-        .values_list('day', flat=True)
-        .distinct()
-    )
+from .rollups import read_active_dates, read_activity_days, read_since
 
-    activity_days = set(d for d in quiz_dates if d)
 
-    try:
-        from apps.flashcards.models import Deck
-        deck_dates = (
-            Deck.objects
-            .filter(user=user)
-            .annotate(day=TruncDate('created_at'))
-            .values_list('day', flat=True)
-            .distinct()
-        )
-        activity_days.update(d for d in deck_dates if d)
-    except Exception:
-        pass
+def _streaks(active_days, today):
+    """(current, longest) runs of consecutive days; current must end today."""
+    current = longest = run = 0
+    previous = None
+    for day in active_days:
+        run = run + 1 if previous is not None and (day - previous).days == 1 else 1
+        longest = max(longest, run)
+        previous = day
+    if previous == today:
+        current = run
+    return current, longest
 
-    try:
-        from apps.chatbot.models import ChatSession
-        chat_dates = (
-            ChatSession.objects
-            .filter(user=user)
-            .annotate(day=TruncDate('created_at'))
-            .values_list('day', flat=True)
-            .distinct()
-        )
-        activity_days.update(d for d in chat_dates if d)
-    except Exception:
-        pass
 
-    try:
-        from apps.materials.models import Material
-        material_dates = (
-            Material.objects
-            .filter(uploaded_by=user)
-            .annotate(day=TruncDate('created_at'))
-            .values_list('day', flat=True)
-            .distinct()
-        )
-        activity_days.update(d for d in material_dates if d)
-    except Exception:
-        pass
+def _study_streaks(user):
+    """(current, longest) study streaks, from the user's active dates alone."""
+    return _streaks(read_active_dates(user.id), timezone.localdate())
+
 
-    streak = 0
-    today = timezone.now().date()
-    while (today - datetime.timedelta(days=streak)) in activity_days:
-        streak += 1
-    return streak
+def _activity_summary(user, days: int = 365):
+    """Streaks plus a sparse {date: count} heatmap for the last ``days`` days."""
+    current, longest = _study_streaks(user)
+    since = timezone.localdate() - datetime.timedelta(days=days - 1)
+    return {
+        'current_streak': current,
+        'longest_streak': longest,
+        'heatmap': {day.isoformat(): count for day, count in read_activity_days(user.id, since)},
+    }
 
 
 def _tokens_from_chars(char_count: int) -> int:
@@ -69,9 +46,7 @@ def _tokens_from_chars(char_count: int) -> int:
     Approximate token count from character count.
     Rule of thumb: ~4 characters/token for English mixed text.
     """
-    if not char_count:
-        return 0
-    return int(round(char_count / 4))
+    return estimate_tokens(char_count)
 
 
 # Conservative blended rate across DeepSeek / Claude / GPT-4 (~$2 per 1M tokens).
@@ -86,124 +61,288 @@ def _cost_from_tokens(tokens: int) -> float:
     return round((tokens / 1000) * _BLENDED_COST_PER_1K_TOKENS, 4)
 
 
-def _safe_char_sum(qs, expression):
-    result = qs.aggregate(total=Coalesce(dm.Sum(expression), Value(0)))
-    return int(result.get("total") or 0)
-
-
-
 def _admin_activity_actor(user_obj):
     if not user_obj:
         return "Unknown user"
     return getattr(user_obj, "username", None) or getattr(user_obj, "email", "User")
 
 
-def _collect_admin_activity(start_at=None, limit=50, offset=0):
-    """Build merged activity timeline from quiz, flashcards, chat sessions, materials, and clashes."""
+# ── Admin activity feed ──────────────────────────────────────────────────────
+# Each source is read newest-first on (timestamp, id); heapq.merge interleaves
+# them lazily, so a page touches at most (offset + limit + 1) rows per source
+# and keyset cursors make every page as cheap as the first.
+
+# Rollup counter backing each feed type's count (see rollups.py / signals.py).
+_FEED_COUNT_METRICS = {
+    "quiz": "quizzes",
+    "flashcards": "decks",
+    "chat": "chat_sessions",
+    "material": "materials",
+    "clash": "clashes",
+}
+
+
+def _feed_querysets():
     from apps.flashcards.models import Deck
     from apps.materials.models import Material
     from apps.chatbot.models import ChatSession
     from apps.clash.models import ClashRoom
 
-    limit = max(1, min(int(limit or 50), 200))
-    offset = max(0, int(offset or 0))
-    fetch_size = min(max(limit + offset, 120), 600)
+    # (type, queryset, timestamp field) — order matters: it breaks timestamp ties.
+    # Each queryset must match what its _FEED_COUNT_METRICS rollup counts, so the
+    # header totals agree with the list: chat_sessions skips anonymous sessions.
+    return (
+        ("quiz", QuizSession.objects.select_related("user"), "created_at"),
+        ("flashcards", Deck.objects.select_related("user"), "created_at"),
+        ("chat", ChatSession.objects.select_related("user").filter(user__isnull=False), "created_at"),
+        ("material", Material.objects.select_related("uploaded_by"), "created_at"),
+        ("clash", ClashRoom.objects.select_related("host").filter(status=ClashRoom.FINISHED), "finished_at"),
+    )
+
+
+def _encode_activity_cursor(ts, rank: int, pk: int) -> str:
+    raw = f"{ts.isoformat()}|{rank}|{pk}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
 
-    recent_activity = []
 
-    quizzes_qs = QuizSession.objects.select_related("user")
-    decks_qs = Deck.objects.select_related("user")
-    chats_qs = ChatSession.objects.select_related("user").annotate(message_count=dm.Count("messages"))
-    materials_qs = Material.objects.select_related("uploaded_by")
-    clashes_qs = ClashRoom.objects.select_related("host").annotate(
-        participant_count=dm.Count("participants")
-    ).filter(status=ClashRoom.FINISHED)
+def _decode_activity_cursor(cursor: str | None):
+    """Return (timestamp, rank, pk) or None for a missing/garbled cursor."""
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        ts_raw, rank, pk = raw.split("|")
+        ts = datetime.datetime.fromisoformat(ts_raw)
+        return (ts if timezone.is_aware(ts) else timezone.make_aware(ts)), int(rank), int(pk)
+    except (ValueError, TypeError, UnicodeDecodeError):
+        return None
+
 
+def _feed_source_rows(rank, qs, ts_field, *, start_at, cursor, size):
+    """Newest-first (ts, rank, pk, obj) rows of one source strictly after ``cursor``."""
     if start_at is not None:
-        quizzes_qs = quizzes_qs.filter(created_at__gte=start_at)
-        decks_qs = decks_qs.filter(created_at__gte=start_at)
-        chats_qs = chats_qs.filter(created_at__gte=start_at)
-        materials_qs = materials_qs.filter(created_at__gte=start_at)
-        clashes_qs = clashes_qs.filter(finished_at__gte=start_at)
-
-    for quiz in quizzes_qs.order_by("-created_at")[:fetch_size]:
-        subject = quiz.subject or "General"
-        recent_activity.append(
-            {
-                "type": "quiz",
-                "actor": _admin_activity_actor(quiz.user),
-                "text": f"completed a {subject} quiz ({quiz.score_percentage}%)",
-                "created_at": quiz.created_at,
-            }
-        )
+        qs = qs.filter(**{f"{ts_field}__gte": start_at})
+    if cursor is not None:
+        c_ts, c_rank, c_pk = cursor
+        if rank < c_rank:
+            qs = qs.filter(**{f"{ts_field}__lte": c_ts})
+        elif rank == c_rank:
+            qs = qs.filter(dm.Q(**{f"{ts_field}__lt": c_ts}) | dm.Q(**{ts_field: c_ts, "pk__lt": c_pk}))
+        else:
+            qs = qs.filter(**{f"{ts_field}__lt": c_ts})
+    for obj in qs.order_by(f"-{ts_field}", "-pk")[:size]:
+        yield getattr(obj, ts_field), rank, obj.pk, obj
 
-    for deck in decks_qs.order_by("-created_at")[:fetch_size]:
-        subject = deck.subject or "General"
-        recent_activity.append(
-            {
-                "type": "flashcards",
-                "actor": _admin_activity_actor(deck.user),
-                "text": f"created flashcard deck '{deck.title}' ({subject})",
-                "created_at": deck.created_at,
-            }
-        )
 
-    for chat in chats_qs.order_by("-created_at")[:fetch_size]:
-        msg_count = int(getattr(chat, "message_count", 0) or 0)
-        recent_activity.append(
-            {
-                "type": "chat",
-                "actor": _admin_activity_actor(chat.user),
-                "text": f"started chat session ({msg_count} message{'s' if msg_count != 1 else ''})",
-                "created_at": chat.created_at,
-            }
-        )
+def _render_activity(item_type, obj, *, message_counts, participant_counts):
+    if item_type == "quiz":
+        subject = obj.subject or "General"
+        return _admin_activity_actor(obj.user), f"completed a {subject} quiz ({obj.score_percentage}%)"
+    if item_type == "flashcards":
+        subject = obj.subject or "General"
+        return _admin_activity_actor(obj.user), f"created flashcard deck '{obj.title}' ({subject})"
+    if item_type == "chat":
+        n = message_counts.get(obj.pk, 0)
+        return _admin_activity_actor(obj.user), f"started chat session ({n} message{'s' if n != 1 else ''})"
+    if item_type == "material":
+        title = obj.title or "Untitled"
+        return _admin_activity_actor(obj.uploaded_by), f"uploaded material '{title}' ({obj.file_size_display})"
+    n = participant_counts.get(obj.pk, 0)
+    return (
+        _admin_activity_actor(obj.host),
+        f"hosted a Clash on '{obj.subject}' ({n} player{'s' if n != 1 else ''}, {obj.difficulty})",
+    )
 
-    for material in materials_qs.order_by("-created_at")[:fetch_size]:
-        title = material.title or "Untitled"
-        recent_activity.append(
-            {
-                "type": "material",
-                "actor": _admin_activity_actor(material.uploaded_by),
-                "text": f"uploaded material '{title}' ({material.file_size_display})",
-                "created_at": material.created_at,
-            }
-        )
 
-    for clash in clashes_qs.order_by("-finished_at")[:fetch_size]:
-        n = int(getattr(clash, "participant_count", 0) or 0)
-        recent_activity.append(
-            {
-                "type": "clash",
-                "actor": _admin_activity_actor(clash.host),
-                "text": f"hosted a Clash on '{clash.subject}' ({n} player{'s' if n != 1 else ''}, {clash.difficulty})",
-                "created_at": clash.finished_at,
-            }
+def _collect_admin_activity(start_at=None, limit=50, offset=0, cursor=None):
+    """
+    One page of the merged activity timeline from quiz, flashcards, chat sessions, materials, and clashes.
+
+    Returns (items, next_cursor). Pass ``cursor`` (preferred) or ``offset`` to page;
+    ``next_cursor`` is None on the last page.
+    """
+    from apps.chatbot.models import ChatMessage
+    from apps.clash.models import ClashParticipant
+
+    limit = max(1, min(int(limit or 50), 200))
+    decoded = _decode_activity_cursor(cursor)
+    offset = 0 if decoded is not None else max(0, int(offset or 0))
+    size = offset + limit + 1
+
+    sources = _feed_querysets()
+    streams = [
+        _feed_source_rows(rank, qs, ts_field, start_at=start_at, cursor=decoded, size=size)
+        for rank, (_, qs, ts_field) in enumerate(sources)
+    ]
+    merged = heapq.merge(*streams, key=lambda row: row[:3], reverse=True)
+    page = list(islice(merged, offset, offset + limit + 1))
+    has_more = len(page) > limit
+    page = page[:limit]
+
+    # Per-row counts for this page only, instead of annotating every candidate row.
+    chat_ids = [pk for _, rank, pk, _ in page if sources[rank][0] == "chat"]
+    clash_ids = [pk for _, rank, pk, _ in page if sources[rank][0] == "clash"]
+    message_counts = dict(
+        ChatMessage.objects.filter(session_id__in=chat_ids)
+        .values("session_id").annotate(n=dm.Count("id")).values_list("session_id", "n")
+    ) if chat_ids else {}
+    participant_counts = dict(
+        ClashParticipant.objects.filter(room_id__in=clash_ids)
+        .values("room_id").annotate(n=dm.Count("id")).values_list("room_id", "n")
+    ) if clash_ids else {}
+
+    items = []
+    for ts, rank, pk, obj in page:
+        item_type = sources[rank][0]
+        actor, text = _render_activity(
+            item_type, obj, message_counts=message_counts, participant_counts=participant_counts,
         )
+        items.append({
+            "id": f"{item_type}:{pk}",
+            "type": item_type,
+            "actor": actor,
+            "text": text,
+            "created_at": ts.isoformat(),
+        })
+
+    next_cursor = None
+    if has_more and page:
+        ts, rank, pk, _ = page[-1]
+        next_cursor = _encode_activity_cursor(ts, rank, pk)
+    return items, next_cursor
+
+
+def _admin_activity_counts(start_at=None):
+    """(total, counts_by_type) for the feed window, read from the metric rollups."""
+    values = read_since(_FEED_COUNT_METRICS.values(), start_at)
+    counts = {item_type: values[metric] for item_type, metric in _FEED_COUNT_METRICS.items()}
+    return sum(counts.values()), counts
+
+
+# ── Admin user drill-down ────────────────────────────────────────────────────
+
+def _load_admin_user_detail(target):
+    """
+    Payload for the admin per-user detail view in a fixed number of queries
+    (one aggregate per table + one query per recent-activity list), however
+    much activity the user has.
+    """
+    from apps.accounts.serializers import user_to_dict
+    from apps.chatbot.models import ChatSession
+    from apps.clash.models import ClashParticipant, ClashRoom
+    from apps.flashcards.models import Deck
+    from apps.materials.models import Material
+    from .models import QuizExperienceRating
+
+    quizzes_qs = QuizSession.objects.filter(user=target)
+    decks_qs = Deck.objects.filter(user=target)
+    chat_sessions_qs = ChatSession.objects.filter(user=target)
+    clash_parts_qs = ClashParticipant.objects.filter(user=target, room__status=ClashRoom.FINISHED)
+
+    quiz_stats = quizzes_qs.aggregate(
+        total=dm.Count('id'),
+        avg=dm.Avg('score_percentage'),
+        total_questions=Coalesce(dm.Sum('total_questions'), Value(0)),
+        chars=Coalesce(dm.Sum('char_count'), Value(0)),
+    )
+    deck_stats = decks_qs.aggregate(
+        decks=dm.Count('id', distinct=True),
+        card_count=dm.Count('cards'),
+        chars=Coalesce(dm.Sum('cards__char_count'), Value(0)),
+    )
+    chat_stats = chat_sessions_qs.aggregate(
+        sessions=dm.Count('id', distinct=True),
+        message_count=dm.Count('messages'),
+        chars=Coalesce(dm.Sum('messages__char_count'), Value(0)),
+    )
+    # Host pays for question generation, so clash tokens only count hosted rooms.
+    clash_stats = clash_parts_qs.aggregate(
+        total=dm.Count('id'),
+        as_host=dm.Count('id', filter=dm.Q(is_host=True)),
+        wins=dm.Count('id', filter=dm.Q(rank=1)),
+        avg_score=dm.Avg('score'),
+        hosted_chars=Coalesce(dm.Sum('room__char_count', filter=dm.Q(is_host=True)), Value(0)),
+    )
+    total_materials = Material.objects.filter(uploaded_by=target).count()
+    user_rating_value = (
+        QuizExperienceRating.objects.filter(user=target)
+        .order_by('-updated_at').values_list('rating', flat=True).first()
+    )
+
+    # Recent per-user activity (quizzes + flashcards + chat + clash)
+    recent_activity = []
+    for q in quizzes_qs.only('subject', 'score_percentage', 'created_at').order_by('-created_at')[:10]:
+        recent_activity.append({
+            "type": "quiz",
+            "text": f"completed a {(q.subject or 'General')} quiz ({q.score_percentage}%)",
+            "created_at": q.created_at,
+        })
+
+    for d in decks_qs.only('title', 'created_at').order_by('-created_at')[:10]:
+        recent_activity.append({
+            "type": "flashcards",
+            "text": f"created flashcard deck '{d.title}'",
+            "created_at": d.created_at,
+        })
+
+    for s in chat_sessions_qs.annotate(msg_count=dm.Count('messages')).order_by('-created_at')[:10]:
+        recent_activity.append({
+            "type": "chat",
+            "text": f"chat session ({s.msg_count} message{'s' if s.msg_count != 1 else ''})",
+            "created_at": s.created_at,
+        })
+
+    recent_clashes = (
+        clash_parts_qs.select_related('room')
+        .only('is_host', 'rank', 'score', 'room__subject', 'room__finished_at')
+        .annotate(player_count=dm.Count('room__participants'))
+        .order_by('-room__finished_at')[:10]
+    )
+    for p in recent_clashes:
+        role = 'hosted' if p.is_host else 'played'
+        recent_activity.append({
+            "type": "clash",
+            "text": f"{role} a Clash on '{p.room.subject}' — #{p.rank} of {p.player_count} ({p.score} pts)",
+            "created_at": p.room.finished_at,
+        })
 
     recent_activity.sort(key=lambda item: item["created_at"], reverse=True)
+    recent_activity = [
+        {**item, "created_at": item["created_at"].isoformat()}
+        for item in recent_activity[:20]
+    ]
+
+    tokens_quiz = _tokens_from_chars(int(quiz_stats['chars']))
+    tokens_flashcards = _tokens_from_chars(int(deck_stats['chars']))
+    tokens_chat = _tokens_from_chars(int(chat_stats['chars']))
+    tokens_clash = _tokens_from_chars(int(clash_stats['hosted_chars']))
+    tokens_total = tokens_quiz + tokens_flashcards + tokens_chat + tokens_clash
 
-    counts_by_type = {
-        "quiz": 0,
-        "flashcards": 0,
-        "chat": 0,
-        "material": 0,
-        "clash": 0,
+    return {
+        'user': user_to_dict(target),
+        'summary': {
+            'total_quizzes': quiz_stats['total'],
+            'total_quiz_questions': int(quiz_stats['total_questions']),
+            'average_score': round(float(quiz_stats['avg'] or 0), 1),
+            'total_flashcard_decks': deck_stats['decks'],
+            'total_flashcards': deck_stats['card_count'],
+            'total_chat_sessions': chat_stats['sessions'],
+            'total_chat_messages': chat_stats['message_count'],
+            'total_materials': total_materials,
+            'total_clashes': clash_stats['total'],
+            'clashes_as_host': clash_stats['as_host'],
+            'clash_wins': clash_stats['wins'],
+            'clash_avg_score': int(round(float(clash_stats['avg_score'] or 0))),
+            'user_rating': user_rating_value,
+        },
+        'estimated_tokens': {
+            'quiz': tokens_quiz,
+            'flashcards': tokens_flashcards,
+            'chat': tokens_chat,
+            'clash': tokens_clash,
+            'total': tokens_total,
+            'estimated_cost_usd': _cost_from_tokens(tokens_total),
+            'method': 'chars_div_4_estimate',
+        },
+        'recent_activity': recent_activity,
     }
-    for item in recent_activity:
-        item_type = item.get("type")
-        if item_type in counts_by_type:
-            counts_by_type[item_type] += 1
-
-    total_count = len(recent_activity)
-    page_items = recent_activity[offset: offset + limit]
-    serialized = [
-        {
-            "type": item["type"],
-            "actor": item["actor"],
-            "text": item["text"],
-            "created_at": item["created_at"].isoformat(),
-        }
-        for item in page_items
-    ]
-    return serialized, total_count, counts_by_type
\ No newline at end of file
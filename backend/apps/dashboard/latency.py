@@ -0,0 +1,86 @@
+"""
+Mergeable AI latency histograms for percentile reporting.
+
+Every ``AIResponseLatency`` row adds 1 to one log-scale bin counter
+``ai_latency_hist.<feature>.<bin>`` in the metric rollups (see signals.py), so
+each hour, day and all-time bucket holds an HDR-style histogram per feature.
+Histograms merge by addition. Any window is therefore a ``Sum`` over its
+buckets, and p50/p90/p99 come from the merged bins without touching raw rows.
+
+Bins are ``BINS_PER_OCTAVE`` per doubling of the latency, so a reported
+percentile is within ~4.4% of the true value.
+"""
+import datetime
+import math
+from collections import defaultdict
+
+from .rollups import read_prefix_since
+
+HIST_PREFIX = "ai_latency_hist."
+BINS_PER_OCTAVE = 16
+DEFAULT_QUANTILES = (0.5, 0.9, 0.99)
+
+
+def latency_bin(duration_ms: int) -> int:
+    """Histogram bin for a duration; 0 holds everything up to 1ms."""
+    if duration_ms <= 1:
+        return 0
+    return int(math.floor(BINS_PER_OCTAVE * math.log2(duration_ms)))
+
+
+def bin_value(index: int) -> float:
+    """Representative latency of a bin (geometric midpoint of its range)."""
+    if index <= 0:
+        return 1.0
+    return 2 ** ((index + 0.5) / BINS_PER_OCTAVE)
+
+
+def histogram_metric(feature: str, duration_ms: int) -> str:
+    return f"{HIST_PREFIX}{feature}.{latency_bin(duration_ms)}"
+
+
+def quantiles(bins: dict[int, int], qs=DEFAULT_QUANTILES) -> dict[float, float]:
+    """Quantiles of a merged histogram ``{bin: count}``; zeros when empty."""
+    total = sum(bins.values())
+    if not total:
+        return {q: 0.0 for q in qs}
+    ordered = sorted(bins.items())
+    result = {}
+    for q in qs:
+        rank = max(1, math.ceil(q * total))
+        seen = 0
+        for index, count in ordered:
+            seen += count
+            if seen >= rank:
+                result[q] = round(bin_value(index), 1)
+                break
+    return result
+
+
+def read_latency_histograms(since: datetime.datetime | None) -> dict[str, dict[int, int]]:
+    """Merged ``{feature: {bin: count}}`` from ``since`` until now (all time if None)."""
+    histograms: dict[str, dict[int, int]] = defaultdict(dict)
+    for metric, count in read_prefix_since(HIST_PREFIX, since).items():
+        feature, _, index = metric[len(HIST_PREFIX):].rpartition(".")
+        histograms[feature][int(index)] = count
+    return histograms
+
+
+def latency_percentiles(features, since: datetime.datetime | None, qs=DEFAULT_QUANTILES) -> dict[str, dict]:
+    """``{feature: {"count", "p50", "p90", "p99"}}`` for each feature, plus ``"all"`` merged."""
+    histograms = read_latency_histograms(since)
+    merged: dict[int, int] = defaultdict(int)
+    report = {}
+    for feature in [*features, "all"]:
+        if feature == "all":
+            bins = merged
+        else:
+            bins = histograms.get(feature, {})
+            for index, count in bins.items():
+                merged[index] += count
+        values = quantiles(bins, qs)
+        report[feature] = {
+            "count": sum(bins.values()),
+            **{f"p{q * 100:g}": values[q] for q in qs},
+        }
+    return report
@@ -0,0 +1,66 @@
+"""
+Rebuild the admin metric rollups and per-user activity days from the source tables.
+
+The release step runs it with ``--if-empty`` after ``migrate``, so a fresh
+deploy (or a new rollup table) starts from a real recount, not zeros. Run it
+without the flag whenever counters are suspected to have drifted (e.g. after
+raw SQL edits). Anonymous usage and AI latency counters only keep history for
+rows still inside their retention window.
+
+Usage:
+    python manage.py rebuild_metric_rollups
+    python manage.py rebuild_metric_rollups --if-empty
+    python manage.py rebuild_metric_rollups --dry-run
+"""
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = "Recompute MetricRollup counters from all tracked tables"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--if-empty",
+            action="store_true",
+            help="Only rebuild tables that have no rows yet (safe to run on every deploy)",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Print the all-time totals without touching the DB",
+        )
+
+    def handle(self, *args, **options):
+        from apps.dashboard import rollups
+        from apps.dashboard.models import MetricRollup, UserActivityDay
+
+        metrics = activity = True
+        if options["if_empty"]:
+            metrics = not MetricRollup.objects.exists()
+            activity = not UserActivityDay.objects.exists()
+            if not (metrics or activity):
+                self.stdout.write("Rollups already populated; nothing to do")
+                return
+
+        def progress(label, rows):
+            self.stdout.write(f"  {label}: {rows} rows")
+
+        if options["dry_run"]:
+            deltas, days = rollups.compute_from_sources(metrics=metrics, activity=activity, progress=progress)
+        else:
+            deltas, days = rollups.rebuild(metrics=metrics, activity=activity, progress=progress)
+
+        totals = sorted(
+            (metric, value) for (metric, period, _), value in deltas.items()
+            if period == MetricRollup.TOTAL
+        )
+        for metric, value in totals:
+            self.stdout.write(f"  {metric} = {value}")
+        self.stdout.write(f"  activity days = {len(days)}")
+
+        if options["dry_run"]:
+            self.stdout.write(self.style.WARNING("Dry run — no DB writes"))
+            return
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt {len(deltas)} rollup counters and {len(days)} activity days"
+        ))
@@ -0,0 +1,52 @@
+"""
+Delete expired AnonymousUsageEvent / AIResponseLatency rows and old hourly
+MetricRollup buckets in small batches.
+
+The web process already runs this sweep in a background thread (see
+apps/dashboard/retention.py). Use the command to clear a large backlog once,
+or from a cron job when the in-process sweeper is not wanted.
+
+Usage:
+    python manage.py sweep_expired_telemetry
+    python manage.py sweep_expired_telemetry --batch-size 5000 --pause-ms 200
+    python manage.py sweep_expired_telemetry --dry-run
+"""
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+
+class Command(BaseCommand):
+    help = "Delete expired analytics rows in bounded primary-key batches"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=None, help="Rows per DELETE (default: RETENTION_SWEEP_BATCH_SIZE)")
+        parser.add_argument("--pause-ms", type=int, default=None, help="Sleep between batches (default: RETENTION_SWEEP_PAUSE_MS)")
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Count expired rows without deleting anything",
+        )
+
+    def handle(self, *args, **options):
+        from apps.dashboard.retention import expired_rows, retention_policies, sweep_expired
+
+        def progress(label, batch, total):
+            self.stdout.write(f"  {label}: -{batch} (total {total})")
+
+        for model, hours in retention_policies():
+            label = model._meta.label
+            if options["dry_run"]:
+                cutoff = timezone.now() - timezone.timedelta(hours=hours)
+                expired = expired_rows(model, cutoff).count()
+                self.stdout.write(f"  {label}: {expired} rows older than {hours}h")
+                continue
+            deleted = sweep_expired(
+                model, hours,
+                batch_size=options["batch_size"],
+                pause_ms=options["pause_ms"],
+                progress=progress,
+            )
+            self.stdout.write(self.style.SUCCESS(f"{label}: deleted {deleted} rows older than {hours}h"))
+
+        if options["dry_run"]:
+            self.stdout.write(self.style.WARNING("Dry run — no DB writes"))
@@ -1,20 +1,20 @@
-from django.core.cache import cache
-from django.utils import timezone
 import json
-from asgiref.sync import sync_to_async
+
+from apps.core.sse_relay import SSERelayResponse
 
 from .models import AnonymousUsageEvent
+from .retention import retention_sweeper
+from .telemetry import telemetry_writer
 
 
 class AnonymousUsageTrackingMiddleware:
-    """Track unauthenticated API usage and keep only the last 24 hours."""
+    """Track unauthenticated API usage. Expired rows are removed by the retention sweeper."""
 
-    PURGE_CACHE_KEY = "dashboard_anonymous_usage_last_purge"
-    PURGE_INTERVAL_SECONDS = 300
     MAX_CAPTURED_STREAM_CHARS = 8000
 
     def __init__(self, get_response):
         self.get_response = get_response
+        retention_sweeper.start()
 
     def _extract_tutor_message(self, path: str, body_bytes: bytes) -> str:
         if '/chat/' not in path and '/chatbot/' not in path:
@@ -74,7 +74,7 @@ class AnonymousUsageTrackingMiddleware:
     def _create_event(self, *, session_key: str, request, path: str, response, request_chars: int, response_chars: int, tutor_message: str, tutor_response: str):
         forwarded_for = (request.META.get("HTTP_X_FORWARDED_FOR") or "").split(",")[0].strip()
         ip = forwarded_for or request.META.get("REMOTE_ADDR")
-        AnonymousUsageEvent.objects.create(
+        telemetry_writer.enqueue(AnonymousUsageEvent(
             session_key=session_key,
             method=(request.method or "").upper()[:10],
             path=path[:255],
@@ -86,16 +86,36 @@ class AnonymousUsageTrackingMiddleware:
             tutor_response=(tutor_response or "")[:8000],
             ip_address=ip,
             user_agent=(request.META.get("HTTP_USER_AGENT") or "")[:255],
-        )
+        ))
+
+    def _hook_relay_response(self, response, *, session_key: str, request, path: str, request_chars: int, tutor_message: str):
+        """SSE relays already count bytes and collect the reply text; just record on completion."""
+        async def _record(relay):
+            self._create_event(
+                session_key=session_key,
+                request=request,
+                path=path,
+                response=response,
+                request_chars=request_chars,
+                response_chars=relay.bytes_sent,
+                tutor_message=tutor_message,
+                tutor_response=relay.text[:self.MAX_CAPTURED_STREAM_CHARS],
+            )
 
-    def _maybe_purge(self):
-        now_ts = timezone.now().timestamp()
-        last_purge_ts = cache.get(self.PURGE_CACHE_KEY)
-        if not last_purge_ts or (now_ts - float(last_purge_ts)) >= self.PURGE_INTERVAL_SECONDS:
-            AnonymousUsageEvent.purge_expired(hours=24)
-            cache.set(self.PURGE_CACHE_KEY, now_ts, timeout=self.PURGE_INTERVAL_SECONDS)
+        response.relay.add_completion_hook(_record)
+        return response
 
     def _wrap_streaming_response(self, response, *, session_key: str, request, path: str, request_chars: int, tutor_message: str):
+        if isinstance(response, SSERelayResponse):
+            return self._hook_relay_response(
+                response,
+                session_key=session_key,
+                request=request,
+                path=path,
+                request_chars=request_chars,
+                tutor_message=tutor_message,
+            )
+
         original_stream = response.streaming_content
         captured_parts = []
         captured_chars = 0
@@ -117,7 +137,7 @@ class AnonymousUsageTrackingMiddleware:
                                 captured_chars += len(kept)
                         yield chunk
                 finally:
-                    await sync_to_async(self._create_event, thread_sensitive=True)(
+                    self._create_event(
                         session_key=session_key,
                         request=request,
                         path=path,
@@ -127,7 +147,6 @@ class AnonymousUsageTrackingMiddleware:
                         tutor_message=tutor_message,
                         tutor_response=''.join(captured_parts).strip(),
                     )
-                    await sync_to_async(self._maybe_purge, thread_sensitive=True)()
 
             response.streaming_content = wrapped_stream_async()
             return response
@@ -157,7 +176,6 @@ class AnonymousUsageTrackingMiddleware:
                     tutor_message=tutor_message,
                     tutor_response=''.join(captured_parts).strip(),
                 )
-                self._maybe_purge()
 
         response.streaming_content = wrapped_stream_sync()
         return response
@@ -222,7 +240,6 @@ class AnonymousUsageTrackingMiddleware:
                 tutor_message=tutor_message,
                 tutor_response=tutor_response,
             )
-            self._maybe_purge()
         except Exception:
             # Tracking should never break the main request flow.
             pass
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.1 on 2026-10-19 00:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0010_rename_dashboard_a_feature_created_idx_dashboard_a_feature_acc43e_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MetricRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('metric', models.CharField(max_length=64)),
+                ('period', models.CharField(choices=[('hour', 'Hour'), ('day', 'Day'), ('total', 'All time')], max_length=5)),
+                ('bucket', models.DateTimeField()),
+                ('value', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['period', 'bucket'], name='dashboard_m_period_f1475e_idx')],
+                'constraints': [models.UniqueConstraint(fields=('metric', 'period', 'bucket'), name='dashboard_metric_rollup_uniq')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.1 on 2026-10-19 00:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0012_useractivityday'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='airesponselatency',
+            name='feature',
+            field=models.CharField(choices=[('chat', 'Chat'), ('quiz', 'Quiz'), ('flashcards', 'Flashcards'), ('clash', 'Clash')], db_index=True, max_length=20),
+        ),
+    ]
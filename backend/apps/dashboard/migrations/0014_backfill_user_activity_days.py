@@ -0,0 +1,65 @@
+"""
+Data migration: backfill UserActivityDay from every existing quiz session,
+chat session, flashcard deck and uploaded material.
+
+Runs automatically on `manage.py migrate`. The table is replaced with the
+full recount, so it is safe on a DB that already has rows from live saves
+and safe to run again after a rollback.
+
+The activity sources are inlined here (not read from the live rollup
+registry) so this migration stays self-contained and won't break if
+apps.dashboard.signals changes later. Days are local dates, matching
+rollups.activity_key().
+"""
+from collections import Counter
+
+from django.db import migrations
+from django.utils import timezone
+
+# (app_label, model_name, owner field) for every row that counts as study activity.
+_SOURCES = (
+    ("quiz", "QuizSession", "user_id"),
+    ("chatbot", "ChatSession", "user_id"),
+    ("flashcards", "Deck", "user_id"),
+    ("materials", "Material", "uploaded_by_id"),
+)
+
+_BATCH = 2000
+
+
+def backfill(apps, schema_editor):
+    UserActivityDay = apps.get_model("dashboard", "UserActivityDay")
+
+    counts = Counter()
+    for app_label, model_name, owner in _SOURCES:
+        Model = apps.get_model(app_label, model_name)
+        rows = (
+            Model.objects
+            .filter(**{f"{owner}__isnull": False})
+            .values_list(owner, "created_at")
+            .iterator(chunk_size=_BATCH)
+        )
+        for user_id, created_at in rows:
+            if created_at is not None:
+                counts[(user_id, timezone.localdate(created_at))] += 1
+
+    UserActivityDay.objects.all().delete()
+    UserActivityDay.objects.bulk_create(
+        (UserActivityDay(user_id=user_id, day=day, count=n) for (user_id, day), n in counts.items()),
+        batch_size=_BATCH,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("dashboard", "0013_ai_latency_clash_feature"),
+        ("quiz", "0006_quizsession_quiz_session_created_idx"),
+        ("chatbot", "0006_chatsession_chat_session_created_idx"),
+        ("flashcards", "0005_deck_fc_deck_created_idx"),
+        ("materials", "0002_material_material_created_idx"),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
@@ -1,7 +1,6 @@
 from django.conf import settings
 from django.core.validators import MaxValueValidator, MinValueValidator
 from django.db import models
-from django.utils import timezone
 
 from .settings_model import SystemSettings
 
@@ -64,21 +63,28 @@ class AnonymousUsageEvent(models.Model):
 
     @classmethod
     def purge_expired(cls, hours: int = 24) -> int:
-        cutoff = timezone.now() - timezone.timedelta(hours=hours)
-        deleted, _ = cls.objects.filter(created_at__lt=cutoff).delete()
-        return int(deleted)
+        """Batched delete of expired rows; normally done by the retention sweeper, not per request."""
+        from .retention import sweep_expired
+        return sweep_expired(cls, hours)
 
 
 class AIResponseLatency(models.Model):
-    """Per-request AI latency log. Kept for 30 days; used for avg response time stats."""
+    """
+    Per-request AI latency log; averages and percentiles are served from rollups.
+
+    Rows are kept unless ``AI_LATENCY_RETENTION_HOURS`` is set, in which case
+    the retention sweeper deletes older ones.
+    """
 
     CHAT = 'chat'
     QUIZ = 'quiz'
     FLASHCARDS = 'flashcards'
+    CLASH = 'clash'
     FEATURE_CHOICES = [
         (CHAT, 'Chat'),
         (QUIZ, 'Quiz'),
         (FLASHCARDS, 'Flashcards'),
+        (CLASH, 'Clash'),
     ]
 
     feature = models.CharField(max_length=20, choices=FEATURE_CHOICES, db_index=True)
@@ -89,11 +95,62 @@ class AIResponseLatency(models.Model):
         ordering = ['-created_at']
         indexes = [models.Index(fields=['feature', 'created_at'])]
 
-    @classmethod
-    def purge_old(cls, days: int = 30) -> int:
-        cutoff = timezone.now() - timezone.timedelta(days=days)
-        deleted, _ = cls.objects.filter(created_at__lt=cutoff).delete()
-        return int(deleted)
+
+class MetricRollup(models.Model):
+    """
+    Incrementally maintained counter for one metric in one time bucket.
+
+    Rows are written only through ``apps.dashboard.rollups``; ``bucket`` is the
+    UTC start of the hour/day, or the epoch for the all-time total.
+    """
+
+    HOUR = 'hour'
+    DAY = 'day'
+    TOTAL = 'total'
+    PERIOD_CHOICES = [
+        (HOUR, 'Hour'),
+        (DAY, 'Day'),
+        (TOTAL, 'All time'),
+    ]
+
+    metric = models.CharField(max_length=64)
+    period = models.CharField(max_length=5, choices=PERIOD_CHOICES)
+    bucket = models.DateTimeField()
+    value = models.BigIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['metric', 'period', 'bucket'], name='dashboard_metric_rollup_uniq'),
+        ]
+        indexes = [models.Index(fields=['period', 'bucket'])]
+
+    def __str__(self):
+        return f"{self.metric} [{self.period} {self.bucket:%Y-%m-%d %H:%M}] = {self.value}"
+
+
+class UserActivityDay(models.Model):
+    """
+    One row per user per active day; ``count`` is the number of study rows
+    (quizzes, decks, chat sessions, materials) created that day.
+
+    Maintained by ``apps.dashboard.rollups``; a day with ``count`` 0 is inactive.
+    """
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="activity_days")
+    day = models.DateField()
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        ordering = ["user", "day"]
+        constraints = [
+            models.UniqueConstraint(fields=["user", "day"], name="dashboard_user_activity_day_uniq"),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} active {self.day} ({self.count})"
 
 
-__all__ = ["SystemSettings", "QuizExperienceRating", "AnonymousUsageEvent", "AIResponseLatency"]
+__all__ = [
+    "SystemSettings", "QuizExperienceRating", "AnonymousUsageEvent", "AIResponseLatency",
+    "MetricRollup", "UserActivityDay",
+]
@@ -0,0 +1,176 @@
+"""
+Background retention sweeper for the analytics logs.
+
+``AnonymousUsageEvent`` rows older than 24h used to be purged from inside
+requests with one unbounded ``DELETE``. The sweeper instead deletes expired
+rows in primary-key batches of ``RETENTION_SWEEP_BATCH_SIZE``
+and sleeps ``RETENTION_SWEEP_PAUSE_MS`` between batches, so locks are short and
+replicas can keep up. Retention work never runs on the request path.
+``AIResponseLatency`` is only swept when ``AI_LATENCY_RETENTION_HOURS`` is set;
+by default its rows are kept.
+
+A daemon thread runs one pass every ``RETENTION_SWEEP_INTERVAL_SECONDS``. A
+``cache.add`` lock ensures only one worker process sweeps per interval.
+``manage.py sweep_expired_telemetry`` runs the same pass from a shell or a
+cron job and prints its progress.
+
+When a table has been converted to range partitions (apps/core/partitioning.py),
+each pass first drops the partitions that are fully expired. The batched
+delete then only has to clear the remainder of the oldest live partition.
+
+Aggregate counters in ``MetricRollup`` are unaffected: these models are
+registered with ``signals=False``, so the counters outlive the rows. The
+sweeper does prune ``MetricRollup`` itself. Hourly buckets older than
+``METRIC_ROLLUP_HOURLY_RETENTION_DAYS`` (30) go, and daily and all-time
+buckets stay, so reads further back use daily buckets (see rollups._window).
+"""
+import logging
+import threading
+import time
+from typing import Callable
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+LOCK_KEY = "dashboard:retention_sweep:lock"
+
+
+def retention_policies() -> list[tuple[type, int]]:
+    """(model, retention hours) for every swept table."""
+    from .models import AIResponseLatency, AnonymousUsageEvent, MetricRollup
+    from .rollups import hourly_retention_hours
+    policies = [(AnonymousUsageEvent, int(getattr(settings, "ANONYMOUS_USAGE_RETENTION_HOURS", 24)))]
+    latency_hours = getattr(settings, "AI_LATENCY_RETENTION_HOURS", None)
+    if latency_hours:
+        policies.append((AIResponseLatency, int(latency_hours)))
+    policies.append((MetricRollup, hourly_retention_hours()))
+    return policies
+
+
+def expired_rows(model, cutoff):
+    """Rows of ``model`` past ``cutoff``: by ``created_at``, or hourly buckets for MetricRollup."""
+    from .models import MetricRollup
+    if model is MetricRollup:
+        return model._default_manager.filter(period=MetricRollup.HOUR, bucket__lt=cutoff)
+    return model._default_manager.filter(created_at__lt=cutoff)
+
+
+def sweep_expired(
+    model,
+    hours: int,
+    *,
+    batch_size: int | None = None,
+    pause_ms: int | None = None,
+    max_batches: int | None = None,
+    progress: Callable[[str, int, int], None] | None = None,
+) -> int:
+    """
+    Delete rows of ``model`` older than ``hours`` in ascending-pk batches.
+
+    ``progress(label, batch_deleted, total_deleted)`` is called after every
+    batch. Returns the number of rows deleted.
+    """
+    batch_size = max(1, batch_size or int(getattr(settings, "RETENTION_SWEEP_BATCH_SIZE", 1000)))
+    pause = max(0, pause_ms if pause_ms is not None else int(getattr(settings, "RETENTION_SWEEP_PAUSE_MS", 50))) / 1000.0
+    cutoff = timezone.now() - timezone.timedelta(hours=hours)
+    expired = expired_rows(model, cutoff).order_by("pk")
+
+    total = batches = 0
+    while max_batches is None or batches < max_batches:
+        ids = list(expired.values_list("pk", flat=True)[:batch_size])
+        if not ids:
+            break
+        # Repeating the cutoff lets Postgres prune partitions for partitioned tables.
+        deleted, _ = expired_rows(model, cutoff).filter(pk__in=ids).delete()
+        total += deleted
+        batches += 1
+        if progress is not None:
+            progress(model._meta.label, deleted, total)
+        if len(ids) < batch_size:
+            break
+        if pause:
+            time.sleep(pause)
+    return total
+
+
+class RetentionSweeper:
+    """Daemon thread that sweeps every retention policy on an interval."""
+
+    def __init__(self, *, interval_seconds: int):
+        self.interval = max(10, interval_seconds)
+        self._thread: threading.Thread | None = None
+        self._lock = threading.Lock()
+
+        self.runs = 0
+        self.skipped = 0
+        self.failed = 0
+        self.deleted_total = 0
+        self.last_deleted: dict[str, int] = {}
+        self.last_run_at: str | None = None
+        self.last_duration_ms = 0
+        self.last_partitions: dict = {}
+
+    def start(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name="retention-sweeper", daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.run_once()
+            except Exception:
+                self.failed += 1
+                logger.exception("Retention sweep failed")
+
+    def run_once(self, *, force: bool = False) -> dict[str, int] | None:
+        """One pass over all policies; returns rows deleted per model, or None if another worker holds the lock."""
+        if not force and not cache.add(LOCK_KEY, 1, timeout=self.interval):
+            self.skipped += 1
+            return None
+        close_old_connections()
+        started = time.monotonic()
+        try:
+            from apps.core.partitioning import maintain
+            self.last_partitions = maintain()
+        except Exception:
+            logger.exception("Partition maintenance failed")
+        deleted = {}
+        for model, hours in retention_policies():
+            deleted[model._meta.label] = sweep_expired(model, hours)
+        self.runs += 1
+        self.deleted_total += sum(deleted.values())
+        self.last_deleted = deleted
+        self.last_run_at = timezone.now().isoformat()
+        self.last_duration_ms = int((time.monotonic() - started) * 1000)
+        if any(deleted.values()):
+            logger.info("Retention sweep deleted %s in %dms", deleted, self.last_duration_ms)
+        return deleted
+
+    def stats(self) -> dict:
+        return {
+            "interval_seconds": self.interval,
+            "running": self._thread is not None and self._thread.is_alive(),
+            "runs": self.runs,
+            "skipped": self.skipped,
+            "failed": self.failed,
+            "deleted_total": self.deleted_total,
+            "last_deleted": dict(self.last_deleted),
+            "last_run_at": self.last_run_at,
+            "last_duration_ms": self.last_duration_ms,
+            "last_partitions": self.last_partitions,
+        }
+
+
+retention_sweeper = RetentionSweeper(
+    interval_seconds=int(getattr(settings, "RETENTION_SWEEP_INTERVAL_SECONDS", 300)),
+)
@@ -0,0 +1,471 @@
+"""
+Incrementally maintained admin metrics and per-user activity days.
+
+Each tracked model maps a row to a timestamp plus a small dict of additive
+metrics (row count, character volume, score sums...). Saves and deletes apply
+the difference between a row's old and new contribution to its hour, day and
+all-time buckets in ``MetricRollup``, so admin stats read a handful of counter
+rows instead of scanning ChatMessage / QuizSession / Flashcard.
+
+Models that count as study activity also map a row to ``(user_id, timestamp)``;
+the same diffs keep ``UserActivityDay`` current for streaks and heatmaps.
+
+Daily buckets double as a time-series store: ``read_daily_series`` serves
+chart ranges from a cached array of closed days plus a live read of today.
+
+Writes that bypass model signals (``bulk_create``, the telemetry writer) call
+``record_created`` themselves. ``rebuild`` (``manage.py rebuild_metric_rollups``)
+recomputes everything from the source tables. The release step runs it with
+``--if-empty``, so a fresh deploy starts with real totals instead of zeros.
+
+Hourly buckets older than ``METRIC_ROLLUP_HOURLY_RETENTION_DAYS`` are pruned by
+the retention sweeper. Daily and all-time buckets are kept.
+"""
+import datetime
+import logging
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Callable, Iterable
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import F, Q, Sum
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.utils import timezone
+
+from .models import MetricRollup, UserActivityDay
+
+logger = logging.getLogger(__name__)
+
+EPOCH = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+_UPSERT_CHUNK = 500
+_SKIP = object()
+
+SERIES_MAX_DAYS = 90
+SERIES_VERSION_KEY = "dashboard:rollup_series:version"
+
+
+@dataclass(frozen=True)
+class RollupSpec:
+    """How one model feeds the rollups."""
+    fields: tuple[str, ...]   # everything contribute()/activity() read; edits to other fields are ignored
+    contribute: Callable[[object], tuple[datetime.datetime | None, dict[str, int]]]
+    activity: Callable[[object], tuple[int | None, datetime.datetime | None]] | None = None
+
+
+_SPECS: dict[type, RollupSpec] = {}
+
+
+# ── Buckets ───────────────────────────────────────────────────────────────────
+
+def hourly_retention_hours() -> int:
+    return int(getattr(settings, "METRIC_ROLLUP_HOURLY_RETENTION_DAYS", 30)) * 24
+
+
+def hour_bucket(ts: datetime.datetime) -> datetime.datetime:
+    return ts.astimezone(datetime.timezone.utc).replace(minute=0, second=0, microsecond=0)
+
+
+def day_bucket(ts: datetime.datetime) -> datetime.datetime:
+    return hour_bucket(ts).replace(hour=0)
+
+
+def activity_key(spec: RollupSpec, instance) -> tuple[int, datetime.date] | None:
+    """(user_id, local date) the row counts towards, or None."""
+    if spec.activity is None:
+        return None
+    user_id, at = spec.activity(instance)
+    if not user_id or at is None:
+        return None
+    return user_id, timezone.localdate(at)
+
+
+def add_contribution(deltas: dict, at: datetime.datetime | None, values: dict[str, int], sign: int = 1) -> None:
+    """Accumulate one row's metrics into ``deltas`` keyed by (metric, period, bucket)."""
+    at = at or timezone.now()
+    hour, day = hour_bucket(at), day_bucket(at)
+    for metric, value in values.items():
+        value = int(value or 0) * sign
+        if not value:
+            continue
+        deltas[(metric, MetricRollup.HOUR, hour)] += value
+        deltas[(metric, MetricRollup.DAY, day)] += value
+        deltas[(metric, MetricRollup.TOTAL, EPOCH)] += value
+
+
+# ── Writes ────────────────────────────────────────────────────────────────────
+
+def _upsert_add(model, key_columns: tuple[str, ...], value_column: str, rows: list) -> None:
+    """INSERT rows of (*keys, value); on conflict add value to the existing row."""
+    table = connection.ops.quote_name(model._meta.db_table)
+    columns = ", ".join((*key_columns, value_column))
+    placeholders = "(" + ", ".join(["%s"] * (len(key_columns) + 1)) + ")"
+    with connection.cursor() as cursor:
+        for start in range(0, len(rows), _UPSERT_CHUNK):
+            chunk = rows[start:start + _UPSERT_CHUNK]
+            cursor.execute(
+                f"INSERT INTO {table} ({columns}) VALUES "
+                + ", ".join([placeholders] * len(chunk))
+                + f" ON CONFLICT ({', '.join(key_columns)}) DO UPDATE"
+                + f" SET {value_column} = {table}.{value_column} + EXCLUDED.{value_column}",
+                [param for row in chunk for param in row],
+            )
+
+
+def apply_deltas(deltas: dict) -> None:
+    """Add ``deltas`` to their MetricRollup counters with one upsert per chunk."""
+    adapt = connection.ops.adapt_datetimefield_value
+    rows = [
+        (metric, period, adapt(bucket), value)
+        for (metric, period, bucket), value in deltas.items() if value
+    ]
+    if rows:
+        _upsert_add(MetricRollup, ("metric", "period", "bucket"), "value", rows)
+
+
+def apply_activity(activity: dict) -> None:
+    """
+    Apply per-(user, day) count changes to UserActivityDay.
+
+    Decrements are plain UPDATEs so a cascade-deleted user's rows are never
+    re-created by the deletes of their content.
+    """
+    adapt = connection.ops.adapt_datefield_value
+    rows = [(user_id, adapt(day), n) for (user_id, day), n in activity.items() if n > 0]
+    if rows:
+        _upsert_add(UserActivityDay, ("user_id", "day"), "count", rows)
+    for (user_id, day), n in activity.items():
+        if n < 0:
+            UserActivityDay.objects.filter(user_id=user_id, day=day).update(count=F("count") + n)
+
+
+def _touches_closed_days(deltas: dict) -> bool:
+    today = day_bucket(timezone.now())
+    return any(period == MetricRollup.DAY and bucket < today for (_, period, bucket) in deltas)
+
+
+def _apply_safely(deltas: dict, activity: dict) -> None:
+    try:
+        apply_deltas(deltas)
+        if _touches_closed_days(deltas):
+            invalidate_daily_series()
+    except Exception as exc:
+        logger.warning("Metric rollup update failed (%d keys): %s", len(deltas), exc)
+    try:
+        apply_activity(activity)
+    except Exception as exc:
+        logger.warning("Activity day update failed (%d keys): %s", len(activity), exc)
+
+
+def schedule(deltas: dict, activity: dict | None = None) -> None:
+    """Apply changes once the current transaction commits (immediately in autocommit)."""
+    deltas = {key: value for key, value in deltas.items() if value}
+    activity = {key: value for key, value in (activity or {}).items() if value}
+    if deltas or activity:
+        transaction.on_commit(lambda: _apply_safely(deltas, activity))
+
+
+def _snapshot(spec: RollupSpec, instance):
+    return spec.contribute(instance), activity_key(spec, instance)
+
+
+def _add_snapshot(deltas: dict, activity: dict, snapshot, sign: int) -> None:
+    contribution, key = snapshot
+    add_contribution(deltas, *contribution, sign=sign)
+    if key is not None:
+        activity[key] += sign
+
+
+def record_created(instances: Iterable) -> None:
+    """Count rows inserted without model signals, e.g. via ``bulk_create``."""
+    deltas, activity = defaultdict(int), defaultdict(int)
+    for instance in instances:
+        spec = _SPECS.get(type(instance))
+        if spec is not None:
+            _add_snapshot(deltas, activity, _snapshot(spec, instance), 1)
+    schedule(deltas, activity)
+
+
+# ── Rebuild ───────────────────────────────────────────────────────────────────
+
+def compute_from_sources(*, metrics: bool = True, activity: bool = True, progress=None) -> tuple[dict, dict]:
+    """
+    (deltas, activity) recomputed from every tracked table.
+
+    ``progress(label, rows)`` is called once per model.
+    """
+    deltas, days = defaultdict(int), defaultdict(int)
+    for model, spec in _SPECS.items():
+        if not activity and spec.activity is None:
+            continue
+        rows = 0
+        for instance in model._default_manager.only(*spec.fields).iterator(chunk_size=2000):
+            if metrics:
+                add_contribution(deltas, *spec.contribute(instance))
+            key = activity_key(spec, instance) if activity else None
+            if key is not None:
+                days[key] += 1
+            rows += 1
+        if progress is not None:
+            progress(model._meta.label, rows)
+    return deltas, days
+
+
+def _lock_for_rebuild(models: list) -> None:
+    """
+    Block counter upserts until the rebuild commits (PostgreSQL only).
+
+    Signal upserts run after their own transaction commits. While the lock is
+    held they wait instead of landing between the recount and the replace,
+    where they would be lost. Under REPEATABLE READ the recount reads one
+    snapshot taken after the lock. Rows committed later are missing from it,
+    and their waiting upserts add them once the lock is released.
+    """
+    if connection.vendor != "postgresql":
+        return
+    tables = ", ".join(connection.ops.quote_name(m._meta.db_table) for m in models)
+    with connection.cursor() as cursor:
+        cursor.execute(f"LOCK TABLE {tables} IN EXCLUSIVE MODE")
+
+
+def rebuild(*, metrics: bool = True, activity: bool = True, progress=None) -> tuple[dict, dict]:
+    """
+    Replace the rollup counters and/or activity days with a recount of the source tables.
+
+    The recount and the replace run in one transaction under ``_lock_for_rebuild``.
+    A row committed in the moment between its own commit and its counter
+    upsert is still counted twice. That window is milliseconds wide, and a
+    second rebuild corrects it.
+    """
+    targets = [m for m, wanted in ((MetricRollup, metrics), (UserActivityDay, activity)) if wanted]
+    outermost = not connection.in_atomic_block
+    with transaction.atomic():
+        if outermost and connection.vendor == "postgresql":
+            with connection.cursor() as cursor:
+                cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ")
+        _lock_for_rebuild(targets)
+        deltas, days = compute_from_sources(metrics=metrics, activity=activity, progress=progress)
+        if metrics:
+            MetricRollup.objects.all().delete()
+            apply_deltas(deltas)
+        if activity:
+            UserActivityDay.objects.all().delete()
+            apply_activity(days)
+    if metrics:
+        invalidate_daily_series()
+    return deltas, days
+
+
+# ── Signal wiring ─────────────────────────────────────────────────────────────
+
+def _pre_save(sender, instance, raw=False, update_fields=None, **kwargs):
+    spec = _SPECS[sender]
+    if raw or instance._state.adding or instance.pk is None:
+        instance._rollup_previous = None
+        return
+    if update_fields is not None and not set(update_fields) & set(spec.fields):
+        instance._rollup_previous = _SKIP
+        return
+    previous = sender._default_manager.filter(pk=instance.pk).only(*spec.fields).first()
+    instance._rollup_previous = _snapshot(spec, previous) if previous is not None else None
+
+
+def _post_save(sender, instance, created=False, raw=False, **kwargs):
+    previous = instance.__dict__.pop("_rollup_previous", None)
+    if raw or previous is _SKIP:
+        return
+    deltas, activity = defaultdict(int), defaultdict(int)
+    if previous is not None and not created:
+        _add_snapshot(deltas, activity, previous, -1)
+    _add_snapshot(deltas, activity, _snapshot(_SPECS[sender], instance), 1)
+    schedule(deltas, activity)
+
+
+def _post_delete(sender, instance, **kwargs):
+    deltas, activity = defaultdict(int), defaultdict(int)
+    _add_snapshot(deltas, activity, _snapshot(_SPECS[sender], instance), -1)
+    schedule(deltas, activity)
+
+
+def register(model, *, fields: tuple[str, ...], contribute, activity=None, signals: bool = True) -> None:
+    """
+    Track ``model`` in the rollups.
+
+    ``activity`` maps a row to ``(user_id, timestamp)`` if it counts as a
+    study day for that user. ``signals=False`` is for append-only logs that
+    are only written through ``record_created`` and purged in bulk; their
+    counters outlive the rows.
+    """
+    _SPECS[model] = RollupSpec(fields=tuple(fields), contribute=contribute, activity=activity)
+    if signals:
+        uid = f"metric_rollup_{model._meta.label_lower}"
+        pre_save.connect(_pre_save, sender=model, dispatch_uid=uid)
+        post_save.connect(_post_save, sender=model, dispatch_uid=uid)
+        post_delete.connect(_post_delete, sender=model, dispatch_uid=uid)
+
+
+def registered_specs() -> dict[type, RollupSpec]:
+    return dict(_SPECS)
+
+
+# ── Reads ─────────────────────────────────────────────────────────────────────
+
+def read_totals(metrics: Iterable[str]) -> dict[str, int]:
+    """All-time value of each metric (0 if never recorded)."""
+    metrics = list(metrics)
+    values = dict(
+        MetricRollup.objects
+        .filter(period=MetricRollup.TOTAL, bucket=EPOCH, metric__in=metrics)
+        .values_list("metric", "value")
+    )
+    return {metric: int(values.get(metric) or 0) for metric in metrics}
+
+
+def read_recent(metrics: Iterable[str], *, hours: int, now: datetime.datetime | None = None) -> dict[str, int]:
+    """Sum of the last ``hours`` hourly buckets, including the current one."""
+    metrics = list(metrics)
+    since = hour_bucket(now or timezone.now()) - datetime.timedelta(hours=max(1, hours) - 1)
+    values = dict(
+        MetricRollup.objects
+        .filter(period=MetricRollup.HOUR, bucket__gte=since, metric__in=metrics)
+        .values("metric")
+        .annotate(total=Sum("value"))
+        .values_list("metric", "total")
+    )
+    return {metric: int(values.get(metric) or 0) for metric in metrics}
+
+
+def _window(since: datetime.datetime) -> Q:
+    """
+    Daily buckets for whole days since ``since`` plus hourly ones for the partial first day.
+
+    Past the hourly retention horizon the first day is read whole from its daily bucket.
+    """
+    start_hour = hour_bucket(since)
+    first_full_day = day_bucket(start_hour)
+    horizon = hour_bucket(timezone.now()) - datetime.timedelta(hours=hourly_retention_hours())
+    if first_full_day < start_hour and start_hour >= horizon:
+        first_full_day += datetime.timedelta(days=1)
+    return (
+        Q(period=MetricRollup.HOUR, bucket__gte=start_hour, bucket__lt=first_full_day)
+        | Q(period=MetricRollup.DAY, bucket__gte=first_full_day)
+    )
+
+
+def read_since(metrics: Iterable[str], since: datetime.datetime | None) -> dict[str, int]:
+    """
+    Sum of each metric from ``since`` (rounded down to the hour) until now.
+
+    Whole days come from daily buckets and the partial first day from hourly
+    ones, so a year-long window reads ~365 rows per metric rather than ~8760.
+    """
+    metrics = list(metrics)
+    if since is None:
+        return read_totals(metrics)
+    buckets = (
+        MetricRollup.objects
+        .filter(metric__in=metrics)
+        .filter(_window(since))
+        .values("metric")
+        .annotate(total=Sum("value"))
+        .values_list("metric", "total")
+    )
+    values = dict(buckets)
+    return {metric: int(values.get(metric) or 0) for metric in metrics}
+
+
+def read_prefix_since(prefix: str, since: datetime.datetime | None) -> dict[str, int]:
+    """Like ``read_since`` for every metric named ``prefix*`` (e.g. histogram bins)."""
+    if since is None:
+        window = Q(period=MetricRollup.TOTAL, bucket=EPOCH)
+    else:
+        window = _window(since)
+    rows = (
+        MetricRollup.objects
+        .filter(window, metric__startswith=prefix)
+        .values("metric")
+        .annotate(total=Sum("value"))
+        .values_list("metric", "total")
+    )
+    return {metric: int(total) for metric, total in rows if total}
+
+
+def read_active_dates(user_id: int) -> list[datetime.date]:
+    """Every active day for one user, oldest first; just the dates, for streaks."""
+    return list(
+        UserActivityDay.objects
+        .filter(user_id=user_id, count__gt=0)
+        .order_by("day")
+        .values_list("day", flat=True)
+    )
+
+
+def read_activity_days(user_id: int, since: datetime.date) -> list[tuple[datetime.date, int]]:
+    """Active (day, count) pairs for one user from ``since`` on, oldest first (one indexed range read)."""
+    return list(
+        UserActivityDay.objects
+        .filter(user_id=user_id, day__gte=since, count__gt=0)
+        .order_by("day")
+        .values_list("day", "count")
+    )
+
+
+# ── Daily series ──────────────────────────────────────────────────────────────
+
+def invalidate_daily_series() -> None:
+    """Drop cached closed-day arrays, e.g. after a delete or edit lands in a past day."""
+    try:
+        cache.incr(SERIES_VERSION_KEY)
+    except ValueError:
+        cache.set(SERIES_VERSION_KEY, 2, timeout=None)
+
+
+def _daily_values(metrics: list[str], first: datetime.datetime, last: datetime.datetime) -> dict:
+    rows = (
+        MetricRollup.objects
+        .filter(period=MetricRollup.DAY, metric__in=metrics, bucket__gte=first, bucket__lte=last)
+        .values_list("metric", "bucket", "value")
+    )
+    return {(metric, hour_bucket(bucket)): int(value) for metric, bucket, value in rows}
+
+
+def _closed_days(metrics: list[str], today: datetime.datetime) -> dict[str, list[int]]:
+    """The ``SERIES_MAX_DAYS - 1`` days before today per metric, from cache when possible."""
+    version = cache.get_or_set(SERIES_VERSION_KEY, 1, timeout=None)
+    key = f"dashboard:rollup_series:v{version}:{today.date().isoformat()}:{','.join(sorted(metrics))}"
+    cached = cache.get(key)
+    if cached is not None:
+        return cached
+    closed = SERIES_MAX_DAYS - 1
+    first = today - datetime.timedelta(days=closed)
+    values = _daily_values(metrics, first, today - datetime.timedelta(days=1))
+    series = {
+        metric: [values.get((metric, first + datetime.timedelta(days=i)), 0) for i in range(closed)]
+        for metric in metrics
+    }
+    cache.set(key, series, timeout=getattr(settings, "ROLLUP_SERIES_CACHE_TTL", 86400))
+    return series
+
+
+def read_daily_series(
+    metrics: Iterable[str], days: int, *, now: datetime.datetime | None = None,
+) -> tuple[list[datetime.date], dict[str, list[int]]]:
+    """
+    Per-day values of each metric for the last ``days`` days, ending today.
+
+    Closed days never change except through deletes/edits (which bump the
+    cache version), so they are read once per day; only today's bucket is
+    queried per call. Cost is independent of the size of the source tables.
+    """
+    metrics = list(metrics)
+    days = max(1, min(days, SERIES_MAX_DAYS))
+    today = day_bucket(now or timezone.now())
+    closed = _closed_days(metrics, today)
+    live = _daily_values(metrics, today, today)
+    labels = [(today - datetime.timedelta(days=days - 1 - i)).date() for i in range(days)]
+    series = {
+        metric: closed[metric][len(closed[metric]) - (days - 1):] + [live.get((metric, today), 0)]
+        for metric in metrics
+    }
+    return labels, series
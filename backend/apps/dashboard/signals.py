@@ -0,0 +1,156 @@
+"""
+Registers the models that feed the admin metric rollups and activity days
+(see rollups.py) and invalidates cached student dashboard payloads
+(see stats_cache.py).
+"""
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from apps.accounts.models import User
+from apps.chatbot.models import ChatMessage, ChatSession
+from apps.clash.models import ClashRoom
+from apps.flashcards.models import Deck, Flashcard
+from apps.materials.models import Material
+from apps.quiz.models import QuizSession, TopicPerformance
+
+from . import rollups, stats_cache
+from .latency import histogram_metric
+from .models import AIResponseLatency, AnonymousUsageEvent, QuizExperienceRating
+
+
+def _user(u):
+    return u.date_joined, {"users": 1, "users_verified": int(bool(u.is_email_verified))}
+
+
+def _quiz(q):
+    return q.created_at, {
+        "quizzes": 1,
+        "quiz_questions": q.total_questions or 0,
+        "quiz_score_centi": int(round(float(q.score_percentage or 0) * 100)),
+        "quiz_chars": q.char_count,
+    }
+
+
+def _chat_session(s):
+    return s.created_at, {"chat_sessions": int(s.user_id is not None)}
+
+
+def _chat_message(m):
+    return m.created_at, {"chat_messages": 1, "chat_chars": m.char_count}
+
+
+def _deck(d):
+    return d.created_at, {"decks": 1}
+
+
+def _flashcard(c):
+    return c.created_at, {"flashcards": 1, "flashcard_chars": c.char_count}
+
+
+def _material(m):
+    return m.created_at, {"materials": 1}
+
+
+def _clash(r):
+    if r.status != ClashRoom.FINISHED:
+        return r.finished_at or r.created_at, {}
+    return r.finished_at or r.created_at, {"clashes": 1, "clash_chars": r.char_count}
+
+
+def _created_by_user(row):
+    return row.user_id, row.created_at
+
+
+def _rating(r):
+    return r.created_at, {"ratings": 1, "rating_sum": r.rating or 0}
+
+
+def _anonymous_event(e):
+    path = (e.path or "").lower()
+    return e.created_at, {
+        "anonymous_hits": 1,
+        "anonymous_quiz": int("/quiz/" in path),
+        "anonymous_chat": int("/chat/" in path or "/chatbot/" in path),
+        "anonymous_flashcards": int("/flashcards/" in path),
+        "anonymous_chars": (e.request_chars or 0) + (e.response_chars or 0),
+    }
+
+
+def _latency(row):
+    return row.created_at, {
+        f"ai_latency_count.{row.feature}": 1,
+        f"ai_latency_ms.{row.feature}": row.duration_ms or 0,
+        histogram_metric(row.feature, row.duration_ms or 0): 1,
+    }
+
+
+rollups.register(User, fields=("date_joined", "is_email_verified"), contribute=_user)
+rollups.register(
+    QuizSession,
+    fields=("created_at", "user", "total_questions", "score_percentage", "char_count"),
+    contribute=_quiz,
+    activity=_created_by_user,
+)
+rollups.register(ChatSession, fields=("created_at", "user"), contribute=_chat_session, activity=_created_by_user)
+rollups.register(ChatMessage, fields=("created_at", "char_count"), contribute=_chat_message)
+rollups.register(Deck, fields=("created_at", "user"), contribute=_deck, activity=_created_by_user)
+rollups.register(Flashcard, fields=("created_at", "char_count"), contribute=_flashcard)
+rollups.register(
+    Material,
+    fields=("created_at", "uploaded_by"),
+    contribute=_material,
+    activity=lambda m: (m.uploaded_by_id, m.created_at),
+)
+rollups.register(ClashRoom, fields=("created_at", "finished_at", "status", "char_count"), contribute=_clash)
+rollups.register(QuizExperienceRating, fields=("created_at", "rating"), contribute=_rating)
+rollups.register(
+    AnonymousUsageEvent,
+    fields=("created_at", "path", "request_chars", "response_chars"),
+    contribute=_anonymous_event,
+    signals=False,
+)
+rollups.register(AIResponseLatency, fields=("created_at", "feature", "duration_ms"), contribute=_latency, signals=False)
+
+
+@receiver(pre_delete, sender=settings.AUTH_USER_MODEL)
+def uncount_orphaned_chat_sessions(sender, instance, **kwargs):
+    """ChatSession.user is SET_NULL via a bulk UPDATE, so no save signal fires for those rows."""
+    deltas = defaultdict(int)
+    for created_at in ChatSession.objects.filter(user=instance).values_list("created_at", flat=True).iterator():
+        rollups.add_contribution(deltas, created_at, {"chat_sessions": 1}, sign=-1)
+    rollups.schedule(deltas)
+
+
+# ── Dashboard cache invalidation ──────────────────────────────────────────────
+
+# Model -> attribute holding the owning user's id. Materials only feed the study streak.
+_DASHBOARD_OWNERS = {
+    QuizSession: "user_id",
+    Deck: "user_id",
+    ChatSession: "user_id",
+    TopicPerformance: "user_id",
+    Material: "uploaded_by_id",
+}
+
+
+def _invalidate_user_dashboard(sender, instance, **kwargs):
+    user_id = getattr(instance, _DASHBOARD_OWNERS[sender])
+    if user_id:
+        transaction.on_commit(lambda: stats_cache.invalidate_user_stats(user_id))
+
+
+def _invalidate_global_dashboard(sender, instance, **kwargs):
+    transaction.on_commit(stats_cache.invalidate_global_stats)
+
+
+for _model in _DASHBOARD_OWNERS:
+    _uid = f"dashboard_stats_cache_{_model._meta.label_lower}"
+    post_save.connect(_invalidate_user_dashboard, sender=_model, dispatch_uid=_uid)
+    post_delete.connect(_invalidate_user_dashboard, sender=_model, dispatch_uid=_uid)
+
+post_save.connect(_invalidate_global_dashboard, sender=QuizExperienceRating, dispatch_uid="dashboard_stats_cache_rating")
+post_delete.connect(_invalidate_global_dashboard, sender=QuizExperienceRating, dispatch_uid="dashboard_stats_cache_rating")
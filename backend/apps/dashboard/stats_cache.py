@@ -0,0 +1,83 @@
+"""
+Read-through cache for the student dashboard payload.
+
+``DashboardStatsView`` caches one entry per user plus one shared entry for the
+global rating stats. Keys carry a version counter. Writes that change a
+payload bump the counter (see ``signals.py``) instead of deleting the entry, so
+a request that is still building from pre-write data can only fill an
+orphaned key. The per-user key also carries today's date, because the study
+streak can change at midnight without any write.
+
+A short ``cache.add`` lock lets a single request rebuild a cold key. Others
+wait briefly for that result and only build it themselves if the lock holder
+is too slow.
+"""
+import logging
+import time
+from typing import Callable
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+_LOCK_TIMEOUT = 10          # seconds; bounds how long a crashed builder blocks others
+_WAIT_STEP = 0.05
+_WAIT_STEPS = 10            # up to ~0.5s waiting for a concurrent build
+
+
+def _ttl() -> int:
+    return getattr(settings, "DASHBOARD_STATS_CACHE_TTL", 3600)
+
+
+def _version(scope: str) -> int:
+    return cache.get_or_set(f"dashboard:stats_version:{scope}", 1, timeout=None)
+
+
+def _bump(scope: str) -> None:
+    key = f"dashboard:stats_version:{scope}"
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 2, timeout=None)
+
+
+def user_stats_key(user_id: int) -> str:
+    return f"dashboard:stats:user:{user_id}:v{_version(f'user:{user_id}')}:{timezone.localdate().isoformat()}"
+
+
+def global_stats_key() -> str:
+    return f"dashboard:stats:global:v{_version('global')}"
+
+
+def invalidate_user_stats(user_id: int) -> None:
+    _bump(f"user:{user_id}")
+
+
+def invalidate_global_stats() -> None:
+    _bump("global")
+
+
+def get_or_build(key: str, build: Callable[[], dict]) -> dict:
+    """Return the cached value for ``key``, building it under a lock on a miss."""
+    value = cache.get(key)
+    if value is not None:
+        return value
+
+    lock_key = f"{key}:lock"
+    if not cache.add(lock_key, 1, timeout=_LOCK_TIMEOUT):
+        for _ in range(_WAIT_STEPS):
+            time.sleep(_WAIT_STEP)
+            value = cache.get(key)
+            if value is not None:
+                return value
+        logger.debug("Dashboard cache build for %s still running; building locally", key)
+        return build()
+
+    try:
+        value = build()
+        cache.set(key, value, timeout=_ttl())
+        return value
+    finally:
+        cache.delete(lock_key)
@@ -0,0 +1,146 @@
+"""
+Micro-batched writer for analytics rows (AIResponseLatency, AnonymousUsageEvent).
+
+Request paths only append an unsaved model instance to a bounded in-process
+queue. A daemon thread flushes the queue with one ``bulk_create`` per model
+every ``TELEMETRY_BATCH_SIZE`` rows or ``TELEMETRY_FLUSH_INTERVAL_MS``,
+whichever comes first, so analytics cost one DB round trip per batch instead
+of one per request.
+
+When the queue is full new rows are dropped and counted rather than blocking
+the request. ``created_at`` is stamped at flush time (auto_now_add), so it can
+lag the real event by up to one flush interval.
+"""
+import atexit
+import logging
+import threading
+from collections import deque
+
+from django.conf import settings
+from django.db import close_old_connections
+
+from .rollups import record_created
+
+logger = logging.getLogger(__name__)
+
+
+class TelemetryWriter:
+    """Bounded, thread-safe buffer flushed by a background thread."""
+
+    def __init__(self, *, batch_size: int, flush_interval_ms: int, max_queue: int):
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = max(10, flush_interval_ms) / 1000.0
+        self.max_queue = max(self.batch_size, max_queue)
+
+        self._queue: deque = deque()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread: threading.Thread | None = None
+
+        self.enqueued = 0
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+        self.flushes = 0
+
+    def enqueue(self, instance) -> bool:
+        """Queue an unsaved model instance. Returns False if it was dropped."""
+        with self._lock:
+            if len(self._queue) >= self.max_queue:
+                self.dropped += 1
+                if self.dropped == 1 or self.dropped % 1000 == 0:
+                    logger.warning("Telemetry queue full; dropped=%d", self.dropped)
+                return False
+            self._queue.append(instance)
+            self.enqueued += 1
+            pending = len(self._queue)
+        self._ensure_thread()
+        if pending >= self.batch_size:
+            self._wakeup.set()
+        return True
+
+    def _ensure_thread(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name="telemetry-writer", daemon=True)
+            self._thread.start()
+
+    def _take_batch(self) -> list:
+        with self._lock:
+            count = min(self.batch_size, len(self._queue))
+            return [self._queue.popleft() for _ in range(count)]
+
+    def _run(self) -> None:
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Telemetry flush loop error")
+
+    def flush(self) -> int:
+        """Write everything currently queued. Safe to call from any thread."""
+        total = 0
+        close_old_connections()
+        while True:
+            batch = self._take_batch()
+            if not batch:
+                break
+            by_model: dict = {}
+            for instance in batch:
+                by_model.setdefault(type(instance), []).append(instance)
+            for model, rows in by_model.items():
+                try:
+                    model.objects.bulk_create(rows, batch_size=self.batch_size)
+                    record_created(rows)
+                    self.written += len(rows)
+                    total += len(rows)
+                except Exception as exc:
+                    self.failed += len(rows)
+                    logger.warning("Telemetry bulk_create failed model=%s rows=%d error=%s",
+                                   model.__name__, len(rows), exc)
+            self.flushes += 1
+        return total
+
+    def stats(self) -> dict:
+        with self._lock:
+            queued = len(self._queue)
+        return {
+            "queued": queued,
+            "max_queue": self.max_queue,
+            "batch_size": self.batch_size,
+            "flush_interval_ms": int(self.flush_interval * 1000),
+            "enqueued": self.enqueued,
+            "written": self.written,
+            "dropped": self.dropped,
+            "failed": self.failed,
+            "flushes": self.flushes,
+        }
+
+
+telemetry_writer = TelemetryWriter(
+    batch_size=int(getattr(settings, "TELEMETRY_BATCH_SIZE", 100)),
+    flush_interval_ms=int(getattr(settings, "TELEMETRY_FLUSH_INTERVAL_MS", 1000)),
+    max_queue=int(getattr(settings, "TELEMETRY_MAX_QUEUE", 10000)),
+)
+
+
+@atexit.register
+def _flush_on_exit():
+    try:
+        telemetry_writer.flush()
+    except Exception:
+        pass
+
+
+def record_ai_latency(feature: str, duration_ms: int) -> None:
+    """Queue one AIResponseLatency row. Never raises."""
+    try:
+        from .models import AIResponseLatency
+        telemetry_writer.enqueue(AIResponseLatency(feature=feature, duration_ms=max(0, int(duration_ms))))
+    except Exception:
+        pass
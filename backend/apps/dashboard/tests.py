@@ -0,0 +1,269 @@
+import datetime
+
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from apps.accounts.models import User
+from apps.chatbot.models import ChatMessage, ChatSession
+from apps.clash.models import ClashParticipant, ClashRoom
+from apps.flashcards.models import Deck, Flashcard
+from apps.quiz.models import QuizSession
+
+from . import rollups
+from .helpers import _streaks
+from .models import MetricRollup, UserActivityDay
+from .retention import sweep_expired
+
+# Target user + 4 table aggregates + materials + rating + 4 recent-activity lists.
+ADMIN_USER_DETAIL_QUERIES = 11
+
+
+class AdminUserDetailQueryCountTests(TestCase):
+    """The admin per-user drill-down must not issue queries per row of user activity."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(
+            email="admin@example.com", username="admin", password="pw-123456", is_admin=True,
+        )
+        cls.light = User.objects.create_user(email="light@example.com", username="light", password="pw-123456")
+        cls.heavy = User.objects.create_user(email="heavy@example.com", username="heavy", password="pw-123456")
+        cls.other = User.objects.create_user(email="other@example.com", username="other", password="pw-123456")
+        cls._seed_activity(cls.light, n=1)
+        cls._seed_activity(cls.heavy, n=12)
+
+    @classmethod
+    def _seed_activity(cls, user, n):
+        for i in range(n):
+            QuizSession.objects.create(user=user, subject=f"Topic {i}", total_questions=5, score_percentage=60)
+            deck = Deck.objects.create(user=user, title=f"Deck {i}", subject="Biology")
+            Flashcard.objects.bulk_create(
+                [Flashcard(deck=deck, question="Q?", answer="A.") for _ in range(3)]
+            )
+            session = ChatSession.objects.create(user=user, session_id=f"chat-{user.pk}-{i}")
+            for j in range(3):
+                ChatMessage.objects.create(session=session, sender="user", content=f"message {j}")
+            room = ClashRoom.objects.create(
+                host=user, subject=f"Clash {i}", num_questions=1, questions=[{"q": "?"}],
+                status=ClashRoom.FINISHED, finished_at=timezone.now(),
+            )
+            ClashParticipant.objects.create(room=room, user=user, display_name="me", is_host=True, rank=1)
+            ClashParticipant.objects.create(room=room, user=cls.other, display_name="them", rank=2)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.admin)
+
+    def _get(self, user):
+        return self.client.get(f"/api/dashboard/admin/users/{user.pk}/", secure=True)
+
+    def test_query_count_is_fixed(self):
+        for user in (self.light, self.heavy):
+            with self.subTest(user=user.username), self.assertNumQueries(ADMIN_USER_DETAIL_QUERIES):
+                response = self._get(user)
+            self.assertEqual(response.status_code, 200)
+
+    def test_summary_counts(self):
+        data = self._get(self.heavy).json()
+        summary = data["summary"]
+        self.assertEqual(summary["total_quizzes"], 12)
+        self.assertEqual(summary["total_flashcard_decks"], 12)
+        self.assertEqual(summary["total_flashcards"], 36)
+        self.assertEqual(summary["total_chat_sessions"], 12)
+        self.assertEqual(summary["total_chat_messages"], 36)
+        self.assertEqual(summary["total_clashes"], 12)
+        self.assertEqual(summary["clashes_as_host"], 12)
+        self.assertEqual(summary["clash_wins"], 12)
+        self.assertEqual(len(data["recent_activity"]), 20)
+        clash_items = [item for item in data["recent_activity"] if item["type"] == "clash"]
+        self.assertTrue(clash_items)
+        self.assertIn("of 2", clash_items[0]["text"])
+        chat_items = [item for item in data["recent_activity"] if item["type"] == "chat"]
+        self.assertIn("3 messages", chat_items[0]["text"])
+
+
+class MetricRollupTests(TestCase):
+    """Signal-driven counters must follow creates, edits, deletes and bulk inserts exactly."""
+
+    def setUp(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user = User.objects.create_user(email="r@example.com", username="r", password="pw-123456")
+
+    def _quiz_totals(self):
+        return rollups.read_totals(["quizzes", "quiz_questions", "quiz_score_centi"])
+
+    def _all_counters(self):
+        return {
+            (metric, period, bucket): value
+            for metric, period, bucket, value in MetricRollup.objects.values_list("metric", "period", "bucket", "value")
+            if value
+        }
+
+    def test_create_edit_and_delete_apply_their_difference(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            quiz = QuizSession.objects.create(user=self.user, subject="Bio", total_questions=5, score_percentage=60)
+        self.assertEqual(self._quiz_totals(), {"quizzes": 1, "quiz_questions": 5, "quiz_score_centi": 6000})
+        self.assertEqual(rollups.read_recent(["quizzes"], hours=1), {"quizzes": 1})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            quiz.score_percentage = 80
+            quiz.save()
+        self.assertEqual(self._quiz_totals(), {"quizzes": 1, "quiz_questions": 5, "quiz_score_centi": 8000})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            quiz.delete()
+        self.assertEqual(self._quiz_totals(), {"quizzes": 0, "quiz_questions": 0, "quiz_score_centi": 0})
+
+    def test_saves_of_untracked_fields_skip_the_diff(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            deck = Deck.objects.create(user=self.user, title="Cells", subject="Biology")
+        deck.title = "Organelles"
+        # Just the UPDATE: the previous row is not re-read for a field no counter uses.
+        with self.captureOnCommitCallbacks(execute=True), self.assertNumQueries(1):
+            deck.save(update_fields=["title"])
+        self.assertEqual(rollups.read_totals(["decks"]), {"decks": 1})
+
+    def test_clash_counts_only_once_finished(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            room = ClashRoom.objects.create(host=self.user, subject="Bio", num_questions=1, questions=[{"q": "?"}])
+        self.assertEqual(rollups.read_totals(["clashes"]), {"clashes": 0})
+        with self.captureOnCommitCallbacks(execute=True):
+            room.status = ClashRoom.FINISHED
+            room.finished_at = timezone.now()
+            room.save(update_fields=["status", "finished_at"])
+        self.assertEqual(rollups.read_totals(["clashes"]), {"clashes": 1})
+
+    def test_record_created_counts_bulk_inserts(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            users = User.objects.bulk_create([
+                User(email=f"bulk{i}@example.com", username=f"bulk{i}", is_email_verified=bool(i))
+                for i in range(3)
+            ])
+            rollups.record_created(users)
+        self.assertEqual(rollups.read_totals(["users", "users_verified"]), {"users": 4, "users_verified": 2})
+
+    def test_rebuild_matches_the_incremental_counters(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            QuizSession.objects.create(user=self.user, subject="Bio", total_questions=5, score_percentage=60)
+            session = ChatSession.objects.create(user=self.user, session_id="chat-1")
+            ChatMessage.objects.create(session=session, sender="user", content="hello")
+            ChatSession.objects.create(user=None, session_id="chat-anon")
+        incremental = self._all_counters()
+        MetricRollup.objects.update(value=0)
+        rollups.rebuild()
+        self.assertEqual(self._all_counters(), incremental)
+
+    def test_sweeper_prunes_old_hourly_buckets_only(self):
+        old = rollups.hour_bucket(timezone.now()) - datetime.timedelta(hours=rollups.hourly_retention_hours() + 1)
+        rollups.apply_deltas({
+            ("quizzes", MetricRollup.HOUR, old): 2,
+            ("quizzes", MetricRollup.DAY, rollups.day_bucket(old)): 2,
+        })
+        with self.captureOnCommitCallbacks(execute=True):
+            QuizSession.objects.create(user=self.user, subject="Bio")
+
+        self.assertEqual(sweep_expired(MetricRollup, rollups.hourly_retention_hours(), pause_ms=0), 1)
+        self.assertFalse(MetricRollup.objects.filter(period=MetricRollup.HOUR, bucket=old).exists())
+        self.assertEqual(rollups.read_recent(["quizzes"], hours=1), {"quizzes": 1})
+        # A window starting in the pruned range reads its first day whole.
+        self.assertEqual(rollups.read_since(["quizzes"], old + datetime.timedelta(minutes=30)), {"quizzes": 3})
+
+
+class StudyStreakTests(TestCase):
+    """Streaks come from the active dates alone; the heatmap only reads its window."""
+
+    TODAY = datetime.date(2026, 3, 10)
+
+    def _days(self, *offsets):
+        return [self.TODAY - datetime.timedelta(days=n) for n in sorted(offsets, reverse=True)]
+
+    def test_streak_math(self):
+        cases = [
+            ("no activity", (), (0, 0)),
+            ("today only", (0,), (1, 1)),
+            ("run ending today", (2, 1, 0), (3, 3)),
+            ("run ended yesterday", (2, 1), (0, 2)),
+            ("gap splits runs", (6, 5, 4, 3, 1, 0), (2, 4)),
+            ("longer run in the past", (9, 8, 7, 6, 0), (1, 4)),
+        ]
+        for name, offsets, expected in cases:
+            with self.subTest(name):
+                self.assertEqual(_streaks(self._days(*offsets), self.TODAY), expected)
+
+    def test_streak_spans_a_month_boundary(self):
+        days = [datetime.date(2026, 2, 27), datetime.date(2026, 2, 28), datetime.date(2026, 3, 1)]
+        self.assertEqual(_streaks(days, datetime.date(2026, 3, 1)), (3, 3))
+
+    def test_calendar_heatmap_is_bounded_but_streaks_use_all_history(self):
+        user = User.objects.create_user(email="s@example.com", username="streaker", password="pw-123456")
+        today = timezone.localdate()
+        old_run = [today - datetime.timedelta(days=n) for n in (40, 39, 38, 37, 36)]
+        recent = [today - datetime.timedelta(days=n) for n in (1, 0)]
+        UserActivityDay.objects.bulk_create(
+            [UserActivityDay(user=user, day=day, count=2) for day in old_run + recent]
+            + [UserActivityDay(user=user, day=today - datetime.timedelta(days=3), count=0)]
+        )
+        client = APIClient()
+        client.force_authenticate(user=user)
+
+        data = client.get("/api/dashboard/activity-calendar/?days=7", secure=True).json()
+
+        self.assertEqual((data["current_streak"], data["longest_streak"]), (2, 5))
+        self.assertEqual(data["heatmap"], {day.isoformat(): 2 for day in recent})
+        self.assertEqual(data["active_days"], 2)
+        self.assertEqual(rollups.read_activity_days(user.id, today - datetime.timedelta(days=6)), [
+            (day, 2) for day in recent
+        ])
+
+
+class AdminActivityFeedTests(TestCase):
+    """Cursor paging over the merged feed, and agreement between the list and its header counts."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(
+            email="admin@example.com", username="admin", password="pw-123456", is_admin=True,
+        )
+        cls.user = User.objects.create_user(email="u@example.com", username="feeder", password="pw-123456")
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.admin)
+
+    def _get(self, **params):
+        return self.client.get("/api/dashboard/admin/activity/", {"period": "all", **params}, secure=True).json()
+
+    def test_cursor_pages_through_equal_timestamps_without_gaps_or_repeats(self):
+        for i in range(4):
+            QuizSession.objects.create(user=self.user, subject=f"Topic {i}", total_questions=5, score_percentage=60)
+            Deck.objects.create(user=self.user, title=f"Deck {i}", subject="Biology")
+            ChatSession.objects.create(user=self.user, session_id=f"tie-{i}")
+        tie = timezone.now() - datetime.timedelta(hours=1)
+        for model in (QuizSession, Deck, ChatSession):
+            model.objects.update(created_at=tie)
+
+        expected = self._get(limit=200)["activities"]
+        self.assertEqual(len(expected), 12)
+
+        seen, cursor = [], None
+        for _ in range(12):
+            page = self._get(limit=5, **({"cursor": cursor} if cursor else {}))
+            seen.extend(item["id"] for item in page["activities"])
+            cursor = page["next_cursor"]
+            self.assertEqual(page["has_more"], cursor is not None)
+            if cursor is None:
+                break
+        self.assertEqual(seen, [item["id"] for item in expected])
+        self.assertEqual(len(set(seen)), 12)
+
+    def test_anonymous_chat_sessions_are_neither_listed_nor_counted(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            ChatSession.objects.create(user=self.user, session_id="mine")
+            ChatSession.objects.create(user=None, session_id="anon")
+
+        data = self._get()
+
+        self.assertEqual(data["counts"]["chat"], 1)
+        self.assertEqual([item["type"] for item in data["activities"]], ["chat"])
+        self.assertEqual(data["total"], len(data["activities"]))
@@ -4,6 +4,7 @@ from . import views
 urlpatterns = [
     # user
     path('dashboard/stats/',                      views.DashboardStatsView.as_view()),
+    path('dashboard/activity-calendar/',          views.ActivityCalendarView.as_view()),
     path('dashboard/contact/',                    views.ContactMessageView.as_view()),
     path('dashboard/newsletter/',                 views.NewsletterSubscribeView.as_view()),
     path('dashboard/quiz-feedback/',              views.QuizFeedbackView.as_view()),
@@ -13,6 +14,8 @@ urlpatterns = [
     path('dashboard/admin/usage-trends/',         views.AdminUsageTrendsView.as_view()),
     path('dashboard/admin/activity/',             views.AdminActivityFeedView.as_view()),
     path('dashboard/admin/anonymous-usage/',      views.AdminAnonymousUsageView.as_view()),
+    path('dashboard/admin/latency/',              views.AdminLatencyPercentilesView.as_view()),
+    path('dashboard/admin/upstream-metrics/',     views.AdminUpstreamMetricsView.as_view()),
     path('dashboard/admin/users/',                views.AdminUsersListView.as_view()),
     path('dashboard/admin/users/<int:user_id>/',  views.AdminUserDeleteView.as_view()),
     path('dashboard/admin/settings/',             views.AdminSystemSettingsView.as_view()),
@@ -2,8 +2,8 @@ import datetime
 import logging
 from django.utils import timezone
 from django.db import models as dm
-from django.db.models import Value, TextField
-from django.db.models.functions import TruncDate, Length, Cast, Coalesce
+from django.db.models import Value
+from django.db.models.functions import Coalesce
 from rest_framework.permissions import IsAuthenticated, AllowAny, BasePermission
 from rest_framework.throttling import SimpleRateThrottle
 from rest_framework.response import Response
@@ -11,13 +11,19 @@ from rest_framework.views import APIView
 from rest_framework import status
 
 from apps.quiz.models import QuizSession
-from apps.chatbot.models import ChatSession, ChatMessage
+from apps.chatbot.models import ChatSession
 from apps.accounts.serializers import user_to_dict
 from apps.accounts.services import EmailDeliveryError
 from .models import QuizExperienceRating, AnonymousUsageEvent, AIResponseLatency
 from .serializers import ContactFormSerializer, NewsletterSerializer, QuizFeedbackSerializer
 from .services import send_contact_emails, send_newsletter_emails
-from .helpers import _calculate_streak, _tokens_from_chars, _safe_char_sum, _collect_admin_activity, _cost_from_tokens
+from .rollups import read_daily_series, read_recent, read_totals
+from .stats_cache import get_or_build, global_stats_key, user_stats_key
+from .latency import latency_percentiles
+from .helpers import (
+    _activity_summary, _study_streaks, _tokens_from_chars, _collect_admin_activity, _admin_activity_counts, _cost_from_tokens,
+    _load_admin_user_detail,
+)
 
 
 logger = logging.getLogger(__name__)
@@ -44,7 +50,12 @@ class DashboardStatsView(APIView):
 
     def get(self, request):
         user = request.user
+        payload = get_or_build(user_stats_key(user.pk), lambda: self._user_stats(user))
+        feedback = get_or_build(global_stats_key(), self._global_stats)
+        return Response({**payload, **feedback})
 
+    @staticmethod
+    def _user_stats(user) -> dict:
         quiz_stats = QuizSession.objects.filter(user=user).aggregate(
             total=dm.Count('id'),
             avg=dm.Avg('score_percentage'),
@@ -57,11 +68,6 @@ class DashboardStatsView(APIView):
         except Exception:
             pass
 
-        feedback_stats = QuizExperienceRating.objects.aggregate(
-            total=dm.Count('id'),
-            average=dm.Avg('rating'),
-        )
-
         from apps.quiz.models import TopicPerformance
         weak_qs = TopicPerformance.objects.filter(
             user=user, total_questions__gte=3
@@ -72,15 +78,46 @@ class DashboardStatsView(APIView):
             'total_questions': tp.total_questions,
         } for tp in weak_qs]
 
-        return Response({
+        current_streak, longest_streak = _study_streaks(user)
+
+        return {
             'total_quizzes': quiz_stats['total'] or 0,
             'average_score': round(float(quiz_stats['avg'] or 0), 1),
             'total_flashcard_sets': total_flashcard_sets,
             'total_chats': ChatSession.objects.filter(user=user).count(),
-            'study_streak': _calculate_streak(user),
-            'total_ratings': int(feedback_stats.get('total') or 0),
-            'average_experience_rating': round(float(feedback_stats.get('average') or 0), 2),
+            'study_streak': current_streak,
+            'longest_study_streak': longest_streak,
             'weak_areas': weak_areas,
+        }
+
+    @staticmethod
+    def _global_stats() -> dict:
+        totals = read_totals(('ratings', 'rating_sum'))
+        ratings = totals['ratings']
+        return {
+            'total_ratings': ratings,
+            'average_experience_rating': round(totals['rating_sum'] / ratings, 2) if ratings else 0.0,
+        }
+
+
+class ActivityCalendarView(APIView):
+    """GET /api/dashboard/activity-calendar/?days=365"""
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        try:
+            days = int(request.query_params.get('days', 365))
+        except (TypeError, ValueError):
+            days = 365
+        days = max(7, min(days, 366))
+
+        summary = _activity_summary(request.user, days=days)
+        return Response({
+            'days': days,
+            'current_streak': summary['current_streak'],
+            'longest_streak': summary['longest_streak'],
+            'active_days': len(summary['heatmap']),
+            'heatmap': summary['heatmap'],
         })
 
 
@@ -88,34 +125,35 @@ class AdminDashboardStatsView(APIView):
     """GET /api/dashboard/admin/stats/"""
     permission_classes = [IsAuthenticated, IsAdminUser]
 
-    def get(self, request):
-        from apps.accounts.models import User
-        from apps.flashcards.models import Deck, Flashcard
-        from apps.materials.models import Material
-        from apps.clash.models import ClashRoom, ClashParticipant
+    TOTAL_METRICS = (
+        'users', 'users_verified', 'quizzes', 'quiz_questions', 'quiz_score_centi', 'quiz_chars',
+        'decks', 'flashcards', 'flashcard_chars', 'chat_sessions', 'chat_messages', 'chat_chars',
+        'materials', 'clashes', 'clash_chars', 'ratings', 'rating_sum',
+    )
+    RECENT_METRICS = (
+        'users', 'quizzes', 'decks', 'flashcards', 'chat_messages', 'materials', 'clashes',
+        'anonymous_hits', 'anonymous_quiz', 'anonymous_chat', 'anonymous_flashcards', 'anonymous_chars',
+    )
+    LATENCY_FEATURES = (
+        AIResponseLatency.CHAT, AIResponseLatency.QUIZ, AIResponseLatency.FLASHCARDS, AIResponseLatency.CLASH,
+    )
 
+    def get(self, request):
         now = timezone.now()
         day_ago = now - datetime.timedelta(days=1)
-        AnonymousUsageEvent.purge_expired(hours=24)
 
-        quiz_stats = QuizSession.objects.aggregate(
-            total=dm.Count('id'),
-            avg=dm.Avg('score_percentage'),
-            total_questions=Coalesce(dm.Sum('total_questions'), Value(0)),
+        # Counters are maintained incrementally (see rollups.py): no table scans here.
+        totals = read_totals(self.TOTAL_METRICS)
+        recent = read_recent(self.RECENT_METRICS, hours=24, now=now)
+        latency = read_recent(
+            [f'ai_latency_{kind}.{feature}' for kind in ('count', 'ms') for feature in self.LATENCY_FEATURES],
+            hours=24 * 7, now=now,
         )
 
-        total_users = User.objects.count()
-        verified_users = User.objects.filter(is_email_verified=True).count()
-        total_flashcard_decks = Deck.objects.count()
-        total_flashcards = Flashcard.objects.count()
-        total_chat_sessions = ChatSession.objects.exclude(user__isnull=True).count()
-        total_chat_messages = ChatMessage.objects.count()
-        total_materials = Material.objects.count()
-
-        feedback_stats = QuizExperienceRating.objects.aggregate(
-            total=dm.Count('id'),
-            average=dm.Avg('rating'),
-        )
+        total_users = totals['users']
+        total_quizzes = totals['quizzes']
+        total_chat_sessions = totals['chat_sessions']
+        total_ratings = totals['ratings']
 
         recent_ratings = [
             {
@@ -128,59 +166,12 @@ class AdminDashboardStatsView(APIView):
             for row in QuizExperienceRating.objects.select_related('user').order_by('-created_at')[:20]
         ]
 
-        # Clash stats
-        total_clashes = ClashRoom.objects.filter(status=ClashRoom.FINISHED).count()
-        clashes_24h = ClashRoom.objects.filter(
-            status=ClashRoom.FINISHED, finished_at__gte=day_ago
-        ).count()
-
-        clash_questions_chars = _safe_char_sum(
-            ClashRoom.objects.filter(status=ClashRoom.FINISHED),
-            Length(Cast('questions', output_field=TextField()))
-        )
-        estimated_tokens_clash = _tokens_from_chars(clash_questions_chars)
-
-        # 24h activity
-        quizzes_24h = QuizSession.objects.filter(created_at__gte=day_ago).count()
-        decks_24h = Deck.objects.filter(created_at__gte=day_ago).count()
-        cards_24h = Flashcard.objects.filter(created_at__gte=day_ago).count()
-        chat_messages_24h = ChatMessage.objects.filter(created_at__gte=day_ago).count()
-        new_users_24h = User.objects.filter(date_joined__gte=day_ago).count()
-        materials_24h = Material.objects.filter(created_at__gte=day_ago).count()
-        anonymous_usage_24h = AnonymousUsageEvent.objects.filter(created_at__gte=day_ago).count()
-
-        anonymous_qs = AnonymousUsageEvent.objects.filter(created_at__gte=day_ago)
-        anonymous_quiz_24h = anonymous_qs.filter(path__icontains='/quiz/').count()
-        anonymous_chat_24h = anonymous_qs.filter(
-            dm.Q(path__icontains='/chat/') | dm.Q(path__icontains='/chatbot/')
-        ).count()
-        anonymous_flashcards_24h = anonymous_qs.filter(path__icontains='/flashcards/').count()
-        anonymous_chars_24h = anonymous_qs.aggregate(
-            total=Coalesce(dm.Sum('request_chars'), Value(0)) + Coalesce(dm.Sum('response_chars'), Value(0))
-        ).get('total') or 0
-        anonymous_tokens_24h = _tokens_from_chars(int(anonymous_chars_24h))
-
-        # Character volume for token estimates
-        chat_chars = _safe_char_sum(ChatMessage.objects.all(), Length('content'))
-
-        flashcard_q_chars = _safe_char_sum(Flashcard.objects.all(), Length('question'))
-        flashcard_a_chars = _safe_char_sum(Flashcard.objects.all(), Length('answer'))
-        flashcard_chars = flashcard_q_chars + flashcard_a_chars
-
-        quiz_subject_chars = _safe_char_sum(QuizSession.objects.all(), Length('subject'))
-        quiz_questions_json_chars = _safe_char_sum(
-            QuizSession.objects.all(),
-            Length(Cast('questions_data', output_field=TextField()))
-        )
-        quiz_answers_json_chars = _safe_char_sum(
-            QuizSession.objects.all(),
-            Length(Cast('user_answers', output_field=TextField()))
-        )
-        quiz_chars = quiz_subject_chars + quiz_questions_json_chars + quiz_answers_json_chars
+        anonymous_tokens_24h = _tokens_from_chars(recent['anonymous_chars'])
 
-        estimated_tokens_chat = _tokens_from_chars(chat_chars)
-        estimated_tokens_flashcards = _tokens_from_chars(flashcard_chars)
-        estimated_tokens_quiz = _tokens_from_chars(quiz_chars)
+        estimated_tokens_chat = _tokens_from_chars(totals['chat_chars'])
+        estimated_tokens_flashcards = _tokens_from_chars(totals['flashcard_chars'])
+        estimated_tokens_quiz = _tokens_from_chars(totals['quiz_chars'])
+        estimated_tokens_clash = _tokens_from_chars(totals['clash_chars'])
         estimated_tokens_total = (
             estimated_tokens_chat +
             estimated_tokens_flashcards +
@@ -188,55 +179,52 @@ class AdminDashboardStatsView(APIView):
             estimated_tokens_clash
         )
 
-        avg_quizzes_per_user = round((quiz_stats['total'] or 0) / max(total_users, 1), 2)
+        avg_quizzes_per_user = round(total_quizzes / max(total_users, 1), 2)
         avg_chats_per_user = round(total_chat_sessions / max(total_users, 1), 2)
 
         # Estimated cost
         estimated_cost_usd = _cost_from_tokens(estimated_tokens_total)
 
         # Average AI response latency (7-day rolling window)
-        week_ago = timezone.now() - datetime.timedelta(days=7)
-        latency_agg = AIResponseLatency.objects.filter(created_at__gte=week_ago).aggregate(
-            avg_ms=dm.Avg('duration_ms'),
-            sample_count=dm.Count('id'),
-        )
-        avg_response_ms = round(float(latency_agg['avg_ms'] or 0), 1)
-        latency_sample_count = int(latency_agg['sample_count'] or 0)
+        latency_sample_count = sum(latency[f'ai_latency_count.{f}'] for f in self.LATENCY_FEATURES)
+        latency_total_ms = sum(latency[f'ai_latency_ms.{f}'] for f in self.LATENCY_FEATURES)
+        avg_response_ms = round(latency_total_ms / latency_sample_count, 1) if latency_sample_count else 0.0
+        latency_percentiles_7d = latency_percentiles(self.LATENCY_FEATURES, since=now - datetime.timedelta(days=7))
 
         # Last-24h activity feed for dashboard overview only
-        recent_activity_payload, _, _ = _collect_admin_activity(start_at=day_ago, limit=20, offset=0)
+        recent_activity_payload, _ = _collect_admin_activity(start_at=day_ago, limit=20)
 
         return Response({
             'total_users': total_users,
-            'verified_users': verified_users,
-            'total_quizzes': quiz_stats['total'] or 0,
-            'total_quiz_questions': int(quiz_stats['total_questions'] or 0),
-            'total_materials': total_materials,
-            'total_flashcard_decks': total_flashcard_decks,
-            'total_flashcards': total_flashcards,
+            'verified_users': totals['users_verified'],
+            'total_quizzes': total_quizzes,
+            'total_quiz_questions': totals['quiz_questions'],
+            'total_materials': totals['materials'],
+            'total_flashcard_decks': totals['decks'],
+            'total_flashcards': totals['flashcards'],
             'total_chat_sessions': total_chat_sessions,
-            'total_chat_messages': total_chat_messages,
-            'total_clashes': total_clashes,
-            'average_score': round(float(quiz_stats['avg'] or 0), 1),
-            'total_ratings': int(feedback_stats.get('total') or 0),
-            'average_experience_rating': round(float(feedback_stats.get('average') or 0), 2),
+            'total_chat_messages': totals['chat_messages'],
+            'total_clashes': totals['clashes'],
+            'average_score': round(totals['quiz_score_centi'] / 100 / total_quizzes, 1) if total_quizzes else 0.0,
+            'total_ratings': total_ratings,
+            'average_experience_rating': round(totals['rating_sum'] / total_ratings, 2) if total_ratings else 0.0,
             'recent_ratings': recent_ratings,
             'avg_quizzes_per_user': avg_quizzes_per_user,
             'avg_chats_per_user': avg_chats_per_user,
             'activity_24h': {
-                'new_users': new_users_24h,
-                'quizzes': quizzes_24h,
-                'decks': decks_24h,
-                'flashcards': cards_24h,
-                'chat_messages': chat_messages_24h,
-                'uploaded_materials': materials_24h,
-                'clashes': clashes_24h,
-                'anonymous_api_hits': anonymous_usage_24h,
+                'new_users': recent['users'],
+                'quizzes': recent['quizzes'],
+                'decks': recent['decks'],
+                'flashcards': recent['flashcards'],
+                'chat_messages': recent['chat_messages'],
+                'uploaded_materials': recent['materials'],
+                'clashes': recent['clashes'],
+                'anonymous_api_hits': recent['anonymous_hits'],
             },
             'unauthenticated_usage_24h': {
-                'quiz_requests': anonymous_quiz_24h,
-                'chat_requests': anonymous_chat_24h,
-                'flashcard_requests': anonymous_flashcards_24h,
+                'quiz_requests': recent['anonymous_quiz'],
+                'chat_requests': recent['anonymous_chat'],
+                'flashcard_requests': recent['anonymous_flashcards'],
                 'estimated_tokens': anonymous_tokens_24h,
                 'source': 'anonymous_api_events',
                 'retention_hours': 24,
@@ -254,6 +242,7 @@ class AdminDashboardStatsView(APIView):
             },
             'avg_response_ms': avg_response_ms,
             'latency_sample_count': latency_sample_count,
+            'latency_percentiles_7d': latency_percentiles_7d,
         })
 
 
@@ -261,12 +250,17 @@ class AdminUsageTrendsView(APIView):
     """GET /api/dashboard/admin/usage-trends/?days=14"""
     permission_classes = [IsAuthenticated, IsAdminUser]
 
-    def get(self, request):
+    # Response series name -> daily rollup metric (see rollups.read_daily_series).
+    SERIES_METRICS = {
+        "new_users": "users",
+        "quizzes": "quizzes",
+        "decks": "decks",
+        "chat_messages": "chat_messages",
+        "uploaded_materials": "materials",
+        "clashes": "clashes",
+    }
 
-        from apps.accounts.models import User
-        from apps.flashcards.models import Deck
-        from apps.materials.models import Material
-        from apps.clash.models import ClashRoom
+    def get(self, request):
 
         try:
             days = int(request.query_params.get("days", 14))
@@ -274,61 +268,45 @@ class AdminUsageTrendsView(APIView):
             days = 14
         days = max(7, min(days, 90))
 
-        today = timezone.now().date()
-        start_day = today - datetime.timedelta(days=days - 1)
-
-        def _series(qs, date_field: str):
-            rows = (
-                qs.filter(**{f"{date_field}__date__gte": start_day})
-                .annotate(day=TruncDate(date_field))
-                .values("day")
-                .annotate(count=dm.Count("id"))
-                .order_by("day")
-            )
-            return {r["day"]: int(r["count"]) for r in rows}
-
-        users_map = _series(User.objects.all(), "date_joined")
-        quizzes_map = _series(QuizSession.objects.all(), "created_at")
-        decks_map = _series(Deck.objects.all(), "created_at")
-        chats_map = _series(ChatMessage.objects.all(), "created_at")
-        materials_map = _series(Material.objects.all(), "created_at")
-        clashes_map = _series(
-            ClashRoom.objects.filter(status=ClashRoom.FINISHED), "finished_at"
-        )
-
-        labels = []
-        users = []
-        quizzes = []
-        decks = []
-        chats = []
-        materials = []
-        clashes = []
-        for offset in range(days):
-            day = start_day + datetime.timedelta(days=offset)
-            labels.append(day.isoformat())
-            users.append(users_map.get(day, 0))
-            quizzes.append(quizzes_map.get(day, 0))
-            decks.append(decks_map.get(day, 0))
-            chats.append(chats_map.get(day, 0))
-            materials.append(materials_map.get(day, 0))
-            clashes.append(clashes_map.get(day, 0))
-
+        labels, series = read_daily_series(self.SERIES_METRICS.values(), days)
         return Response(
             {
                 "days": days,
-                "labels": labels,
-                "series": {
-                    "new_users": users,
-                    "quizzes": quizzes,
-                    "decks": decks,
-                    "chat_messages": chats,
-                    "uploaded_materials": materials,
-                    "clashes": clashes,
-                },
+                "labels": [day.isoformat() for day in labels],
+                "series": {name: series[metric] for name, metric in self.SERIES_METRICS.items()},
             }
         )
 
 
+class AdminLatencyPercentilesView(APIView):
+    """GET /api/dashboard/admin/latency/?hours=168"""
+    permission_classes = [IsAuthenticated, IsAdminUser]
+
+    def get(self, request):
+        try:
+            hours = int(request.query_params.get('hours', 168))
+        except (TypeError, ValueError):
+            hours = 168
+        hours = max(1, min(hours, 24 * 30))
+
+        since = timezone.now() - datetime.timedelta(hours=hours - 1)
+        features = AdminDashboardStatsView.LATENCY_FEATURES
+        return Response({
+            'hours': hours,
+            'features': latency_percentiles(features, since=since),
+        })
+
+
+class AdminUpstreamMetricsView(APIView):
+    """GET /api/dashboard/admin/upstream-metrics/ — FastAPI connection + telemetry writer stats (this worker only)"""
+    permission_classes = [IsAuthenticated, IsAdminUser]
+
+    def get(self, request):
+        from apps.core.async_client import get_upstream_metrics
+        from .telemetry import telemetry_writer
+        return Response({**get_upstream_metrics(), 'telemetry_writer': telemetry_writer.stats()})
+
+
 class AdminAnonymousUsageView(APIView):
     """GET /api/dashboard/admin/anonymous-usage/?limit=200"""
     permission_classes = [IsAuthenticated, IsAdminUser]
@@ -340,7 +318,8 @@ class AdminAnonymousUsageView(APIView):
             limit = 200
         limit = max(1, min(limit, 500))
 
-        deleted_count = AnonymousUsageEvent.purge_expired(hours=24)
+        # Expired rows are deleted by the background sweeper (see retention.py); just filter here.
+        from .retention import retention_sweeper
         start_at = timezone.now() - datetime.timedelta(hours=24)
 
         queryset = AnonymousUsageEvent.objects.filter(created_at__gte=start_at)
@@ -385,7 +364,8 @@ class AdminAnonymousUsageView(APIView):
         return Response(
             {
                 "retention_hours": 24,
-                "deleted_expired": int(deleted_count or 0),
+                "deleted_expired": int(retention_sweeper.last_deleted.get(AnonymousUsageEvent._meta.label, 0)),
+                "retention_sweeper": retention_sweeper.stats(),
                 "total_last_24h": int(totals.get("total") or 0),
                 "unique_sessions_last_24h": int(totals.get("unique_sessions") or 0),
                 "top_paths": top_paths,
@@ -396,7 +376,7 @@ class AdminAnonymousUsageView(APIView):
 
 
 class AdminActivityFeedView(APIView):
-    """GET /api/dashboard/admin/activity/?period=day|week|month|quarter|year|all&limit=50&offset=0"""
+    """GET /api/dashboard/admin/activity/?period=day|week|month|quarter|year|all&limit=50&cursor=<next_cursor>"""
     permission_classes = [IsAuthenticated, IsAdminUser]
 
     def get(self, request):
@@ -439,13 +419,17 @@ class AdminActivityFeedView(APIView):
             offset = 0
         offset = max(0, offset)
 
+        cursor = request.query_params.get("cursor") or None
+
         start_at = None if days is None else timezone.now() - datetime.timedelta(days=days)
 
-        activities, total_count, counts_by_type = _collect_admin_activity(
+        activities, next_cursor = _collect_admin_activity(
             start_at=start_at,
             limit=limit,
             offset=offset,
+            cursor=cursor,
         )
+        total_count, counts_by_type = _admin_activity_counts(start_at)
 
         return Response(
             {
@@ -454,7 +438,8 @@ class AdminActivityFeedView(APIView):
                 "limit": limit,
                 "offset": offset,
                 "total": total_count,
-                "has_more": (offset + len(activities)) < total_count,
+                "has_more": next_cursor is not None,
+                "next_cursor": next_cursor,
                 "counts": counts_by_type,
                 "activities": activities,
             }
@@ -527,137 +512,13 @@ class AdminUserDeleteView(APIView):
     def get(self, request, user_id):
 
         from apps.accounts.models import User
-        from apps.flashcards.models import Deck, Flashcard
-        from apps.materials.models import Material
-        from apps.clash.models import ClashRoom, ClashParticipant
 
         try:
             target = User.objects.get(id=user_id)
         except User.DoesNotExist:
             return Response({'detail': 'User not found.'}, status=404)
 
-        quizzes_qs = QuizSession.objects.filter(user=target)
-        decks_qs = Deck.objects.filter(user=target)
-        flashcards_qs = Flashcard.objects.filter(deck__user=target)
-        chat_sessions_qs = ChatSession.objects.filter(user=target)
-        chat_messages_qs = ChatMessage.objects.filter(session__user=target)
-        materials_qs = Material.objects.filter(uploaded_by=target)
-        clash_parts_qs = ClashParticipant.objects.filter(
-            user=target, room__status=ClashRoom.FINISHED
-        ).select_related('room')
-
-        quiz_count = quizzes_qs.count()
-        flashcard_decks_count = decks_qs.count()
-        flashcards_count = flashcards_qs.count()
-        chat_sessions_count = chat_sessions_qs.count()
-        chat_messages_count = chat_messages_qs.count()
-
-        quiz_chars = (
-            _safe_char_sum(quizzes_qs, Length('subject')) +
-            _safe_char_sum(quizzes_qs, Length(Cast('questions_data', output_field=TextField()))) +
-            _safe_char_sum(quizzes_qs, Length(Cast('user_answers', output_field=TextField())))
-        )
-        flashcard_chars = (
-            _safe_char_sum(flashcards_qs, Length('question')) +
-            _safe_char_sum(flashcards_qs, Length('answer'))
-        )
-        chat_chars = _safe_char_sum(chat_messages_qs, Length('content'))
-
-        tokens_quiz = _tokens_from_chars(quiz_chars)
-        tokens_flashcards = _tokens_from_chars(flashcard_chars)
-        tokens_chat = _tokens_from_chars(chat_chars)
-
-        # Clash stats
-        total_clashes = clash_parts_qs.count()
-        clashes_as_host = clash_parts_qs.filter(is_host=True).count()
-        clash_wins = clash_parts_qs.filter(rank=1).count()
-        clash_avg_score = clash_parts_qs.aggregate(avg=dm.Avg('score'))['avg'] or 0
-
-        # Clash token estimate — only rooms this user hosted (host pays for question generation)
-        hosted_room_ids = list(clash_parts_qs.filter(is_host=True).values_list('room_id', flat=True))
-        clash_chars = _safe_char_sum(
-            ClashRoom.objects.filter(id__in=hosted_room_ids),
-            Length(Cast('questions', output_field=TextField()))
-        )
-        tokens_clash = _tokens_from_chars(clash_chars)
-
-        quiz_stats = quizzes_qs.aggregate(
-            avg=dm.Avg('score_percentage'),
-            total_questions=Coalesce(dm.Sum('total_questions'), Value(0)),
-        )
-
-        # Get user's quiz experience rating
-        user_rating = QuizExperienceRating.objects.filter(user=target).order_by('-updated_at').first()
-        user_rating_value = user_rating.rating if user_rating else None
-
-        # Recent per-user activity (quizzes + flashcards + chat)
-        recent_activity = []
-        for q in quizzes_qs.order_by('-created_at')[:10]:
-            recent_activity.append({
-                "type": "quiz",
-                "text": f"completed a {(q.subject or 'General')} quiz ({q.score_percentage}%)",
-                "created_at": q.created_at,
-            })
-
-        for d in decks_qs.order_by('-created_at')[:10]:
-            recent_activity.append({
-                "type": "flashcards",
-                "text": f"created flashcard deck '{d.title}'",
-                "created_at": d.created_at,
-            })
-
-        for s in chat_sessions_qs.order_by('-created_at')[:10]:
-            msg_count = ChatMessage.objects.filter(session=s).count()
-            recent_activity.append({
-                "type": "chat",
-                "text": f"chat session ({msg_count} message{'s' if msg_count != 1 else ''})",
-                "created_at": s.created_at,
-            })
-
-        for p in clash_parts_qs.order_by('-room__finished_at')[:10]:
-            role = 'hosted' if p.is_host else 'played'
-            player_count = ClashParticipant.objects.filter(room=p.room).count()
-            recent_activity.append({
-                "type": "clash",
-                "text": f"{role} a Clash on '{p.room.subject}' — #{p.rank} of {player_count} ({p.score} pts)",
-                "created_at": p.room.finished_at,
-            })
-
-        recent_activity.sort(key=lambda item: item["created_at"], reverse=True)
-        recent_activity = [
-            {**item, "created_at": item["created_at"].isoformat()}
-            for item in recent_activity[:20]
-        ]
-
-        tokens_total = tokens_quiz + tokens_flashcards + tokens_chat + tokens_clash
-        return Response({
-            'user': user_to_dict(target),
-            'summary': {
-                'total_quizzes': quiz_count,
-                'total_quiz_questions': int(quiz_stats.get('total_questions') or 0),
-                'average_score': round(float(quiz_stats.get('avg') or 0), 1),
-                'total_flashcard_decks': flashcard_decks_count,
-                'total_flashcards': flashcards_count,
-                'total_chat_sessions': chat_sessions_count,
-                'total_chat_messages': chat_messages_count,
-                'total_materials': materials_qs.count(),
-                'total_clashes': total_clashes,
-                'clashes_as_host': clashes_as_host,
-                'clash_wins': clash_wins,
-                'clash_avg_score': int(round(float(clash_avg_score))),
-                'user_rating': user_rating_value,
-            },
-            'estimated_tokens': {
-                'quiz': tokens_quiz,
-                'flashcards': tokens_flashcards,
-                'chat': tokens_chat,
-                'clash': tokens_clash,
-                'total': tokens_total,
-                'estimated_cost_usd': _cost_from_tokens(tokens_total),
-                'method': 'chars_div_4_estimate',
-            },
-            'recent_activity': recent_activity,
-        })
+        return Response(_load_admin_user_detail(target))
 
     def delete(self, request, user_id):
         from apps.accounts.models import User
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.1 on 2026-10-19 00:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('flashcards', '0003_add_explanation_cache'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='flashcard',
+            name='char_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='flashcard',
+            name='token_estimate',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.1 on 2026-10-19 00:23
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('flashcards', '0004_flashcard_char_count_flashcard_token_estimate'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='deck',
+            index=models.Index(fields=['created_at', 'id'], name='fc_deck_created_idx'),
+        ),
+    ]
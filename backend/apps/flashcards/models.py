@@ -2,6 +2,8 @@ from django.db import models
 from django.conf import settings
 from django.utils import timezone
 
+from apps.core.text_metrics import CharCountedModel
+
 
 class Deck(models.Model):
     """
@@ -23,13 +25,14 @@ class Deck(models.Model):
     class Meta:
         indexes = [
             models.Index(fields=["user", "created_at"], name="fc_deck_user_created_idx"),
+            models.Index(fields=["created_at", "id"], name="fc_deck_created_idx"),
         ]
 
     def __str__(self):
         return f"{self.title} - {self.user}"
 
 
-class Flashcard(models.Model):
+class Flashcard(CharCountedModel):
     """
     Individual flashcard inside a deck.
     Uses SM-2 spaced repetition scheduling.
@@ -55,6 +58,9 @@ class Flashcard(models.Model):
 
     created_at = models.DateTimeField(auto_now_add=True)
 
+    # Explanations are generated on demand and not part of the card's cost estimate.
+    CHAR_SOURCE_FIELDS = ("question", "answer")
+
     class Meta:
         indexes = [
             models.Index(fields=["deck", "next_review"], name="fc_card_deck_due_idx"),
@@ -62,4 +68,4 @@ class Flashcard(models.Model):
         ]
 
     def __str__(self):
-        return f"Card {self.id} in deck {self.deck_id}"
\ No newline at end of file
+        return f"Card {self.id} in deck {self.deck_id}"
@@ -31,4 +31,4 @@ def update_sm2(card, quality: int):
     card.next_review = now + timedelta(days=card.interval)
     card.last_review = now
 
-    card.save()
+    card.save(update_fields=["repetition", "interval", "ease_factor", "next_review", "last_review"])
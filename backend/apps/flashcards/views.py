@@ -1,4 +1,3 @@
-import asyncio
 import json
 import logging
 import httpx
@@ -23,20 +22,12 @@ from .serializers import (
     UpdateFlashcardRequestSerializer,
 )
 from apps.core.async_client import call_fastapi, build_fastapi_headers
+from apps.dashboard.rollups import record_created
+from apps.dashboard.telemetry import record_ai_latency
 
 logger = logging.getLogger(__name__)
 
 
-async def _record_ai_latency(feature: str, duration_ms: int) -> None:
-    try:
-        from apps.dashboard.models import AIResponseLatency
-        await sync_to_async(AIResponseLatency.objects.create)(
-            feature=feature, duration_ms=duration_ms
-        )
-    except Exception:
-        pass
-
-
 def _parse_json_body(request):
     if not request.body:
         return None, JsonResponse({"error": "Request body is required"}, status=400)
@@ -137,7 +128,7 @@ async def generate_flashcards(request):
                 "difficulty": payload["difficulty"],
             },
         )
-        asyncio.create_task(_record_ai_latency('flashcards', int((perf_counter() - _t0) * 1000)))
+        record_ai_latency('flashcards', int((perf_counter() - _t0) * 1000))
         resp.raise_for_status()
         result = resp.json()
 
@@ -196,6 +187,7 @@ def save_flashcard_deck(request):
             ]
 
             Flashcard.objects.bulk_create(objs)
+            record_created(objs)
 
         return JsonResponse({"deck_id": deck.id}, status=201)
     except Exception:
@@ -36,6 +36,7 @@ class Material(models.Model):
         ordering            = ['-created_at']
         verbose_name        = 'Material'
         verbose_name_plural = 'Materials'
+        indexes             = [models.Index(fields=['created_at', 'id'], name='material_created_idx')]
 
     def __str__(self):
         uploader = self.uploaded_by.username if self.uploaded_by else 'deleted user'
@@ -4,7 +4,6 @@ High-Performance Async Proxy View for Quiz Generation
 Implements the Asynchronous Proxy Pattern for quiz endpoints.
 """
 
-import asyncio
 import json
 import logging
 import httpx
@@ -15,6 +14,7 @@ from django.http import JsonResponse, HttpResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 from apps.core.async_client import call_fastapi, build_fastapi_headers
+from apps.dashboard.telemetry import record_ai_latency
 from rest_framework.authentication import TokenAuthentication
 from rest_framework.exceptions import AuthenticationFailed
 
@@ -26,16 +26,6 @@ from .models import QuizSession, TopicPerformance, QuizTopicSchedule
 logger = logging.getLogger(__name__)
 
 
-async def _record_ai_latency(feature: str, duration_ms: int) -> None:
-    try:
-        from apps.dashboard.models import AIResponseLatency
-        await sync_to_async(AIResponseLatency.objects.create)(
-            feature=feature, duration_ms=duration_ms
-        )
-    except Exception:
-        pass
-
-
 async def _get_authenticated_user_async(request):
     """
     Async-safe token authentication for async views.
@@ -161,7 +151,7 @@ async def generate_quiz_api_async(request):
             headers=headers,
             timeout=120.0,
         )
-        asyncio.create_task(_record_ai_latency('quiz', int((perf_counter() - _t0) * 1000)))
+        record_ai_latency('quiz', int((perf_counter() - _t0) * 1000))
 
         if fastapi_resp.status_code != 200:
             logger.warning(f"FastAPI quiz call failed: {fastapi_resp.status_code} {fastapi_resp.text}")
@@ -313,7 +303,7 @@ async def submit_quiz_api_async(request):
         exam_mode = bool(data.get("exam_mode", False))
 
         # Persist to quiz history for this authenticated user (including admins).
-        await sync_to_async(QuizSession.objects.create, thread_sensitive=True)(
+        session = await sync_to_async(QuizSession.objects.create, thread_sensitive=True)(
             user=user,
             subject=subject_clean,
             total_questions=total_questions,
@@ -325,6 +315,8 @@ async def submit_quiz_api_async(request):
             exam_mode=exam_mode,
             time_limit_minutes=int(data.get("time_limit") or 0) or None,
         )
+        # Lets /quiz/download/ key its render cache on the stored session.
+        results["session_id"] = session.id
 
         # Update Tier 1 intelligence models (fire-and-forget; errors are logged, never bubble up)
         try:
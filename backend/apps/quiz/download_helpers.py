@@ -1,8 +1,13 @@
 import re
+import asyncio
+import hashlib
+import threading
+import zipfile
 from io import BytesIO
 from datetime import datetime
 from zoneinfo import ZoneInfo
 from html import unescape
+from concurrent.futures import ThreadPoolExecutor
 
 import docx
 from docx.shared import Pt, RGBColor, Inches
@@ -12,7 +17,9 @@ from docx.oxml import OxmlElement
 
 import json
 import logging
-from django.http import JsonResponse, HttpResponse
+from django.conf import settings
+from django.core.cache import cache
+from django.http import JsonResponse, HttpResponseNotModified, StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 
@@ -30,6 +37,8 @@ try:
 except ImportError:
     HAS_REPORTLAB = False
 
+from .models import QuizSession
+
 logger = logging.getLogger(__name__)
 
 
@@ -37,8 +46,15 @@ logger = logging.getLogger(__name__)
 
 @csrf_exempt
 @require_http_methods(["POST"])
-def download_quiz_results(request):
-    """Download quiz results as PDF, DOCX, or TXT."""
+async def download_quiz_results(request):
+    """
+    Download quiz results as PDF, DOCX, or TXT.
+
+    Rendering runs in a bounded worker pool so ReportLab / python-docx never
+    block the event loop. Rendered bytes are cached by (session, format,
+    content hash); repeat downloads are served from cache and carry an ETag
+    so clients can revalidate with If-None-Match.
+    """
     try:
         data        = json.loads(request.body) if request.body else {}
         results     = data.get('results', {})
@@ -47,43 +63,295 @@ def download_quiz_results(request):
         if not results:
             return JsonResponse({"error": "No results data provided"}, status=400)
 
+        if file_format not in _EXPORT_FORMATS:
+            file_format = 'txt'
+
+        if file_format == 'pdf' and not HAS_REPORTLAB:
+            return JsonResponse(
+                {"error": "PDF generation unavailable. Please use TXT or DOCX."},
+                status=400,
+            )
+
+        content_hash = _results_hash(results)
+        etag = f'"{file_format}-{content_hash[:32]}"'
+
         subject   = results.get('subject', 'Quiz')
         safe_name = _safe_filename(subject)
         tz        = ZoneInfo('Africa/Accra')
         ts        = datetime.now(tz).strftime('%Y%m%d_%H%M%S')
         base      = f"{safe_name}_Quiz_{ts}"
+        content_type, ext = _EXPORT_FORMATS[file_format]
 
-        if file_format == 'pdf':
-            if not HAS_REPORTLAB:
-                return JsonResponse(
-                    {"error": "PDF generation unavailable. Please use TXT or DOCX."},
-                    status=400,
-                )
-            buf = _build_pdf(results)
-            response = HttpResponse(buf.getvalue(), content_type='application/pdf')
-            response['Content-Disposition'] = f'attachment; filename="{base}.pdf"'
+        if request.headers.get('If-None-Match') == etag:
+            response = HttpResponseNotModified()
+            response['ETag'] = etag
             return response
 
-        elif file_format == 'docx':
-            buf = _build_docx(results)
-            response = HttpResponse(
-                buf.getvalue(),
-                content_type='application/vnd.openxmlformats-officedocument.wordprocessingml.document',
-            )
-            response['Content-Disposition'] = f'attachment; filename="{base}.docx"'
-            return response
+        payload = await render_quiz_export(results, file_format, content_hash=content_hash)
 
-        else:  # txt
-            content  = _build_txt(results)
-            response = HttpResponse(content, content_type='text/plain; charset=utf-8')
-            response['Content-Disposition'] = f'attachment; filename="{base}.txt"'
-            return response
+        response = StreamingHttpResponse(_iter_bytes(payload), content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="{base}.{ext}"'
+        response['Content-Length'] = str(len(payload))
+        response['ETag'] = etag
+        response['Cache-Control'] = 'private, no-cache'
+        return response
 
     except Exception as e:
         logger.error(f"Error generating download: {e}", exc_info=True)
         return JsonResponse({"error": "Failed to generate file"}, status=500)
 
 
+@require_http_methods(["GET"])
+async def export_quiz_history(request):
+    """
+    GET /api/quiz/history/export/?format=pdf|docx|txt[&user_id=<id>]
+
+    Stream every stored QuizSession for the caller as a ZIP archive, one
+    rendered file per session. Admins may export another user's history via
+    ``user_id``. Sessions are read in chunks and rendered a batch at a time
+    through the export pool, and each finished entry is flushed to the client
+    immediately — memory stays bounded by one batch regardless of history size.
+    """
+    from .async_views import _get_authenticated_user_async
+
+    user, auth_error = await _get_authenticated_user_async(request)
+    if auth_error:
+        return auth_error
+
+    file_format = (request.GET.get('format') or 'pdf').lower()
+    if file_format not in _EXPORT_FORMATS:
+        file_format = 'txt'
+    if file_format == 'pdf' and not HAS_REPORTLAB:
+        return JsonResponse(
+            {"error": "PDF generation unavailable. Please use TXT or DOCX."},
+            status=400,
+        )
+
+    owner_id = user.id
+    requested_user = request.GET.get('user_id')
+    if requested_user and getattr(user, 'is_admin', False):
+        try:
+            owner_id = int(requested_user)
+        except (TypeError, ValueError):
+            return JsonResponse({"error": "Invalid user_id"}, status=400)
+
+    sessions = (
+        QuizSession.objects
+        .filter(user_id=owner_id)
+        .only('id', 'subject', 'questions_data', 'user_answers', 'created_at')
+        .order_by('created_at')
+    )
+
+    tz = ZoneInfo('Africa/Accra')
+    ts = datetime.now(tz).strftime('%Y%m%d_%H%M%S')
+    response = StreamingHttpResponse(
+        _stream_history_zip(sessions, file_format),
+        content_type='application/zip',
+    )
+    response['Content-Disposition'] = f'attachment; filename="Quiz_History_{ts}.zip"'
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+def _results_from_session(session) -> dict:
+    """Rebuild the download ``results`` shape from a stored QuizSession."""
+    quiz    = session.questions_data or {}
+    answers = session.user_answers or {}
+    questions = (quiz.get('mcq_questions') or []) + (quiz.get('short_questions') or [])
+    details = [
+        {
+            'question':       q.get('question', ''),
+            'options':        q.get('options') or [],
+            'correct_answer': q.get('answer', ''),
+            'explanation':    q.get('explanation', ''),
+            'user_answer':    str(answers.get(str(idx), '')),
+        }
+        for idx, q in enumerate(questions)
+    ]
+    return {
+        'session_id':      session.id,
+        'subject':         session.subject or quiz.get('subject') or 'Quiz',
+        'difficulty':      quiz.get('difficulty') or 'medium',
+        'source_filename': quiz.get('source_filename', ''),
+        'completed_at':    session.created_at.isoformat(),
+        'details':         details,
+    }
+
+
+class _ZipStreamBuffer:
+    """
+    Write-only, non-seekable sink for ``zipfile.ZipFile``.
+
+    ZipFile falls back to data descriptors when the target cannot seek, so
+    entries can be drained to the client as soon as each one is written.
+    """
+
+    def __init__(self):
+        self._chunks: list[bytes] = []
+        self._offset = 0
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self._chunks.append(data)
+        self._offset += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._offset
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        out = b''.join(self._chunks)
+        self._chunks = []
+        return out
+
+
+async def _stream_history_zip(sessions, file_format: str):
+    _, ext = _EXPORT_FORMATS[file_format]
+    compression = zipfile.ZIP_DEFLATED if file_format == 'txt' else zipfile.ZIP_STORED
+    batch_size = max(1, int(getattr(settings, 'QUIZ_EXPORT_WORKERS', 2))) * 2
+
+    sink = _ZipStreamBuffer()
+    archive = zipfile.ZipFile(sink, mode='w', compression=compression)
+    index = 0
+
+    async def _write_batch(batch):
+        nonlocal index
+        rendered = await asyncio.gather(*(
+            render_quiz_export(_results_from_session(s), file_format, use_cache=False) for s in batch
+        ))
+        for session, payload in zip(batch, rendered):
+            index += 1
+            stamp = session.created_at.strftime('%Y%m%d_%H%M%S')
+            name = f"{index:04d}_{_safe_filename(session.subject, max_len=80)}_{stamp}.{ext}"
+            archive.writestr(name, payload)
+
+    batch = []
+    try:
+        async for session in sessions.aiterator(chunk_size=50):
+            batch.append(session)
+            if len(batch) >= batch_size:
+                await _write_batch(batch)
+                batch = []
+                yield sink.drain()
+        if batch:
+            await _write_batch(batch)
+    except Exception as e:
+        logger.error(f"Error streaming quiz history export: {e}", exc_info=True)
+        archive.writestr('EXPORT_ERROR.txt', 'Export stopped early due to a server error.')
+    finally:
+        archive.close()
+    yield sink.drain()
+
+
+# ── Rendering pool & cache ────────────────────────────────────────────────────
+
+_EXPORT_FORMATS = {
+    'pdf':  ('application/pdf', 'pdf'),
+    'docx': ('application/vnd.openxmlformats-officedocument.wordprocessingml.document', 'docx'),
+    'txt':  ('text/plain; charset=utf-8', 'txt'),
+}
+
+_STREAM_CHUNK_SIZE = 64 * 1024
+
+_export_pool: ThreadPoolExecutor | None = None
+_export_pool_lock = threading.Lock()
+
+
+def _get_export_pool() -> ThreadPoolExecutor:
+    """Lazily create the shared export worker pool (one per process)."""
+    global _export_pool
+    if _export_pool is None:
+        with _export_pool_lock:
+            if _export_pool is None:
+                _export_pool = ThreadPoolExecutor(
+                    max_workers=max(1, int(getattr(settings, 'QUIZ_EXPORT_WORKERS', 2))),
+                    thread_name_prefix='quiz-export',
+                )
+    return _export_pool
+
+
+def _results_hash(results: dict) -> str:
+    canonical = json.dumps(results, sort_keys=True, default=str, separators=(',', ':'))
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+def _export_cache_key(results: dict, file_format: str, content_hash: str) -> str:
+    session_ref = results.get('session_id') or results.get('quiz_id') or 'anon'
+    return f"quiz_export:{session_ref}:{file_format}:{content_hash}"
+
+
+def _export_date(results: dict, fmt: str) -> str:
+    """
+    The quiz's own date (``completed_at``) formatted for an export, or '' if unknown.
+
+    Never the render time: rendered bytes are cached and ETagged by a hash of
+    ``results``, so they must be a function of ``results`` alone.
+    """
+    raw = results.get('completed_at')
+    if not raw:
+        return ''
+    try:
+        when = datetime.fromisoformat(str(raw).replace('Z', '+00:00'))
+    except ValueError:
+        return ''
+    if when.tzinfo is not None:
+        when = when.astimezone(ZoneInfo('Africa/Accra'))
+    return when.strftime(fmt)
+
+
+def _render_export(results: dict, file_format: str) -> bytes:
+    """Synchronous renderer — runs inside the export pool."""
+    if file_format == 'pdf':
+        return _build_pdf(results).getvalue()
+    if file_format == 'docx':
+        return _build_docx(results).getvalue()
+    return _build_txt(results).encode('utf-8')
+
+
+async def render_quiz_export(
+    results: dict, file_format: str, *, content_hash: str | None = None, use_cache: bool = True,
+) -> bytes:
+    """
+    Return rendered export bytes, from cache when possible.
+
+    Cache errors (e.g. Redis unavailable) degrade to a plain render. Pass
+    ``use_cache=False`` for one-off renders (the history ZIP) so they do not
+    fill the cache with blobs nobody will ask for again.
+    """
+    if not use_cache:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_get_export_pool(), _render_export, results, file_format)
+
+    content_hash = content_hash or _results_hash(results)
+    key = _export_cache_key(results, file_format, content_hash)
+
+    try:
+        cached = await cache.aget(key)
+    except Exception as exc:
+        logger.warning("Quiz export cache read failed key=%s error=%s", key, exc)
+        cached = None
+    if cached is not None:
+        return cached
+
+    loop = asyncio.get_running_loop()
+    payload = await loop.run_in_executor(_get_export_pool(), _render_export, results, file_format)
+
+    try:
+        await cache.aset(key, payload, timeout=int(getattr(settings, 'QUIZ_EXPORT_CACHE_SECONDS', 86400)))
+    except Exception as exc:
+        logger.warning("Quiz export cache write failed key=%s error=%s", key, exc)
+    return payload
+
+
+async def _iter_bytes(payload: bytes):
+    for start in range(0, len(payload), _STREAM_CHUNK_SIZE):
+        yield payload[start:start + _STREAM_CHUNK_SIZE]
+
+
 # ── Text helpers ──────────────────────────────────────────────────────────────
 
 def _clean_html(text: str) -> str:
@@ -195,6 +463,7 @@ def _build_pdf(results: dict) -> BytesIO:
         buffer, pagesize=letter,
         leftMargin=MAR, rightMargin=MAR,
         topMargin=MAR, bottomMargin=0.75 * inch,
+        invariant=1,    # no creation timestamp or random file ID: same results, same bytes
     )
 
     def S(name, font='Helvetica', size=10, color=None, align=TA_LEFT,
@@ -232,8 +501,7 @@ def _build_pdf(results: dict) -> BytesIO:
     src        = results.get('source_filename', '')
     details    = results.get('details', [])
     total      = len(details)
-    tz         = ZoneInfo('Africa/Accra')
-    date_str   = datetime.now(tz).strftime('%B %d, %Y')
+    date_str   = _export_date(results, '%B %d, %Y') or '—'
 
     # ── Header banner ──────────────────────────────────────────────
     sub_parts = ['QUESTIONS & ANSWERS']
@@ -529,8 +797,7 @@ def _build_docx(results: dict) -> BytesIO:
     src        = results.get('source_filename', '')
     details    = results.get('details', [])
     total      = len(details)
-    tz         = ZoneInfo('Africa/Accra')
-    date_str   = datetime.now(tz).strftime('%B %d, %Y')
+    date_str   = _export_date(results, '%B %d, %Y') or '—'
 
     doc = docx.Document()
 
@@ -716,8 +983,7 @@ def _build_txt(results: dict) -> str:
     subject    = results.get('subject', 'Quiz')
     difficulty = results.get('difficulty', 'Random')
     src        = results.get('source_filename', '')
-    tz         = ZoneInfo('Africa/Accra')
-    ts         = datetime.now(tz).strftime('%Y-%m-%d %H:%M:%S %Z')
+    ts         = _export_date(results, '%Y-%m-%d %H:%M:%S %Z')
     OPT_LABELS = ['A', 'B', 'C', 'D']
 
     lines = [
@@ -726,8 +992,9 @@ def _build_txt(results: dict) -> str:
         '=' * 72,
         f'  Difficulty : {difficulty.title()}',
         f'  Questions  : {len(details)}',
-        f'  Generated  : {ts}',
     ]
+    if ts:
+        lines.append(f'  Date       : {ts}')
     if src:
         lines.append(f'  Source     : {src}')
     lines += ['=' * 72, '']
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.1 on 2026-10-19 00:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0004_rename_quiz_schedule_user_review_idx_quiz_quizto_user_id_4b3b1e_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='quizsession',
+            name='char_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='quizsession',
+            name='token_estimate',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.1 on 2026-10-19 00:23
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0005_quizsession_char_count_quizsession_token_estimate'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='quizsession',
+            index=models.Index(fields=['created_at', 'id'], name='quiz_session_created_idx'),
+        ),
+    ]
@@ -4,8 +4,10 @@ from django.conf import settings
 from django.db import models
 from django.utils import timezone
 
+from apps.core.text_metrics import CharCountedModel
 
-class QuizSession(models.Model):
+
+class QuizSession(CharCountedModel):
     """Model to track quiz sessions and results."""
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL,
@@ -23,10 +25,13 @@ class QuizSession(models.Model):
     time_limit_minutes = models.PositiveIntegerField(null=True, blank=True, help_text="Time limit set for this session")
     created_at        = models.DateTimeField(auto_now_add=True)
 
+    CHAR_SOURCE_FIELDS = ("subject", "questions_data", "user_answers")
+
     class Meta:
         ordering        = ["-created_at"]
         verbose_name    = "Quiz Session"
         verbose_name_plural = "Quiz Sessions"
+        indexes         = [models.Index(fields=["created_at", "id"], name="quiz_session_created_idx")]
 
     def __str__(self):
         # Custom user model uses email, not username
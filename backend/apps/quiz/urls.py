@@ -9,6 +9,7 @@ urlpatterns = [
     path("quiz/submit/", async_views.submit_quiz_api_async, name="submit_quiz_api"),
     path("quiz/download/", download_helpers.download_quiz_results, name="download_quiz_results"),
     path('quiz/history/', async_views.QuizHistoryView.as_view()),
+    path('quiz/history/export/', download_helpers.export_quiz_history, name="export_quiz_history"),
     path('quiz/sessions/<int:session_id>/', async_views.QuizReplayView.as_view()),
     path('quiz/weak-areas/', async_views.WeakAreasView.as_view()),
     path('quiz/due-topics/', async_views.DueTopicsView.as_view()),
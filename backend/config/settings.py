@@ -155,6 +155,20 @@ else:
         }
     }
 
+# Clash game ownership: a worker's lease on a running game lasts this long
+# without renewal; other workers scan for lapsed leases at this interval.
+CLASH_LEASE_SECONDS = int(os.getenv("CLASH_LEASE_SECONDS", "15"))
+CLASH_COORDINATOR_SCAN_SECONDS = int(os.getenv("CLASH_COORDINATOR_SCAN_SECONDS", "5"))
+# A game whose runner crashes this many times is marked finished instead of reclaimed again.
+CLASH_MAX_RUNNER_FAILURES = int(os.getenv("CLASH_MAX_RUNNER_FAILURES", "3"))
+# Clash presence: a player is online until this long after their last heartbeat
+# (clients send one every 10 seconds).
+CLASH_PRESENCE_TTL_SECONDS = int(os.getenv("CLASH_PRESENCE_TTL_SECONDS", "30"))
+# Pre-generated Clash questions kept per (subject, difficulty), and how many
+# each background refill asks the quiz service for at once.
+CLASH_POOL_TARGET_SIZE = int(os.getenv("CLASH_POOL_TARGET_SIZE", "60"))
+CLASH_POOL_REFILL_BATCH = int(os.getenv("CLASH_POOL_REFILL_BATCH", "20"))
+
 
 # Database Configuration
 DATABASE_URL = os.getenv("DATABASE_URL")
@@ -251,6 +265,31 @@ FASTAPI_URL = FASTAPI_BASE_URL
 FASTAPI_SECRET = os.getenv("FASTAPI_SECRET")
 CHATBOT_MAX_TOKENS = int(os.getenv("CHATBOT_MAX_TOKENS", "1200"))
 
+# Quiz result exports (PDF/DOCX/TXT) — rendered off the event loop and cached
+QUIZ_EXPORT_WORKERS = int(os.getenv("QUIZ_EXPORT_WORKERS", "2"))
+QUIZ_EXPORT_CACHE_SECONDS = int(os.getenv("QUIZ_EXPORT_CACHE_SECONDS", "86400"))
+
+# Analytics rows (AIResponseLatency, AnonymousUsageEvent) are buffered and bulk-inserted
+TELEMETRY_BATCH_SIZE = int(os.getenv("TELEMETRY_BATCH_SIZE", "100"))
+TELEMETRY_FLUSH_INTERVAL_MS = int(os.getenv("TELEMETRY_FLUSH_INTERVAL_MS", "1000"))
+TELEMETRY_MAX_QUEUE = int(os.getenv("TELEMETRY_MAX_QUEUE", "10000"))
+
+# Expired analytics rows are deleted off the request path in small pk batches
+ANONYMOUS_USAGE_RETENTION_HOURS = int(os.getenv("ANONYMOUS_USAGE_RETENTION_HOURS", "24"))
+# AIResponseLatency rows are kept indefinitely unless a retention is set (opt-in)
+AI_LATENCY_RETENTION_HOURS = int(os.getenv("AI_LATENCY_RETENTION_HOURS", "0")) or None
+RETENTION_SWEEP_INTERVAL_SECONDS = int(os.getenv("RETENTION_SWEEP_INTERVAL_SECONDS", "300"))
+RETENTION_SWEEP_BATCH_SIZE = int(os.getenv("RETENTION_SWEEP_BATCH_SIZE", "1000"))
+RETENTION_SWEEP_PAUSE_MS = int(os.getenv("RETENTION_SWEEP_PAUSE_MS", "50"))
+
+# Closed days of the admin usage-trends series are cached; edits to past days bump the cache version
+ROLLUP_SERIES_CACHE_TTL = int(os.getenv("ROLLUP_SERIES_CACHE_TTL", "86400"))
+# Hourly MetricRollup buckets are pruned after this many days; daily and all-time buckets are kept.
+METRIC_ROLLUP_HOURLY_RETENTION_DAYS = int(os.getenv("METRIC_ROLLUP_HOURLY_RETENTION_DAYS", "30"))
+
+# Student dashboard payloads are cached per user and invalidated by model signals
+DASHBOARD_STATS_CACHE_TTL = int(os.getenv("DASHBOARD_STATS_CACHE_TTL", "3600"))
+
 AZURE_OPENAI_API_KEY = os.getenv("AZURE_OPENAI_API_KEY")
 AZURE_OPENAI_ENDPOINT = os.getenv("AZURE_OPENAI_ENDPOINT")
 AZURE_OPENAI_DEPLOYMENT = os.getenv("AZURE_OPENAI_DEPLOYMENT")
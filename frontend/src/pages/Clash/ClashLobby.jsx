@@ -8,6 +8,7 @@ const DJANGO_ROOT_URL = DJANGO_API_URL.replace(/\/api\/?$/, "");
 // Canonical frontend origin — set VITE_APP_URL=https://ocasia.vercel.app in Vercel env vars.
 // Falls back to the current origin so local dev still works without the var.
 const APP_URL = (import.meta.env.VITE_APP_URL || window.location.origin).replace(/\/$/, "");
+const HEARTBEAT_MS = 10000;
 
 function PlayerAvatar({ participant, className = "" }) {
   const [imgFailed, setImgFailed] = useState(false);
@@ -86,6 +87,10 @@ export default function ClashLobby() {
     if (!token) return;
     const ws = new WebSocket(buildWsUrl(code, token));
     wsRef.current = ws;
+    // Presence heartbeat: the server counts a player as gone ~30s after the last one.
+    const heartbeat = setInterval(() => {
+      if (ws.readyState === WebSocket.OPEN) ws.send(JSON.stringify({ type: "heartbeat" }));
+    }, HEARTBEAT_MS);
 
     ws.onmessage = (ev) => {
       let msg;
@@ -117,6 +122,7 @@ export default function ClashLobby() {
     ws.onerror = () => setError("Connection error. Please refresh.");
 
     return () => {
+      clearInterval(heartbeat);
       clearInterval(countdownRef.current);
       ws.close();
     };
@@ -240,7 +246,7 @@ export default function ClashLobby() {
             <p className="clash-lobby-empty">Waiting for players to join…</p>
           )}
           {participants.map(p => (
-            <div key={p.username} className="clash-participant-row">
+            <div key={p.username} className={`clash-participant-row${p.online === false ? " offline" : ""}`}>
               <PlayerAvatar participant={p} className="clash-participant-avatar" />
               <span className="clash-participant-name">
                 {p.display_name || p.username}
@@ -6,6 +6,7 @@ import "./Clash.css";
 const DJANGO_API_URL = import.meta.env.VITE_DJANGO_API_URL;
 const DJANGO_ROOT_URL = DJANGO_API_URL.replace(/\/api\/?$/, "");
 const LETTERS = ["A", "B", "C", "D", "E"];
+const HEARTBEAT_MS = 10000;
 
 function buildWsUrl(code, token) {
   const proto = DJANGO_ROOT_URL.startsWith("https") ? "wss" : "ws";
@@ -91,6 +92,10 @@ export default function ClashPlay() {
     if (!token) return;
     const ws = new WebSocket(buildWsUrl(code, token));
     wsRef.current = ws;
+    // Presence heartbeat: the server counts a player as gone ~30s after the last one.
+    const heartbeat = setInterval(() => {
+      if (ws.readyState === WebSocket.OPEN) ws.send(JSON.stringify({ type: "heartbeat" }));
+    }, HEARTBEAT_MS);
 
     ws.onmessage = (ev) => {
       let msg;
@@ -128,6 +133,8 @@ export default function ClashPlay() {
           if (msg.type === "game_catchup") {
             const tpq = msg.time_limit ?? timePerQuestion;
             startTimer(tpq, msg.time_remaining);
+            if (msg.your_rank) setMyRank(msg.your_rank);
+            if (msg.your_score !== undefined) setMyScore(msg.your_score);
           } else {
             const serverElapsed = msg.server_time
               ? Math.max(0, Date.now() / 1000 - msg.server_time)
@@ -151,11 +158,8 @@ export default function ClashPlay() {
           setStandings(msg.top3 || []);
           setPhase("reveal"); phaseRef.current = "reveal";
 
-          if (myId && msg.your_scores) {
-            const sorted = Object.entries(msg.your_scores).sort(([, a], [, b]) => b - a);
-            const idx = sorted.findIndex(([uid]) => uid === myId);
-            if (idx >= 0) setMyRank(idx + 1);
-          }
+          if (msg.your_rank) setMyRank(msg.your_rank);
+          if (msg.your_score !== undefined) setMyScore(msg.your_score);
           break;
         }
 
@@ -173,6 +177,7 @@ export default function ClashPlay() {
     ws.onclose = () => {};
 
     return () => {
+      clearInterval(heartbeat);
       clearInterval(timerRef.current);
       ws.close();
     };